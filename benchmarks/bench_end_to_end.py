@@ -0,0 +1,189 @@
+"""
+End-to-end benchmark against local SmartEM and ARIA stand-ins
+
+Serves a synthetic acquisition of the requested scale from a local SmartEM
+stand-in, then measures extraction, database writes and reads, chunked and
+single-record ARIA upload, a no-op re-deposition and the pipelined
+generate-and-send action, each with its wall time, peak traced memory and
+per-operation metrics. Results are written as JSON named after the commit
+so runs can be compared with --compare.
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--grids N] [--grid-squares N] [--foil-holes N] [--micrographs N]
+        [--smartem-latency-ms MS] [--aria-latency-ms MS] [--aria-ms-per-mb MS] [--compare RESULTS.json]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from fake_services import AriaStandIn, SmartEMStandIn, install_standins
+from synthetic import SyntheticAcquisitions
+
+from fandango_dls.actions import generate_and_send, generate_metadata, send_metadata
+from fandango_dls.db import sqlite as ddbb
+from fandango_dls.db.sqlite_db import get_project_metadata
+from fandango_dls.utils.aria_upload import iter_metadata_chunks
+from fandango_dls.utils.metrics import REGISTRY
+from fandango_dls.utils.smartem_client import LEVEL_GRID_SQUARES, LEVEL_FOIL_HOLES, LEVEL_MICROGRAPHS
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_stage(name, func, trace_memory, verbose, standins=()):
+    """
+    Run one benchmark stage
+
+    Returns:
+        Tuple of (stage result dictionary, value returned by func)
+    """
+    REGISTRY.reset()
+    for standin in standins:
+        standin.reset_stats()
+    if trace_memory:
+        tracemalloc.start()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output):
+        value = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    operations = REGISTRY.summary()['operations']
+    result = {
+        'seconds': round(elapsed, 4),
+        'peak_memory_bytes': peak,
+        'db_write_seconds': round(sum(op['total_seconds'] for name, op in operations.items()
+                                      if name.startswith(('db.save', 'db.update', 'blob.commit'))), 4),
+        'operations': operations
+    }
+    for standin in standins:
+        result[type(standin).__name__] = standin.stats()
+    print(f'{name:<16} {elapsed:8.3f} s' + (f'  peak {peak / 1e6:8.1f} MB' if peak is not None else ''))
+    return result, value
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\nCompared with {previous_path} (commit {previous.get('commit', 'unknown')[:8]}):")
+    for stage, result in current['stages'].items():
+        before = previous.get('stages', {}).get(stage)
+        if not before:
+            continue
+        change = (result['seconds'] - before['seconds']) / before['seconds'] * 100 if before['seconds'] else 0
+        print(f"{stage:<16} {before['seconds']:8.3f} s -> {result['seconds']:8.3f} s  ({change:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grids', type=int, default=2)
+    parser.add_argument('--grid-squares', type=int, default=20)
+    parser.add_argument('--foil-holes', type=int, default=10)
+    parser.add_argument('--micrographs', type=int, default=4)
+    parser.add_argument('--smartem-latency-ms', type=float, default=2)
+    parser.add_argument('--aria-latency-ms', type=float, default=5)
+    parser.add_argument('--aria-ms-per-mb', type=float, default=0)
+    parser.add_argument('--grid-square-workers', type=int, default=4)
+    parser.add_argument('--foil-hole-workers', type=int, default=4)
+    parser.add_argument('--micrograph-workers', type=int, default=8)
+    parser.add_argument('--chunk-size', type=int, default=10)
+    parser.add_argument('--upload-workers', type=int, default=4)
+    parser.add_argument('--no-trace-memory', action='store_true', help='skip tracemalloc, which slows stages down')
+    parser.add_argument('--output', default=RESULTS_DIR, help='directory receiving the JSON results')
+    parser.add_argument('--compare', help='previous results file to compare with')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the plugin actions')
+    args = parser.parse_args()
+
+    dataset = SyntheticAcquisitions(1, args.grids, args.grid_squares, args.foil_holes, args.micrographs)
+    acquisition_id = dataset.acquisition_uuids()[0]
+    max_workers = {
+        LEVEL_GRID_SQUARES: args.grid_square_workers,
+        LEVEL_FOIL_HOLES: args.foil_hole_workers,
+        LEVEL_MICROGRAPHS: args.micrograph_workers
+    }
+    trace_memory = not args.no_trace_memory
+    smartem = SmartEMStandIn(dataset, args.smartem_latency_ms / 1000)
+    aria = AriaStandIn(args.aria_latency_ms / 1000, args.aria_ms_per_mb / 1000)
+    install_standins(smartem.url, aria.url)
+    print(f'Synthetic acquisition: {dataset.total_entities()}')
+
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ddbb.ddbb_path = tmpdir
+        ddbb.close_connection_to_ddbb()
+        generate_metadata.smartem_cache_enabled = False
+
+        def stage(name, func, *standins):
+            stages[name], value = run_stage(name, func, trace_memory, args.verbose, standins)
+            return value
+
+        ok, info = stage('extract', lambda: generate_metadata.generate_metadata_from_smartem(
+            'bench', acquisition_id, max_workers), smartem)
+        assert ok, info
+
+        def read_document():
+            return len(json.loads(get_project_metadata('bench'))['grids'])
+
+        def read_chunks():
+            return sum(len(chunk['grid_squares']) for chunk in iter_metadata_chunks(acquisition_id, args.chunk_size))
+
+        stage('db_read_document', read_document)
+        stage('db_read_chunks', read_chunks)
+
+        for name, visit_id, chunk_size in (('upload_chunked', 1, args.chunk_size),
+                                           ('upload_single', 2, 0),
+                                           ('upload_noop', 1, args.chunk_size)):
+            ok, info = stage(name, lambda: send_metadata.send_metadata_to_aria(
+                'bench', visit_id, chunk_size=chunk_size, upload_workers=args.upload_workers), aria)
+            assert ok, info
+
+        ok, info = stage('generate_and_send', lambda: generate_and_send.generate_and_send_metadata(
+            'bench-pipelined', acquisition_id, 3, max_workers, chunk_size=args.chunk_size,
+            upload_workers=args.upload_workers), smartem, aria)
+        assert ok, info
+
+        ddbb.close_connection_to_ddbb()
+
+    smartem.close()
+    aria.close()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'parameters': vars(args),
+        'entities': dataset.total_entities(),
+        'stages': stages
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{datetime.now():%Y%m%d-%H%M%S}-{results['commit'][:8]}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {path}')
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
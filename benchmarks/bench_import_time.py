@@ -0,0 +1,74 @@
+"""
+Check the import cost of the plugin package
+
+Imports fandango_dls in fresh interpreters with `python -X importtime` and
+reports its own cumulative import time (excluding fandanGO-core) and every
+heavy module it pulled in. Exits with status 1 if the best of the runs is
+over budget or an action module, the database layer, tabulate or the
+SmartEM/ARIA clients were imported, so it can guard CLI startup in CI.
+
+Usage:
+    python benchmarks/bench_import_time.py [--budget-ms MS] [--runs N]
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Imported lazily, only once the selected action runs
+FORBIDDEN_PREFIXES = (
+    'fandango_dls.actions.',
+    'fandango_dls.db',
+    'fandango_dls.utils.',
+    'smartem_backend',
+    'aria',
+    'tabulate'
+)
+
+
+def import_profile(module):
+    """
+    Import a module in a fresh interpreter
+
+    Returns:
+        Dictionary of imported module name to cumulative import time in microseconds
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        profile[name.strip()] = int(cumulative)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='fandango_dls')
+    parser.add_argument('--budget-ms', type=float, default=20)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        profile = import_profile(args.module)
+        own = profile[args.module] - profile.get('core', 0)
+        if best is None or own < best[0]:
+            best = own, profile
+    own, profile = best
+
+    forbidden = sorted(name for name in profile if name.startswith(FORBIDDEN_PREFIXES))
+    print(f'{args.module}: {own / 1000:.1f} ms excluding core (budget {args.budget_ms} ms, best of {args.runs})')
+    for name in forbidden:
+        print(f'  eagerly imported: {name} ({profile[name] / 1000:.1f} ms)')
+
+    if own / 1000 > args.budget_ms or forbidden:
+        print('FAILED')
+        sys.exit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
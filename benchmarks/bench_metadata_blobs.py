@@ -0,0 +1,92 @@
+"""
+Benchmark metadata document storage formats
+
+Encodes a synthetic acquisition tree with every available blob codec and
+reports compression ratio and encode/decode throughput, against the
+original pretty-printed (indent=2) plain-text document.
+
+Usage:
+    python benchmarks/bench_metadata_blobs.py [--grid-squares N] [--foil-holes N] [--micrographs N]
+"""
+
+import argparse
+import json
+import tempfile
+import time
+
+from fandango_dls.constants import NODE_ACQUISITION, NODE_GRID, NODE_GRID_SQUARE, NODE_GRID_END
+from fandango_dls.db import sqlite as ddbb
+from fandango_dls.db.blob_store import CODEC_ZSTD, CODEC_GZIP, CODEC_NONE, read_blob, zstandard
+from fandango_dls.utils.metadata_writer import write_metadata_blob
+
+
+def make_nodes(num_grid_squares, num_foil_holes, num_micrographs):
+    yield NODE_ACQUISITION, {'uuid': 'acquisition', 'name': 'benchmark', 'start_time': '2024-01-01T00:00:00'}
+    yield NODE_GRID, {'grid_info': {'uuid': 'grid-0', 'name': 'Grid 1'}, 'atlas': None}
+    for gs in range(num_grid_squares):
+        yield NODE_GRID_SQUARE, {
+            'grid_square_info': {'uuid': f'gs-{gs}', 'status': 'collected', 'x_location': gs, 'y_location': gs},
+            'foil_holes': [
+                {
+                    'foil_hole_info': {'uuid': f'gs-{gs}-fh-{fh}', 'diameter': 1.2, 'is_near_grid_bar': False},
+                    'micrographs': [
+                        {'uuid': f'gs-{gs}-fh-{fh}-m-{m}', 'defocus': -1.5 - m * 0.1,
+                         'ice_thickness': 30.0 + m, 'ctf_max_resolution_estimate': 3.2,
+                         'acquisition_datetime': f'2024-01-01T00:{m:02d}:00'}
+                        for m in range(num_micrographs)
+                    ]
+                }
+                for fh in range(num_foil_holes)
+            ],
+            'quality_prediction': {'value': 0.5}
+        }
+    yield NODE_GRID_END, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grid-squares', type=int, default=200)
+    parser.add_argument('--foil-holes', type=int, default=20)
+    parser.add_argument('--micrographs', type=int, default=4)
+    args = parser.parse_args()
+    shape = (args.grid_squares, args.foil_holes, args.micrographs)
+
+    codecs = [CODEC_NONE, CODEC_GZIP] + ([CODEC_ZSTD] if zstandard is not None else [])
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ddbb.ddbb_path = tmpdir
+        ddbb.close_connection_to_ddbb()
+
+        # Original format: the whole tree pretty-printed in one string
+        metadata = {'grids': [{'grid_squares': [node for node_type, node in make_nodes(*shape)
+                                                if node_type == NODE_GRID_SQUARE]}]}
+        start = time.perf_counter()
+        baseline_size = len(json.dumps(metadata, indent=2).encode('utf-8'))
+        baseline_elapsed = time.perf_counter() - start
+        print(f'{"indent=2 text":<14} {baseline_size / 1e6:8.2f} MB  encode {baseline_size / 1e6 / baseline_elapsed:8.1f} MB/s')
+
+        for codec in codecs:
+            start = time.perf_counter()
+            digest, _ = write_metadata_blob(make_nodes(*shape), codec)
+            encode_elapsed = time.perf_counter() - start
+
+            cursor = ddbb.connect_to_ddbb().cursor()
+            size, stored_size = cursor.execute('SELECT size, stored_size FROM metadata_blobs WHERE digest = ? '
+                                               'AND codec = ?', (digest, codec)).fetchone()
+            start = time.perf_counter()
+            document = read_blob(digest)
+            decode_elapsed = time.perf_counter() - start
+            assert len(document.encode('utf-8')) == size
+
+            print(f'{codec:<14} {stored_size / 1e6:8.2f} MB  encode {size / 1e6 / encode_elapsed:8.1f} MB/s  '
+                  f'decode {size / 1e6 / decode_elapsed:8.1f} MB/s  ratio vs indent=2 {baseline_size / stored_size:5.1f}x')
+
+            # Blobs are content-addressed, so drop this one before trying the next codec
+            cursor.execute('DELETE FROM metadata_blobs WHERE digest = ?', (digest,))
+            cursor.connection.commit()
+
+        ddbb.close_connection_to_ddbb()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark JSON serialization backends
+
+Builds a synthetic acquisition tree and measures, for every installed
+backend of fandango_dls.utils.serialization, the throughput of encoding
+the whole document (compact and indented), decoding it, and encoding and
+decoding its entities one by one as the database layer does.
+
+Usage:
+    python benchmarks/bench_serialization.py [--grid-squares N] [--foil-holes N] [--micrographs N] [--repeat N]
+"""
+
+import argparse
+import time
+
+from synthetic import SyntheticAcquisitions
+
+from fandango_dls.utils import serialization
+
+
+def make_document(dataset):
+    """Metadata document of the first acquisition of a dataset, as extracted"""
+    acquisition_uuid = dataset.acquisition_uuids()[0]
+    return {
+        'acquisition': dataset.acquisition(acquisition_uuid),
+        'grids': [{
+            'grid_info': grid,
+            'grid_squares': [{
+                'grid_square_info': gs,
+                'foil_holes': [{
+                    'foil_hole_info': fh,
+                    'micrographs': dataset.micrographs(fh['uuid'])
+                } for fh in dataset.foil_holes(gs['uuid'])],
+                'quality_prediction': dataset.quality_prediction(gs['uuid'])
+            } for gs in dataset.grid_squares(grid['uuid'])],
+            'atlas': dataset.atlas(grid['uuid'])
+        } for grid in dataset.grids(acquisition_uuid)]
+    }
+
+
+def entities(document):
+    """Every entity dictionary of a document, as stored in database rows"""
+    for grid in document['grids']:
+        yield grid['grid_info']
+        for gs in grid['grid_squares']:
+            yield gs['grid_square_info']
+            for fh in gs['foil_holes']:
+                yield fh['foil_hole_info']
+                yield from fh['micrographs']
+
+
+def best_time(func, repeat):
+    """Shortest of repeated runs of func, in seconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grids', type=int, default=2)
+    parser.add_argument('--grid-squares', type=int, default=50)
+    parser.add_argument('--foil-holes', type=int, default=20)
+    parser.add_argument('--micrographs', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the best is reported')
+    args = parser.parse_args()
+
+    dataset = SyntheticAcquisitions(1, args.grids, args.grid_squares, args.foil_holes, args.micrographs)
+    document = make_document(dataset)
+    rows = list(entities(document))
+    print(f'Synthetic acquisition: {dataset.total_entities()}, {len(rows)} entities')
+    print(f'{"backend":<8} {"compact MB/s":>13} {"indent=2 MB/s":>14} {"decode MB/s":>12} '
+          f'{"rows enc/s":>11} {"rows dec/s":>11} {"size MB":>8}')
+
+    reference = None
+    for backend in serialization.available_backends():
+        serialization.backend = backend
+        compact = serialization.dumps(document)
+        size = len(compact.encode('utf-8')) / 1e6
+        encoded_rows = [serialization.dumps(row) for row in rows]
+
+        # Every backend must produce the same content
+        parsed = serialization.loads(compact)
+        reference = reference or parsed
+        assert parsed == reference, f'{backend} round-trip differs'
+
+        compact_time = best_time(lambda: serialization.dumps(document), args.repeat)
+        indent_time = best_time(lambda: serialization.dumps(document, indent=2), args.repeat)
+        decode_time = best_time(lambda: serialization.loads(compact), args.repeat)
+        rows_encode_time = best_time(lambda: [serialization.dumps(row) for row in rows], args.repeat)
+        rows_decode_time = best_time(lambda: [serialization.loads(row) for row in encoded_rows], args.repeat)
+        print(f'{backend:<8} {size / compact_time:13.1f} {size / indent_time:14.1f} {size / decode_time:12.1f} '
+              f'{len(rows) / rows_encode_time:11.0f} {len(rows) / rows_decode_time:11.0f} {size:8.2f}')
+
+
+if __name__ == '__main__':
+    main()
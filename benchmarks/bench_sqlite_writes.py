@@ -0,0 +1,91 @@
+"""
+Benchmark SQLite write throughput of the plugin database layer
+
+Compares the original pattern (one connection, one statement and one commit
+per write, default journal) against the pooled WAL connection writing each
+grid square subtree through a single executemany transaction.
+
+Usage:
+    python benchmarks/bench_sqlite_writes.py [--grid-squares N] [--foil-holes N] [--micrographs N]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from fandango_dls.db import sqlite as ddbb
+from fandango_dls.db.sqlite_db import save_grid_square_tree
+
+
+def make_grid_square(gs_index, num_foil_holes, num_micrographs):
+    gs_uuid = f'gs-{gs_index}'
+    return {
+        'grid_square_info': {'uuid': gs_uuid, 'status': 'collected'},
+        'foil_holes': [
+            {
+                'foil_hole_info': {'uuid': f'{gs_uuid}-fh-{f}'},
+                'micrographs': [
+                    {'uuid': f'{gs_uuid}-fh-{f}-m-{m}', 'defocus': -1.5, 'ice_thickness': 30.0}
+                    for m in range(num_micrographs)
+                ]
+            }
+            for f in range(num_foil_holes)
+        ],
+        'quality_prediction': None
+    }
+
+
+def bench_per_statement(path, grid_squares):
+    """Original pattern: connect, execute, commit and close for every row"""
+    start = time.perf_counter()
+    rows = 0
+    for gs_data in grid_squares:
+        for fh_data in gs_data['foil_holes']:
+            for micrograph in fh_data['micrographs']:
+                connection = sqlite3.connect(path)
+                connection.execute('CREATE TABLE IF NOT EXISTS micrographs '
+                                   '(uuid TEXT, foil_hole_uuid TEXT, position INTEGER, data TEXT)')
+                connection.execute('INSERT INTO micrographs VALUES (?, ?, ?, ?)',
+                                   (micrograph['uuid'], fh_data['foil_hole_info']['uuid'], 0, json.dumps(micrograph)))
+                connection.commit()
+                connection.close()
+                rows += 1
+    return rows, time.perf_counter() - start
+
+
+def bench_batched(grid_squares):
+    """Pooled WAL connection, one executemany transaction per grid square"""
+    start = time.perf_counter()
+    rows = 0
+    for gs_data in grid_squares:
+        save_grid_square_tree(gs_data)
+        rows += sum(len(fh_data['micrographs']) for fh_data in gs_data['foil_holes'])
+    return rows, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--grid-squares', type=int, default=20)
+    parser.add_argument('--foil-holes', type=int, default=10)
+    parser.add_argument('--micrographs', type=int, default=5)
+    args = parser.parse_args()
+
+    grid_squares = [make_grid_square(i, args.foil_holes, args.micrographs) for i in range(args.grid_squares)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        rows, elapsed = bench_per_statement(os.path.join(tmpdir, 'baseline.sqlite'), grid_squares)
+        print(f'per-statement: {rows} micrographs in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/s)')
+
+        ddbb.ddbb_path = tmpdir
+        ddbb.close_connection_to_ddbb()
+        rows, batched_elapsed = bench_batched(grid_squares)
+        print(f'batched:       {rows} micrographs in {batched_elapsed:.3f}s ({rows / batched_elapsed:,.0f} rows/s)')
+        print(f'speed-up:      {elapsed / batched_elapsed:.1f}x')
+        ddbb.close_connection_to_ddbb()
+
+
+if __name__ == '__main__':
+    main()
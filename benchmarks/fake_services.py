@@ -0,0 +1,285 @@
+"""
+Local stand-ins for the SmartEM and ARIA HTTP services
+
+Both servers run in-process on 127.0.0.1 with a configurable per-request
+latency, and come with minimal HTTP clients exposing the methods the plugin
+calls on SmartEMAPIClient and on the fandanGO-aria client. install_standins
+points the plugin at them, so benchmarks exercise real HTTP round-trips
+without the SmartEM or ARIA packages installed.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+
+class _StandInServer:
+    """ThreadingHTTPServer running in a daemon thread, counting requests and bytes"""
+
+    def __init__(self, handler_class, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        self.routes_hit = Counter()
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.max_request_bytes = 0
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        # A short poll interval lets close() return promptly
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f'http://{host}:{port}'
+
+    def account(self, received, sent, route=None):
+        with self.lock:
+            self.requests += 1
+            self.routes_hit[route] += 1
+            self.bytes_received += received
+            self.bytes_sent += sent
+            self.max_request_bytes = max(self.max_request_bytes, received)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'bytes_received': self.bytes_received,
+            'bytes_sent': self.bytes_sent,
+            'max_request_bytes': self.max_request_bytes,
+            'routes': dict(self.routes_hit)
+        }
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = self.bytes_received = self.bytes_sent = self.max_request_bytes = 0
+            self.routes_hit.clear()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle enabled they
+    # would hit the client's delayed ACK and add ~40 ms to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload, received=0, route=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.server.standin.account(received, len(body), route)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SmartEMStandIn(_StandInServer):
+    """
+    Read-only SmartEM API serving a SyntheticAcquisitions dataset
+
+    Args:
+        dataset: SyntheticAcquisitions instance
+        latency: Seconds added to every request
+    """
+
+    def __init__(self, dataset, latency=0.0):
+        self.dataset = dataset
+        self.routes = [
+            (re.compile(r'^/acquisitions$'), lambda: dataset.acquisitions()),
+            (re.compile(r'^/acquisitions/([^/]+)$'), dataset.acquisition),
+            (re.compile(r'^/acquisitions/([^/]+)/grids$'), dataset.grids),
+            (re.compile(r'^/grids/([^/]+)/gridsquares$'), dataset.grid_squares),
+            (re.compile(r'^/grids/([^/]+)/atlas$'), dataset.atlas),
+            (re.compile(r'^/gridsquares/([^/]+)/foilholes$'), dataset.foil_holes),
+            (re.compile(r'^/gridsquares/([^/]+)/quality_prediction$'), dataset.quality_prediction),
+            (re.compile(r'^/foilholes/([^/]+)/micrographs$'), dataset.micrographs),
+            (re.compile(r'^/foilholes$'), dataset.all_foil_holes),
+            (re.compile(r'^/micrographs$'), dataset.all_micrographs)
+        ]
+        super().__init__(self._Handler, latency)
+
+    class _Handler(_JSONHandler):
+        def do_GET(self):
+            standin = self.server.standin
+            if standin.latency:
+                time.sleep(standin.latency)
+            url = urlsplit(self.path)
+            for pattern, handler in standin.routes:
+                match = pattern.match(url.path)
+                if match:
+                    # Query parameters are the filters of the listings
+                    payload = handler(*match.groups(), **dict(parse_qsl(url.query)))
+                    return self._reply(200, payload, route=pattern.pattern)
+            self._reply(404, {'detail': 'Not found'})
+
+
+class AriaStandIn(_StandInServer):
+    """
+    ARIA API accepting buckets, records and fields
+
+    Args:
+        latency: Seconds added to every request
+        seconds_per_mb: Additional seconds per MB of request body, to model bandwidth
+    """
+
+    def __init__(self, latency=0.0, seconds_per_mb=0.0):
+        self.seconds_per_mb = seconds_per_mb
+        self.next_id = 0
+        self.entities = {'buckets': 0, 'records': 0, 'fields': 0}
+        super().__init__(self._Handler, latency)
+
+    def new_id(self, kind):
+        with self.lock:
+            self.next_id += 1
+            self.entities[kind] += 1
+            return self.next_id
+
+    class _Handler(_JSONHandler):
+        def do_POST(self):
+            standin = self.server.standin
+            length = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(length)
+            time.sleep(standin.latency + standin.seconds_per_mb * length / 1e6)
+            kind = self.path.strip('/')
+            if kind not in standin.entities:
+                return self._reply(404, {'detail': 'Not found'}, length)
+            self._reply(201, {'id': standin.new_id(kind)}, length)
+
+
+class Model(SimpleNamespace):
+    """Response model exposing the pydantic method the plugin serializes with"""
+
+    def model_dump(self, mode='python'):
+        return dict(self.__dict__)
+
+
+class HttpSmartEMClient:
+    """Minimal HTTP client with the SmartEMAPIClient methods used by the plugin"""
+
+    def __init__(self, base_url, timeout=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _get(self, path, **params):
+        response = self.session.get(self.base_url + path, params=params or None, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return [Model(**item) for item in data] if isinstance(data, list) else Model(**data)
+
+    def get_acquisitions(self):
+        return self._get('/acquisitions')
+
+    def get_acquisition(self, uuid):
+        return self._get(f'/acquisitions/{uuid}')
+
+    def get_acquisition_grids(self, uuid):
+        return self._get(f'/acquisitions/{uuid}/grids')
+
+    def get_grid_squares_for_grid(self, uuid):
+        return self._get(f'/grids/{uuid}/gridsquares')
+
+    def get_grid_atlas(self, uuid):
+        return self._get(f'/grids/{uuid}/atlas')
+
+    def get_foil_holes_for_gridsquare(self, uuid):
+        return self._get(f'/gridsquares/{uuid}/foilholes')
+
+    def get_quality_prediction(self, uuid):
+        return self._get(f'/gridsquares/{uuid}/quality_prediction')
+
+    def get_foil_hole_micrographs(self, uuid):
+        return self._get(f'/foilholes/{uuid}/micrographs')
+
+    def get_foil_holes(self, grid_uuid=None):
+        return self._get('/foilholes', **({'grid_uuid': grid_uuid} if grid_uuid else {}))
+
+    def get_micrographs(self, grid_uuid=None):
+        return self._get('/micrographs', **({'grid_uuid': grid_uuid} if grid_uuid else {}))
+
+    def close(self):
+        self.session.close()
+
+
+class Bucket:
+    def __init__(self, entity_id, entity_type, embargo_date):
+        self.id = None
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+        self.embargo_date = embargo_date
+
+
+class Field:
+    def __init__(self, record_id, field_type, content):
+        self.id = None
+        self.record_id = record_id
+        self.type = field_type
+        self.content = content
+
+
+class HttpAriaClient:
+    """Minimal HTTP client with the fandanGO-aria calls used by the plugin"""
+
+    base_url = None
+
+    def __init__(self, *args):
+        self.session = requests.Session()
+
+    def login(self):
+        pass
+
+    def new_data_manager(self, entity_id, entity_type, *args):
+        return HttpDataManager(self.session, self.base_url, entity_id, entity_type)
+
+
+class HttpDataManager:
+    def __init__(self, session, base_url, entity_id, entity_type):
+        self.session = session
+        self.base_url = base_url
+        self.entity_id = entity_id
+        self.entity_type = entity_type
+
+    def _post(self, kind, payload):
+        response = self.session.post(f'{self.base_url}/{kind}', data=json.dumps(payload),
+                                     headers={'Content-Type': 'application/json'})
+        response.raise_for_status()
+        return response.json()['id']
+
+    def push(self, entity):
+        if isinstance(entity, Bucket):
+            entity.id = self._post('buckets', entity.__dict__)
+        else:
+            entity.id = self._post('fields', entity.__dict__)
+
+    def create_record(self, bucket_id, schema):
+        return SimpleNamespace(id=self._post('records', {'bucket_id': bucket_id, 'schema': schema}))
+
+
+def install_standins(smartem_url, aria_url):
+    """Point the plugin's SmartEM and ARIA clients at the stand-in services"""
+    from fandango_dls.actions import generate_metadata, send_metadata
+    from fandango_dls.utils import aria_upload, smartem_client
+
+    smartem_client.SmartEMAPIClient = HttpSmartEMClient
+    generate_metadata.smartem_api_url = smartem_url
+    HttpAriaClient.base_url = aria_url
+    send_metadata.AriaClient = HttpAriaClient
+    aria_upload.AriaClient = HttpAriaClient
+    aria_upload.Bucket = Bucket
+    aria_upload.Field = Field
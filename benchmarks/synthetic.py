@@ -0,0 +1,153 @@
+"""
+Synthetic SmartEM acquisitions for benchmarks
+
+Entities are derived deterministically from their UUIDs, which encode their
+position in the hierarchy, so an acquisition of any scale can be served
+without ever being materialized.
+"""
+
+import random
+import zlib
+from datetime import datetime, timedelta
+
+START = datetime(2024, 1, 1, 8, 0, 0)
+
+
+def _rng(uuid):
+    """Random generator seeded by an entity UUID"""
+    return random.Random(zlib.crc32(uuid.encode('utf-8')))
+
+
+class SyntheticAcquisitions:
+    """
+    A set of acquisitions of identical shape
+
+    Args:
+        acquisitions: Number of acquisitions
+        grids: Grids per acquisition
+        grid_squares: Grid squares per grid
+        foil_holes: Foil holes per grid square
+        micrographs: Micrographs per foil hole
+    """
+
+    def __init__(self, acquisitions=1, grids=2, grid_squares=20, foil_holes=10, micrographs=4):
+        self.shape = {
+            'acquisitions': acquisitions,
+            'grids': grids,
+            'grid_squares': grid_squares,
+            'foil_holes': foil_holes,
+            'micrographs': micrographs
+        }
+
+    def total_entities(self):
+        """Number of entities of each level across all acquisitions"""
+        totals = {}
+        count = 1
+        for level, n in self.shape.items():
+            count *= n
+            totals[level] = count
+        return totals
+
+    def acquisition_uuids(self):
+        return [f'acq-{i}' for i in range(self.shape['acquisitions'])]
+
+    def acquisition(self, uuid):
+        index = int(uuid.split('-')[1])
+        return {
+            'uuid': uuid,
+            'name': f'Synthetic session {index}',
+            'status': 'completed',
+            'start_time': (START + timedelta(days=index)).isoformat(),
+            'end_time': (START + timedelta(days=index, hours=20)).isoformat(),
+            'instrument_model': 'Titan Krios',
+            'instrument_id': f'm{index % 12 + 1:02d}'
+        }
+
+    def acquisitions(self):
+        return [self.acquisition(uuid) for uuid in self.acquisition_uuids()]
+
+    def grids(self, acquisition_uuid):
+        return [{
+            'uuid': f'{acquisition_uuid}-g{i}',
+            'acquisition_uuid': acquisition_uuid,
+            'name': f'Grid {i + 1}',
+            'status': 'completed',
+            'slot': i + 1
+        } for i in range(self.shape['grids'])]
+
+    def grid_squares(self, grid_uuid):
+        squares = []
+        for i in range(self.shape['grid_squares']):
+            uuid = f'{grid_uuid}-s{i}'
+            rng = _rng(uuid)
+            squares.append({
+                'uuid': uuid,
+                'grid_uuid': grid_uuid,
+                'gridsquare_id': str(i),
+                'status': rng.choice(('collected', 'collected', 'collected', 'skipped')),
+                'x_location': rng.randint(0, 4096),
+                'y_location': rng.randint(0, 4096),
+                'defocus': round(rng.uniform(-3, -0.5), 3),
+                'magnification': 105000,
+                'pixel_size': 0.83,
+                'selected': True
+            })
+        return squares
+
+    def foil_holes(self, grid_square_uuid):
+        holes = []
+        for i in range(self.shape['foil_holes']):
+            uuid = f'{grid_square_uuid}-f{i}'
+            rng = _rng(uuid)
+            holes.append({
+                'uuid': uuid,
+                'gridsquare_uuid': grid_square_uuid,
+                'foilhole_id': str(i),
+                'x_location': rng.randint(0, 4096),
+                'y_location': rng.randint(0, 4096),
+                'diameter': round(rng.uniform(1.0, 2.0), 3),
+                'is_near_grid_bar': rng.random() < 0.1
+            })
+        return holes
+
+    def micrographs(self, foil_hole_uuid):
+        micrographs = []
+        for i in range(self.shape['micrographs']):
+            uuid = f'{foil_hole_uuid}-m{i}'
+            rng = _rng(uuid)
+            micrographs.append({
+                'uuid': uuid,
+                'foilhole_uuid': foil_hole_uuid,
+                'micrograph_id': str(i),
+                'status': 'completed',
+                'acquisition_datetime': (START + timedelta(seconds=rng.randint(0, 72000))).isoformat(),
+                'defocus': round(rng.uniform(-3, -0.5), 3),
+                'ice_thickness': round(rng.uniform(10, 120), 2),
+                'ctf_max_resolution_estimate': round(rng.uniform(2.5, 8), 2),
+                'total_motion': round(rng.uniform(5, 40), 2),
+                'number_of_particles_picked': rng.randint(0, 400)
+            })
+        return micrographs
+
+    def quality_prediction(self, grid_square_uuid):
+        rng = _rng(grid_square_uuid + '-quality')
+        return {'gridsquare_uuid': grid_square_uuid, 'prediction_model_name': 'synthetic',
+                'value': round(rng.random(), 4)}
+
+    def atlas(self, grid_uuid):
+        return {'uuid': f'{grid_uuid}-atlas', 'grid_uuid': grid_uuid, 'name': 'Atlas',
+                'pixel_size': 90.5, 'storage_folder': f'/dls/synthetic/{grid_uuid}/atlas'}
+
+    def _grid_uuids(self, grid_uuid=None):
+        if grid_uuid:
+            return [grid_uuid]
+        return [grid['uuid'] for acq in self.acquisition_uuids() for grid in self.grids(acq)]
+
+    def all_foil_holes(self, grid_uuid=None):
+        """Every foil hole of every acquisition, or of one grid, as a bulk listing"""
+        return [fh for grid in self._grid_uuids(grid_uuid)
+                for gs in self.grid_squares(grid) for fh in self.foil_holes(gs['uuid'])]
+
+    def all_micrographs(self, grid_uuid=None):
+        """Every micrograph of every acquisition, or of one grid, as a bulk listing"""
+        return [m for fh in self.all_foil_holes(grid_uuid) for m in self.micrographs(fh['uuid'])]
@@ -5,13 +5,70 @@ Plugin for integrating Diamond Light Source cryo-EM metadata from
 SmartEM system into the FandanGO/ARIA workflow.
 """
 
+import importlib
+
 import core
 from fandango_dls.constants import (
     ACTION_GENERATE_METADATA,
     ACTION_SEND_METADATA,
-    ACTION_PRINT_PROJECT
+    ACTION_PRINT_PROJECT,
+    ACTION_BATCH,
+    ACTION_GENERATE_AND_SEND,
+    ACTION_EXPORT,
+    ACTION_WATCH
 )
-from fandango_dls.actions import generate_metadata, send_metadata, print_project
+
+
+# Arguments accepted by every action, see fandango_dls.utils.metrics.run_instrumented
+INSTRUMENTATION_ARGS = {
+    'profile': {
+        'help': 'Profile the run with cProfile and dump the stats to this file',
+        'required': False
+    },
+    'metrics-dir': {
+        'help': 'Write Prometheus textfile metrics to this directory (overrides config.yaml)',
+        'required': False
+    }
+}
+
+# Arguments restricting what an extraction fetches, see fandango_dls.utils.smartem_client.ExtractionScope
+SCOPE_ARGS = {
+    'depth': {
+        'help': 'Deepest level extracted: grid_squares, foil_holes or micrographs (overrides config.yaml)',
+        'required': False
+    },
+    'atlas': {
+        'help': 'Extract grid atlases (true/false, overrides config.yaml)',
+        'required': False
+    },
+    'quality-predictions': {
+        'help': 'Extract grid square quality predictions (true/false, overrides config.yaml)',
+        'required': False
+    },
+    'grid-square-status': {
+        'help': 'Comma-separated grid square statuses to keep (overrides config.yaml)',
+        'required': False
+    },
+    'min-quality': {
+        'help': 'Minimum quality prediction value of kept grid squares (overrides config.yaml)',
+        'required': False
+    }
+}
+
+
+def _lazy_action(action, module_name):
+    """
+    perform_action of an action module, imported only when the action runs
+
+    Action modules read config.yaml and import the SmartEM and ARIA clients
+    at import time, so loading them all up front would make every CLI call
+    pay for every action. Every run is instrumented.
+    """
+    def perform_action(args):
+        metrics = importlib.import_module('fandango_dls.utils.metrics')
+        module = importlib.import_module(f'fandango_dls.actions.{module_name}')
+        return metrics.run_instrumented(action, module.perform_action, args)
+    return perform_action
 
 
 class Plugin(core.Plugin):
@@ -28,27 +85,237 @@ class Plugin(core.Plugin):
 
         cls.define_arg(ACTION_GENERATE_METADATA, {
             'help': {
-                'usage': '--acquisition-id ACQUISITION_ID',
-                'epilog': '--acquisition-id a1b2c3d4-e5f6-7890-abcd-ef1234567890'
+                'usage': '--acquisition-id ACQUISITION_ID [--grid-square-workers N] '
+                         '[--foil-hole-workers N] [--micrograph-workers N] [--incremental true] [--resume true] '
+                         '[--depth LEVEL] [--atlas false] [--quality-predictions false] '
+                         '[--grid-square-status STATUS,...] [--min-quality VALUE]',
+                'epilog': '--acquisition-id a1b2c3d4-e5f6-7890-abcd-ef1234567890 --micrograph-workers 8'
             },
             'args': {
                 'acquisition-id': {
                     'help': 'UUID of the SmartEM acquisition to extract metadata from',
                     'required': True
-                }
+                },
+                'grid-square-workers': {
+                    'help': 'Maximum concurrent grid square requests (overrides config.yaml)',
+                    'required': False
+                },
+                'foil-hole-workers': {
+                    'help': 'Maximum concurrent foil hole requests (overrides config.yaml)',
+                    'required': False
+                },
+                'micrograph-workers': {
+                    'help': 'Maximum concurrent micrograph requests (overrides config.yaml)',
+                    'required': False
+                },
+                'incremental': {
+                    'help': 'Only fetch grid squares and foil holes changed since the last extraction (true/false)',
+                    'required': False
+                },
+                'resume': {
+                    'help': 'Continue an interrupted extraction from its last checkpoint (true/false)',
+                    'required': False
+                },
+                **SCOPE_ARGS,
+                **INSTRUMENTATION_ARGS
             }
         })
 
         cls.define_arg(ACTION_SEND_METADATA, {
             'help': {
-                'usage': '--visit-id VISIT_ID',
-                'epilog': '--visit-id 12345'
+                'usage': '--visit-id VISIT_ID [--chunk-size N] [--upload-workers N]',
+                'epilog': '--visit-id 12345 --chunk-size 50'
+            },
+            'args': {
+                'visit-id': {
+                    'help': 'ARIA visit ID to link metadata to',
+                    'required': True
+                },
+                'chunk-size': {
+                    'help': 'Grid squares per uploaded ARIA record, 0 for a single record (overrides config.yaml)',
+                    'required': False
+                },
+                'upload-workers': {
+                    'help': 'Maximum concurrent chunk uploads (overrides config.yaml)',
+                    'required': False
+                },
+                **INSTRUMENTATION_ARGS
+            }
+        })
+
+        cls.define_arg(ACTION_PRINT_PROJECT, {
+            'help': {
+                'usage': '[--page N] [--page-size N] [--key PATTERN] [--tree true] [--path JSON_PATH] '
+                         '[--profile FILE] [--metrics-dir DIR]',
+                'epilog': "--tree true --path '$.grids[0].grid_squares[3].quality_prediction'"
+            },
+            'args': {
+                'page': {
+                    'help': 'Page of project keys to display, starting at 1',
+                    'required': False
+                },
+                'page-size': {
+                    'help': 'Project keys per page',
+                    'required': False
+                },
+                'key': {
+                    'help': "Only display project keys matching this glob pattern, e.g. 'metadata_*'",
+                    'required': False
+                },
+                'tree': {
+                    'help': 'Display the grids of the stored acquisition with their entity counts (true/false)',
+                    'required': False
+                },
+                'path': {
+                    'help': 'JSON path into the metadata to display, e.g. $.grids[0].grid_squares[3]',
+                    'required': False
+                },
+                **INSTRUMENTATION_ARGS
+            }
+        })
+
+        cls.define_arg(ACTION_BATCH, {
+            'help': {
+                'usage': '(--manifest FILE | --since DATE [--until DATE] [--status STATUS,...] '
+                         '[--instrument INSTRUMENT,...] [--new-only true]) [--visit-id VISIT_ID] [--parallel N] '
+                         '[--incremental true]',
+                'epilog': '--since 2025-06-01 --status completed --new-only true --visit-id 12345 --parallel 8'
             },
             'args': {
+                'manifest': {
+                    'help': 'CSV file with acquisition_id, project and visit_id columns',
+                    'required': False
+                },
+                'since': {
+                    'help': 'Process every SmartEM acquisition started since this ISO date instead of a manifest',
+                    'required': False
+                },
+                'until': {
+                    'help': 'With --since, only acquisitions started before this ISO date',
+                    'required': False
+                },
+                'status': {
+                    'help': 'With --since, comma-separated acquisition statuses to process',
+                    'required': False
+                },
+                'instrument': {
+                    'help': 'With --since, comma-separated instrument IDs or models to process',
+                    'required': False
+                },
+                'new-only': {
+                    'help': 'With --since, skip acquisitions already processed unless their status changed (true/false)',
+                    'required': False
+                },
+                'visit-id': {
+                    'help': 'ARIA visit ID for items without one; items without a visit are only extracted',
+                    'required': False
+                },
+                'parallel': {
+                    'help': 'Number of acquisitions processed at once (overrides config.yaml)',
+                    'required': False
+                },
+                'incremental': {
+                    'help': 'Only fetch grid squares and foil holes changed since the last extraction (true/false)',
+                    'required': False
+                },
+                **INSTRUMENTATION_ARGS
+            }
+        })
+
+        cls.define_arg(ACTION_GENERATE_AND_SEND, {
+            'help': {
+                'usage': '--acquisition-id ACQUISITION_ID --visit-id VISIT_ID [--chunk-size N] [--upload-workers N] '
+                         '[--grid-square-workers N] [--foil-hole-workers N] [--micrograph-workers N] '
+                         '[--incremental true] [--resume true] [--depth LEVEL] [--atlas false] '
+                         '[--quality-predictions false] [--grid-square-status STATUS,...] [--min-quality VALUE]',
+                'epilog': '--acquisition-id a1b2c3d4-e5f6-7890-abcd-ef1234567890 --visit-id 12345 --chunk-size 50'
+            },
+            'args': {
+                'acquisition-id': {
+                    'help': 'UUID of the SmartEM acquisition to extract metadata from',
+                    'required': True
+                },
                 'visit-id': {
                     'help': 'ARIA visit ID to link metadata to',
                     'required': True
-                }
+                },
+                'chunk-size': {
+                    'help': 'Grid squares per uploaded ARIA record (overrides config.yaml)',
+                    'required': False
+                },
+                'upload-workers': {
+                    'help': 'Maximum concurrent chunk uploads (overrides config.yaml)',
+                    'required': False
+                },
+                'grid-square-workers': {
+                    'help': 'Maximum concurrent grid square requests (overrides config.yaml)',
+                    'required': False
+                },
+                'foil-hole-workers': {
+                    'help': 'Maximum concurrent foil hole requests (overrides config.yaml)',
+                    'required': False
+                },
+                'micrograph-workers': {
+                    'help': 'Maximum concurrent micrograph requests (overrides config.yaml)',
+                    'required': False
+                },
+                'incremental': {
+                    'help': 'Only fetch grid squares and foil holes changed since the last extraction (true/false)',
+                    'required': False
+                },
+                'resume': {
+                    'help': 'Continue an interrupted extraction from its last checkpoint (true/false)',
+                    'required': False
+                },
+                **SCOPE_ARGS,
+                **INSTRUMENTATION_ARGS
+            }
+        })
+
+        cls.define_arg(ACTION_EXPORT, {
+            'help': {
+                'usage': '[--directory DIR] [--format parquet|arrow]',
+                'epilog': '--directory /dls/exports --format arrow'
+            },
+            'args': {
+                'directory': {
+                    'help': 'Root directory of the exported tables (overrides config.yaml)',
+                    'required': False
+                },
+                'format': {
+                    'help': 'parquet, or arrow for memory-mappable Arrow IPC files (overrides config.yaml)',
+                    'required': False
+                },
+                **INSTRUMENTATION_ARGS
+            }
+        })
+
+        cls.define_arg(ACTION_WATCH, {
+            'help': {
+                'usage': '--acquisition-id ACQUISITION_ID [--interval SECONDS] [--max-polls N] '
+                         '[--idle-timeout SECONDS] [--depth LEVEL] [--atlas false] [--quality-predictions false] '
+                         '[--grid-square-status STATUS,...] [--min-quality VALUE]',
+                'epilog': '--acquisition-id a1b2c3d4-e5f6-7890-abcd-ef1234567890 --interval 20 --idle-timeout 3600'
+            },
+            'args': {
+                'acquisition-id': {
+                    'help': 'UUID of the live SmartEM acquisition to follow',
+                    'required': True
+                },
+                'interval': {
+                    'help': 'Seconds between polls (overrides config.yaml)',
+                    'required': False
+                },
+                'max-polls': {
+                    'help': 'Stop after this many polls',
+                    'required': False
+                },
+                'idle-timeout': {
+                    'help': 'Stop after this many seconds without new data (overrides config.yaml)',
+                    'required': False
+                },
+                **SCOPE_ARGS,
+                **INSTRUMENTATION_ARGS
             }
         })
 
@@ -56,6 +323,10 @@ class Plugin(core.Plugin):
     def define_methods(cls):
         """Map actions to their implementation functions"""
 
-        cls.define_method(ACTION_GENERATE_METADATA, generate_metadata.perform_action)
-        cls.define_method(ACTION_SEND_METADATA, send_metadata.perform_action)
-        cls.define_method(ACTION_PRINT_PROJECT, print_project.perform_action)
+        cls.define_method(ACTION_GENERATE_METADATA, _lazy_action(ACTION_GENERATE_METADATA, 'generate_metadata'))
+        cls.define_method(ACTION_SEND_METADATA, _lazy_action(ACTION_SEND_METADATA, 'send_metadata'))
+        cls.define_method(ACTION_PRINT_PROJECT, _lazy_action(ACTION_PRINT_PROJECT, 'print_project'))
+        cls.define_method(ACTION_BATCH, _lazy_action(ACTION_BATCH, 'batch'))
+        cls.define_method(ACTION_GENERATE_AND_SEND, _lazy_action(ACTION_GENERATE_AND_SEND, 'generate_and_send'))
+        cls.define_method(ACTION_EXPORT, _lazy_action(ACTION_EXPORT, 'export'))
+        cls.define_method(ACTION_WATCH, _lazy_action(ACTION_WATCH, 'watch'))
@@ -0,0 +1,249 @@
+"""
+Batch action for DLS Cryo-EM plugin
+
+Extracts and deposits many acquisitions in one process, sharing SmartEM
+clients, the SmartEM response cache and a single ARIA login
+"""
+
+import configparser
+import csv
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from fandango_dls.actions import generate_metadata, send_metadata
+from fandango_dls.db.sqlite_db import get_processed_acquisitions, mark_acquisition_processed
+from fandango_dls.utils.cli import parse_flag, split_list
+from fandango_dls.utils.smartem_client import AcquisitionQuery
+
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+batch_config = config['BATCH'] if config.has_section('BATCH') else {}
+batch_parallel = int(batch_config.get('PARALLEL', 4))
+discovery_page_size = int(batch_config.get('DISCOVERY_PAGE_SIZE', 100))
+
+
+def batch_project_name(prefix, acquisition_id):
+    """Project name given to an acquisition that has no explicit one"""
+    return f'{prefix}_{acquisition_id}'
+
+
+def read_manifest(path, prefix, visit_id=None):
+    """
+    Read the items of a batch from a CSV manifest
+
+    The manifest has a header row with the columns acquisition_id, project and
+    visit_id, all optional per row: rows without acquisition_id only send an
+    already extracted project, rows without visit_id (and no default visit)
+    are only extracted. Lines starting with # are ignored.
+
+    Args:
+        path (str): Manifest file
+        prefix (str): Prefix of generated project names
+        visit_id (str): Default ARIA visit for rows without one
+
+    Returns:
+        items (list): Dictionaries with project, acquisition_id and visit_id
+    """
+    with open(path, newline='') as f:
+        rows = csv.DictReader(line for line in f if line.strip() and not line.lstrip().startswith('#'))
+        items = []
+        for row in rows:
+            acquisition_id = (row.get('acquisition_id') or '').strip() or None
+            project = (row.get('project') or '').strip() or None
+            if project is None and acquisition_id is None:
+                raise ValueError(f'Manifest row {rows.line_num} has neither project nor acquisition_id')
+            items.append({
+                'project': project or batch_project_name(prefix, acquisition_id),
+                'acquisition_id': acquisition_id,
+                'visit_id': (row.get('visit_id') or '').strip() or visit_id
+            })
+    return items
+
+
+def query_acquisitions(client, query, prefix, visit_id=None, new_only=False):
+    """
+    Build batch items for every SmartEM acquisition matching a query
+
+    Args:
+        client (FandanGOSmartEMClient): Connected SmartEM client
+        query (AcquisitionQuery): Start date range, statuses and instruments
+        prefix (str): Prefix of generated project names
+        visit_id (str): ARIA visit to send every project to, if any
+        new_only (bool): Skip acquisitions already processed, unless their
+            status changed since (e.g. a session that was still running)
+
+    Returns:
+        items (list): Dictionaries with project, acquisition_id and visit_id
+    """
+    processed = get_processed_acquisitions(query.since) if new_only else {}
+    items = []
+    skipped = 0
+    for acquisition in client.iter_acquisitions(query):
+        if acquisition['uuid'] in processed and processed[acquisition['uuid']] == acquisition.get('status'):
+            skipped += 1
+            continue
+        items.append({
+            'project': batch_project_name(prefix, acquisition['uuid']),
+            'acquisition_id': acquisition['uuid'],
+            'visit_id': visit_id
+        })
+    if new_only:
+        print(f'... {len(items) + skipped} acquisitions found, {skipped} already processed')
+    return items
+
+
+def run_batch(project_prefix, manifest=None, since=None, visit_id=None, parallel=None, incremental=False,
+              until=None, statuses=None, instruments=None, new_only=False):
+    """
+    Extract and send many acquisitions with shared clients
+
+    Up to `parallel` items are processed at once. Each worker borrows one of
+    `parallel` SmartEM clients, which share the response cache, and all
+    depositions share one ARIA login. An acquisition is recorded as processed,
+    and skipped by later new-only runs, only once its whole item succeeded.
+
+    Args:
+        project_prefix (str): Prefix of generated project names
+        manifest (str): CSV manifest file, see read_manifest
+        since (str): Process every acquisition started since this ISO date instead of a manifest
+        visit_id (str): Default ARIA visit; items without a visit are only extracted
+        parallel (int): Number of items processed at once, defaults to config.yaml
+        incremental (bool): Extract incrementally against previous extractions
+        until (str): With since, only acquisitions started before this ISO date
+        statuses (list): With since, only acquisitions in these statuses
+        instruments (list): With since, only acquisitions on these instruments
+        new_only (bool): With since, skip acquisitions already processed
+
+    Returns:
+        success (bool): Whether every item succeeded
+        info (dict): Per-item results and timings
+    """
+    print('FandanGO will run a batch of extractions and depositions...')
+    success = False
+    info = None
+    parallel = max(1, parallel or batch_parallel)
+    clients = queue.Queue()
+    cache = None
+    start = time.perf_counter()
+
+    try:
+        items = read_manifest(manifest, project_prefix, visit_id) if manifest else None
+
+        if items is None or any(item['acquisition_id'] for item in items):
+            cache = generate_metadata.open_response_cache()
+            for _ in range(parallel):
+                clients.put(generate_metadata.open_smartem_client(cache=cache))
+        if items is None:
+            client = clients.get()
+            try:
+                query = AcquisitionQuery(since, until, statuses, instruments, discovery_page_size)
+                items = query_acquisitions(client, query, project_prefix, visit_id, new_only)
+            finally:
+                clients.put(client)
+        print(f'... {len(items)} items, {parallel} at a time')
+
+        aria_client = None
+        if send_metadata.AriaClient is not None and any(item['visit_id'] for item in items):
+            aria_client = send_metadata.AriaClient(True)
+            aria_client.login()
+
+        def process(item):
+            result = dict(item)
+            if item['acquisition_id']:
+                client = clients.get()
+                item_start = time.perf_counter()
+                try:
+                    ok, item_info = generate_metadata.generate_metadata_from_smartem(
+                        item['project'], item['acquisition_id'], incremental=incremental, client=client,
+                        mark_processed=False)
+                finally:
+                    clients.put(client)
+                result['extract'] = {'success': ok, 'seconds': round(time.perf_counter() - item_start, 3)}
+                if not ok:
+                    result['extract']['error'] = item_info
+                    result['success'] = False
+                    return result
+            if item['visit_id']:
+                item_start = time.perf_counter()
+                ok, item_info = send_metadata.send_metadata_to_aria(item['project'], item['visit_id'],
+                                                                    aria_client=aria_client)
+                result['send'] = {'success': ok, 'seconds': round(time.perf_counter() - item_start, 3)}
+                if not ok:
+                    result['send']['error'] = item_info
+                    result['success'] = False
+                    return result
+            if item['acquisition_id']:
+                mark_acquisition_processed(item['acquisition_id'], item['project'])
+            result['success'] = True
+            return result
+
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='batch') as executor:
+            results = list(executor.map(process, items))
+
+        def outcome(step):
+            return '-' if step is None else f"{'ok' if step['success'] else 'FAILED'} ({step['seconds']}s)"
+
+        print(tabulate([[r['project'], r['acquisition_id'] or '-', outcome(r.get('extract')), outcome(r.get('send'))]
+                        for r in results],
+                       headers=['project', 'acquisition', 'extract', 'send'], tablefmt='pretty'))
+
+        failed = sum(1 for r in results if not r['success'])
+        success = failed == 0
+        info = {
+            'items': results,
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+        print(f"... batch finished in {info['seconds']}s: {info['succeeded']} succeeded, {failed} failed")
+
+    except Exception as e:
+        info = f'... batch failed: {e}'
+        print(info)
+
+    finally:
+        while not clients.empty():
+            clients.get().close()
+        if cache:
+            cache.close()
+
+    return success, info
+
+
+def perform_action(args):
+    """
+    Entry point for the batch action
+
+    Args:
+        args (dict): Dictionary containing:
+            - name: Prefix of the project names created for acquisitions
+            - manifest: CSV manifest of acquisitions/projects (or since)
+            - since: ISO date; process every acquisition started since then (or manifest)
+            - visit-id (optional): default ARIA visit to send projects to
+            - parallel (optional): number of items processed at once
+            - incremental (optional): extract incrementally
+            - until, status, instrument (optional): further filters of since
+            - new-only (optional): with since, skip acquisitions already processed
+
+    Returns:
+        dict: Results dictionary with success status and info
+    """
+    if bool(args.get('manifest')) == bool(args.get('since')):
+        return {'success': False, 'info': 'Exactly one of --manifest or --since must be given'}
+
+    success, info = run_batch(
+        args['name'],
+        manifest=args.get('manifest'),
+        since=args.get('since'),
+        visit_id=args.get('visit-id'),
+        parallel=int(args['parallel']) if args.get('parallel') else None,
+        incremental=parse_flag(args.get('incremental')),
+        until=args.get('until'),
+        statuses=split_list(args.get('status')),
+        instruments=split_list(args.get('instrument')),
+        new_only=parse_flag(args.get('new-only'))
+    )
+    results = {'success': success, 'info': info}
+    return results
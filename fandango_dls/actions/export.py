@@ -0,0 +1,75 @@
+"""
+Export action for DLS Cryo-EM plugin
+
+Writes the stored metadata of a project's acquisition as columnar tables
+(Parquet or Arrow IPC), one per hierarchy level, for analysis with pandas,
+Polars, DuckDB or Spark
+"""
+
+import configparser
+import os
+from tabulate import tabulate
+from fandango_dls.db.sqlite_db import get_project_acquisition
+from fandango_dls.utils.columnar_export import export_acquisition, FORMAT_PARQUET
+
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+export_config = config['EXPORT'] if config.has_section('EXPORT') else {}
+export_format = export_config.get('FORMAT', FORMAT_PARQUET)
+export_directory = export_config.get('DIRECTORY', 'export')
+
+
+def export_project(project_name, directory=None, fmt=None):
+    """
+    Export the extracted metadata of a FandanGO project as columnar tables
+
+    Args:
+        project_name (str): Name of the project
+        directory (str): Root directory of the exported tables
+        fmt (str): 'parquet' or 'arrow'
+
+    Returns:
+        success (bool): Whether the operation succeeded
+        info: Exported tables with their path, rows and bytes, or error message
+    """
+    directory = directory or export_directory
+    fmt = fmt or export_format
+    success = False
+    info = None
+
+    try:
+        acquisition_id = get_project_acquisition(project_name)
+        if not acquisition_id:
+            info = f'Project {project_name} has no extracted acquisition'
+            print(info)
+            return success, info
+
+        print(f'... exporting acquisition {acquisition_id} as {fmt} to {directory}')
+        exported = export_acquisition(acquisition_id, directory, fmt)
+        print(tabulate([[name, table['rows'], table['bytes'], table['path']] for name, table in exported.items()],
+                       headers=['Table', 'Rows', 'Bytes', 'Path'], tablefmt="pretty"))
+        success = True
+        info = {'acquisition_id': acquisition_id, 'format': fmt, 'tables': exported}
+    except Exception as e:
+        info = f'Error exporting project: {e}'
+        print(info)
+
+    return success, info
+
+
+def perform_action(args):
+    """
+    Entry point for the export action
+
+    Args:
+        args (dict): Dictionary containing:
+            - name: Project name
+            - directory: Root directory of the exported tables (optional)
+            - format: parquet or arrow (optional)
+
+    Returns:
+        dict: Results dictionary with success status and info
+    """
+    success, info = export_project(args['name'], args.get('directory'), args.get('format'))
+    results = {'success': success, 'info': info}
+    return results
@@ -0,0 +1,203 @@
+"""
+Generate-and-send action for DLS Cryo-EM plugin
+
+Extracts metadata from SmartEM and deposits it in ARIA as a pipeline: grid
+square chunks are uploaded while later grids are still being extracted,
+and everything is also stored locally as generate-metadata would.
+"""
+
+import threading
+import time
+from fandango_dls.actions import generate_metadata, send_metadata
+from fandango_dls.db.sqlite_db import (
+    update_project,
+    store_metadata_nodes,
+    get_project_data_location,
+    get_acquisition,
+    mark_acquisition_processed,
+    ExtractionState,
+    DepositionLedger
+)
+from fandango_dls.utils.aria_upload import AriaSession, ChunkedUploader, ChunkQueue, chunk_metadata_nodes
+from fandango_dls.utils.cli import parse_flag
+from fandango_dls.utils.metadata_writer import write_metadata_blob
+from fandango_dls.utils.summaries import summarize_metadata_nodes
+
+# Grid squares per chunk when config.yaml does not enable chunking
+DEFAULT_CHUNK_GRID_SQUARES = 50
+
+
+def generate_and_send_metadata(project_name, acquisition_id, visit_id, max_workers=None, chunk_size=None,
+                               upload_workers=None, incremental=False, resume=False, scope=None):
+    """
+    Extract metadata from SmartEM and upload it to ARIA concurrently
+
+    Extraction runs in a background thread feeding completed chunks through a
+    bounded queue to the uploader, so wall time approaches the slower of the
+    two stages rather than their sum.
+
+    Args:
+        project_name (str): FandanGO project name
+        acquisition_id (str): UUID of the SmartEM acquisition
+        visit_id (int): ARIA visit ID
+        max_workers (dict): Per-level SmartEM concurrency limits, defaults to config.yaml values
+        chunk_size (int): Grid squares per uploaded record, defaults to config.yaml
+        upload_workers (int): Concurrent chunk uploads, defaults to config.yaml
+        incremental (bool): Reuse unchanged grid squares and foil holes from the previous extraction
+        resume (bool): Continue an interrupted extraction from its last checkpoint
+        scope (ExtractionScope): Levels, grid squares and fields to extract, defaults to config.yaml
+
+    Returns:
+        success (bool): Whether extraction and deposition succeeded
+        info (dict): Information about the extracted and deposited metadata
+    """
+
+    print(f'FandanGO will extract metadata from SmartEM and send it to ARIA for project {project_name}...')
+    success = False
+    info = None
+
+    if send_metadata.AriaClient is None:
+        info = "ARIA client not available. Please install fandanGO-aria package."
+        print(info)
+        return success, info
+
+    chunk_size = chunk_size or send_metadata.aria_chunk_grid_squares or DEFAULT_CHUNK_GRID_SQUARES
+    upload_workers = upload_workers or send_metadata.aria_upload_workers
+    start = time.perf_counter()
+
+    try:
+        scope = scope or generate_metadata.extraction_scope()
+        with generate_metadata.open_smartem_client(max_workers) as client:
+            session = AriaSession(visit_id, DepositionLedger(project_name, visit_id))
+            uploader = ChunkedUploader(session, max_workers=upload_workers, retry=send_metadata.aria_retry_policy())
+            chunks = ChunkQueue(maxsize=upload_workers)
+            extraction = {}
+
+            def extract():
+                extraction_start = time.perf_counter()
+                try:
+                    state = ExtractionState(acquisition_id, reuse=incremental, resume=resume, scope_key=scope.key)
+                    nodes = store_metadata_nodes(acquisition_id,
+                                                 client.iter_acquisition_metadata(acquisition_id, state, scope), state)
+                    nodes = summarize_metadata_nodes(acquisition_id, nodes)
+                    nodes = chunk_metadata_nodes(acquisition_id, nodes, chunk_size, chunks.put)
+                    extraction['blob'], extraction['summary'] = write_metadata_blob(nodes)
+                except BaseException as e:
+                    chunks.finish(e)
+                else:
+                    chunks.finish()
+                finally:
+                    extraction['seconds'] = time.perf_counter() - extraction_start
+
+            print(f'... extracting acquisition {acquisition_id} while uploading chunks of {chunk_size} grid squares '
+                  f'with {upload_workers} workers')
+            producer = threading.Thread(target=extract, name='extract', daemon=True)
+            producer.start()
+            try:
+                entries = uploader.upload(chunks)
+            except BaseException:
+                chunks.abort()
+                raise
+            finally:
+                producer.join()
+
+            summary = extraction['summary']
+            acquisition_info, _ = get_acquisition(acquisition_id)
+            record_id, field_id = uploader.push_index(acquisition_info, entries)
+            summary_record_id = send_metadata.deposit_summary(uploader, acquisition_id)
+
+            data_location = get_project_data_location(project_name)
+            if data_location:
+                uploader.deposit('data_location', data_location, schema='Generic', field_type='DATA_LOCATION')
+
+            # Store in database
+            update_project(project_name, 'acquisition_id', acquisition_id)
+            update_project(project_name, 'metadata_blob', extraction['blob'])
+            mark_acquisition_processed(acquisition_id, project_name)
+
+            stats = uploader.stats()
+            success = True
+            info = {
+                'acquisition_id': acquisition_id,
+                'num_grids': summary['num_grids'],
+                'num_grid_squares': summary['num_grid_squares'],
+                'acquisition_name': summary['acquisition_name'],
+                'metadata_blob': extraction['blob'],
+                'smartem_requests': sum(client.call_counts.values()),
+                'reused': dict(client.reuse_counts),
+                'completeness': client.completeness_report(),
+                'scope': scope.key or 'full',
+                'record_id': record_id,
+                'field_id': field_id,
+                'num_chunks': len(entries),
+                'summary_record_id': summary_record_id,
+                'bucket': session.bucket_details(),
+                'visit_id': visit_id,
+                'upload': stats,
+                'timings': {
+                    'extract_seconds': round(extraction['seconds'], 3),
+                    'upload_seconds': stats['elapsed_seconds'],
+                    'total_seconds': round(time.perf_counter() - start, 3)
+                }
+            }
+            if not info['completeness']['complete']:
+                print(f"... WARNING: {len(info['completeness']['failures'])} subtrees could not be fetched:")
+                for failure in info['completeness']['failures']:
+                    print(f"...     {failure['level']} of {failure['parent_uuid']}: {failure['error']}")
+
+            print(f"... {summary['num_grids']} grids, {summary['num_grid_squares']} grid squares in {len(entries)} "
+                  f"chunks: {stats['pushed']} uploaded, {stats['skipped']} already deposited")
+            print('... extraction {extract_seconds}s, upload {upload_seconds}s, total {total_seconds}s'.format(
+                **info['timings']))
+            print(f'Successfully extracted and sent metadata for project {project_name} to ARIA!')
+
+    except ImportError as e:
+        info = f'... SmartEM client not available. Please install smartem-decisions package. Error: {e}'
+        print(info)
+
+    except Exception as e:
+        info = f'... failed to extract and send metadata: {e}'
+        print(info)
+
+    return success, info
+
+
+def perform_action(args):
+    """
+    Entry point for the generate-and-send action
+
+    Args:
+        args (dict): Dictionary containing:
+            - name: Project name
+            - acquisition-id: SmartEM acquisition UUID
+            - visit-id: ARIA visit ID
+            - grid-square-workers, foil-hole-workers, micrograph-workers (optional):
+              SmartEM concurrency limits overriding config.yaml
+            - chunk-size, upload-workers (optional): ARIA chunking overriding config.yaml
+            - incremental, resume (optional): as for generate-metadata
+            - depth, atlas, quality-predictions, grid-square-status,
+              min-quality (optional): extraction scope as for generate-metadata
+
+    Returns:
+        dict: Results dictionary with success status and info
+    """
+    max_workers = dict(generate_metadata.smartem_max_workers)
+    for arg, level in generate_metadata.WORKER_ARGS.items():
+        if args.get(arg):
+            max_workers[level] = int(args[arg])
+
+    try:
+        scope = generate_metadata.extraction_scope(args)
+    except ValueError as e:
+        return {'success': False, 'info': f'Invalid extraction scope: {e}'}
+
+    success, info = generate_and_send_metadata(
+        args['name'], args['acquisition-id'], args['visit-id'], max_workers,
+        chunk_size=int(args['chunk-size']) if args.get('chunk-size') else None,
+        upload_workers=int(args['upload-workers']) if args.get('upload-workers') else None,
+        incremental=parse_flag(args.get('incremental')),
+        resume=parse_flag(args.get('resume')),
+        scope=scope
+    )
+    results = {'success': success, 'info': info}
+    return results
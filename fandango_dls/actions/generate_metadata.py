@@ -6,22 +6,157 @@ Extracts metadata from SmartEM API and stores it for later ARIA submission
 
 import configparser
 import os
-import json
-from fandango_dls.db.sqlite_db import update_project
-from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+from contextlib import nullcontext
+from fandango_dls.constants import CACHE_DBNAME, SUMMARY_ACQUISITION
+from fandango_dls.db.sqlite_db import (
+    update_project,
+    store_metadata_nodes,
+    get_summaries,
+    mark_acquisition_processed,
+    ExtractionState
+)
+from fandango_dls.utils.cli import parse_flag, split_list
+from fandango_dls.utils.metadata_writer import write_metadata_blob
+from fandango_dls.utils.retry import RetryPolicy, CircuitBreaker
+from fandango_dls.utils.smartem_cache import SmartEMResponseCache
+from fandango_dls.utils.summaries import summarize_metadata_nodes
+from fandango_dls.utils.transport import TransportSettings
+from fandango_dls.utils.smartem_client import (
+    FandanGOSmartEMClient,
+    ExtractionScope,
+    PROJECTABLE_KINDS,
+    LEVEL_GRID_SQUARES,
+    LEVEL_FOIL_HOLES,
+    LEVEL_MICROGRAPHS
+)
 
 config = configparser.ConfigParser()
 config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
 smartem_api_url = config['SMARTEM'].get('API_URL', 'http://localhost:8000')
+smartem_max_workers = {
+    LEVEL_GRID_SQUARES: config['SMARTEM'].getint('GRID_SQUARE_WORKERS', 1),
+    LEVEL_FOIL_HOLES: config['SMARTEM'].getint('FOIL_HOLE_WORKERS', 1),
+    LEVEL_MICROGRAPHS: config['SMARTEM'].getint('MICROGRAPH_WORKERS', 1)
+}
+smartem_bulk_fetch = config['SMARTEM'].getboolean('BULK_FETCH', False)
+smartem_cache_enabled = config['SMARTEM'].getboolean('CACHE', False)
+smartem_cache_ttl = config['SMARTEM'].getfloat('CACHE_TTL', 3600)
+smartem_cache_max_mb = config['SMARTEM'].getint('CACHE_MAX_MB', 1024)
+smartem_cache_immutable_statuses = config['SMARTEM'].get('CACHE_IMMUTABLE_STATUSES', 'completed').split(',')
+smartem_timeout = config['SMARTEM'].getfloat('REQUEST_TIMEOUT', 0)
+smartem_retry_attempts = config['SMARTEM'].getint('RETRY_ATTEMPTS', 3)
+smartem_retry_backoff = config['SMARTEM'].getfloat('RETRY_BACKOFF', 0.5)
+smartem_retry_max_backoff = config['SMARTEM'].getfloat('RETRY_MAX_BACKOFF', 30)
+smartem_circuit_failures = config['SMARTEM'].getint('CIRCUIT_FAILURE_THRESHOLD', 10)
+smartem_circuit_reset = config['SMARTEM'].getfloat('CIRCUIT_RESET_SECONDS', 30)
+smartem_pool_size = config['SMARTEM'].getint('HTTP_POOL_SIZE', 0)
+smartem_keepalive = config['SMARTEM'].getfloat('HTTP_KEEPALIVE', 30)
+smartem_http2 = config['SMARTEM'].getboolean('HTTP2', False)
+extraction_config = config['EXTRACTION'] if config.has_section('EXTRACTION') else {}
+extraction_depth = extraction_config.get('DEPTH', LEVEL_MICROGRAPHS)
+extraction_atlas = parse_flag(extraction_config.get('ATLAS', 'true'))
+extraction_quality = parse_flag(extraction_config.get('QUALITY_PREDICTIONS', 'true'))
+extraction_statuses = extraction_config.get('GRID_SQUARE_STATUSES', '')
+extraction_min_quality = extraction_config.get('MIN_QUALITY', '')
+extraction_fields = {kind: extraction_config.get(f'FIELDS_{kind.upper()}', '') for kind in PROJECTABLE_KINDS}
 
+# CLI arguments overriding the per-level concurrency limits from config.yaml
+WORKER_ARGS = {
+    'grid-square-workers': LEVEL_GRID_SQUARES,
+    'foil-hole-workers': LEVEL_FOIL_HOLES,
+    'micrograph-workers': LEVEL_MICROGRAPHS
+}
 
-def generate_metadata_from_smartem(project_name, acquisition_id):
+
+def open_response_cache():
+    """Open the persistent SmartEM response cache if it is enabled in config.yaml"""
+    if not smartem_cache_enabled:
+        return None
+    return SmartEMResponseCache(
+        os.path.join(config['DDBB'].get('DDBB_PATH'), CACHE_DBNAME),
+        ttl=smartem_cache_ttl,
+        max_bytes=smartem_cache_max_mb * 1024 ** 2,
+        immutable_statuses=[status.strip() for status in smartem_cache_immutable_statuses]
+    )
+
+
+def retry_policy():
+    """Retry policy and circuit breaker for SmartEM calls as configured in config.yaml"""
+    return RetryPolicy(
+        attempts=smartem_retry_attempts,
+        backoff=smartem_retry_backoff,
+        max_backoff=smartem_retry_max_backoff,
+        circuit_breaker=CircuitBreaker(smartem_circuit_failures, smartem_circuit_reset)
+    )
+
+
+def transport_settings():
+    """HTTP transport of SmartEM calls as configured in config.yaml"""
+    return TransportSettings(pool_size=smartem_pool_size, keepalive=smartem_keepalive, http2=smartem_http2)
+
+
+def extraction_scope(args=None):
+    """
+    Extraction scope as configured in config.yaml, overridden by CLI arguments
+
+    Args:
+        args (dict): Action arguments, optionally with depth, atlas,
+            quality-predictions, grid-square-status and min-quality
+
+    Returns:
+        ExtractionScope: Scope to extract with
+    """
+    args = args or {}
+    atlas = args.get('atlas')
+    quality = args.get('quality-predictions')
+    min_quality = args.get('min-quality') or extraction_min_quality
+    return ExtractionScope(
+        depth=args.get('depth') or extraction_depth,
+        atlas=extraction_atlas if atlas is None else parse_flag(atlas),
+        quality=extraction_quality if quality is None else parse_flag(quality),
+        statuses=split_list(args.get('grid-square-status') or extraction_statuses),
+        min_quality=float(min_quality) if min_quality else None,
+        fields={kind: split_list(names) for kind, names in extraction_fields.items()}
+    )
+
+
+def open_smartem_client(max_workers=None, cache=None):
+    """
+    Connect to the SmartEM API as configured in config.yaml
+
+    Args:
+        max_workers (dict): Per-level concurrency limits, defaults to config.yaml values
+        cache (SmartEMResponseCache): Response cache to use instead of opening the configured one,
+            False for no cache
+
+    Returns:
+        FandanGOSmartEMClient: Client to be closed by the caller
+    """
+    if cache is None:
+        cache = open_response_cache()
+    elif cache is False:
+        cache = None
+    return FandanGOSmartEMClient(base_url=smartem_api_url, max_workers=max_workers or smartem_max_workers,
+                                 bulk_fetch=smartem_bulk_fetch, cache=cache,
+                                 retry=retry_policy(), timeout=smartem_timeout or None,
+                                 transport=transport_settings())
+
+
+def generate_metadata_from_smartem(project_name, acquisition_id, max_workers=None, incremental=False,
+                                   resume=False, client=None, scope=None, mark_processed=True):
     """
     Extract metadata from SmartEM API for a given acquisition
 
     Args:
         project_name (str): FandanGO project name
         acquisition_id (str): UUID of the SmartEM acquisition
+        max_workers (dict): Per-level concurrency limits, defaults to config.yaml values
+        incremental (bool): Reuse unchanged grid squares and foil holes from the previous extraction
+        resume (bool): Continue an interrupted extraction from its last checkpoint
+        client (FandanGOSmartEMClient): Already connected client to reuse; it is left open
+        scope (ExtractionScope): Levels, grid squares and fields to extract, defaults to config.yaml
+        mark_processed (bool): Record the acquisition as processed once extracted; callers that
+            also deposit it record it themselves once the deposition succeeds
 
     Returns:
         success (bool): Whether extraction succeeded
@@ -33,35 +168,56 @@ def generate_metadata_from_smartem(project_name, acquisition_id):
     info = None
 
     try:
+        scope = scope or extraction_scope()
+
         # Connect to SmartEM API
-        with FandanGOSmartEMClient(base_url=smartem_api_url) as client:
+        with nullcontext(client) if client else open_smartem_client(max_workers) as client:
             print(f'... connecting to SmartEM API at {smartem_api_url}')
+            # Clients passed in by the caller may have no retry policy
+            retries = client.retry.retries if client.retry else 0
 
-            # Extract full acquisition metadata
+            # Stream acquisition metadata to a compressed blob as it is extracted
             print(f'... extracting metadata for acquisition {acquisition_id}')
-            metadata = client.extract_acquisition_metadata(acquisition_id)
-
-            # Convert to JSON string for storage
-            metadata_json = json.dumps(metadata, indent=2)
+            if scope.key:
+                print(f'... extraction limited to {scope.key}')
+            state = ExtractionState(acquisition_id, reuse=incremental, resume=resume, scope_key=scope.key)
+            nodes = store_metadata_nodes(acquisition_id, client.iter_acquisition_metadata(acquisition_id, state, scope),
+                                         state)
+            metadata_blob, summary = write_metadata_blob(summarize_metadata_nodes(acquisition_id, nodes))
+            statistics = (get_summaries(acquisition_id, SUMMARY_ACQUISITION) or [{}])[0]
 
             # Store in database
             update_project(project_name, 'acquisition_id', acquisition_id)
-            update_project(project_name, 'metadata_json', metadata_json)
+            update_project(project_name, 'metadata_blob', metadata_blob)
+            if mark_processed:
+                mark_acquisition_processed(acquisition_id, project_name)
 
-            # Generate summary info
-            num_grids = len(metadata.get('grids', []))
-            num_grid_squares = sum(
-                len(g.get('grid_squares', []))
-                for g in metadata.get('grids', [])
-            )
+            num_grids = summary['num_grids']
+            num_grid_squares = summary['num_grid_squares']
 
             success = True
             info = {
                 'acquisition_id': acquisition_id,
                 'num_grids': num_grids,
                 'num_grid_squares': num_grid_squares,
-                'acquisition_name': metadata.get('acquisition', {}).get('name', 'Unknown')
+                'num_foil_holes': statistics.get('num_foil_holes'),
+                'num_micrographs': statistics.get('num_micrographs'),
+                'acquisition_name': summary['acquisition_name'],
+                'metadata_blob': metadata_blob,
+                'smartem_requests': sum(client.call_counts.values()),
+                'reused': dict(client.reuse_counts),
+                'retries': (client.retry.retries if client.retry else 0) - retries,
+                'completeness': client.completeness_report(),
+                'scope': scope.key or 'full'
             }
+            if not info['completeness']['complete']:
+                print(f"... WARNING: {len(info['completeness']['failures'])} subtrees could not be fetched:")
+                for failure in info['completeness']['failures']:
+                    print(f"...     {failure['level']} of {failure['parent_uuid']}: {failure['error']}")
+            if client.cache:
+                info['cache'] = client.cache.stats()
+                print('... SmartEM response cache: {hits} hits, {misses} misses, {evictions} evictions'.format(
+                    **info['cache']))
 
             print(f'... successfully extracted metadata for {num_grids} grids, {num_grid_squares} grid squares')
 
@@ -87,10 +243,33 @@ def perform_action(args):
         args (dict): Dictionary containing:
             - name: Project name
             - acquisition-id: SmartEM acquisition UUID
+            - grid-square-workers, foil-hole-workers, micrograph-workers (optional):
+              concurrency limits overriding config.yaml
+            - incremental (optional): only fetch grid squares and foil holes
+              that changed since the previous extraction
+            - resume (optional): continue an interrupted extraction from its
+              last checkpoint
+            - depth, atlas, quality-predictions, grid-square-status,
+              min-quality (optional): extraction scope overriding config.yaml
 
     Returns:
         dict: Results dictionary with success status and info
     """
-    success, info = generate_metadata_from_smartem(args['name'], args['acquisition-id'])
+    max_workers = dict(smartem_max_workers)
+    for arg, level in WORKER_ARGS.items():
+        if args.get(arg):
+            max_workers[level] = int(args[arg])
+
+    try:
+        scope = extraction_scope(args)
+    except ValueError as e:
+        return {'success': False, 'info': f'Invalid extraction scope: {e}'}
+
+    success, info = generate_metadata_from_smartem(
+        args['name'], args['acquisition-id'], max_workers,
+        incremental=parse_flag(args.get('incremental')),
+        resume=parse_flag(args.get('resume')),
+        scope=scope
+    )
     results = {'success': success, 'info': info}
     return results
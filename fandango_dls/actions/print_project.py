@@ -1,33 +1,145 @@
 """
 Print project action for DLS Cryo-EM plugin
 
-Displays stored project information from the database
+Displays stored project information from the database: a page of project
+keys with the sizes of their values, precomputed acquisition statistics,
+and optionally a tree summary of the stored hierarchy or the part of the
+metadata selected by a JSON path
 """
 
-from fandango_dls.db.sqlite_db import get_project_info
+import math
+from fandango_dls.constants import SUMMARY_ACQUISITION
+from fandango_dls.db.sqlite_db import get_acquisition_counts, get_project_acquisition, get_project_keys, get_summaries
+from fandango_dls.utils.cli import parse_flag
+from fandango_dls.utils.serialization import dumps
 from tabulate import tabulate
 
+# Keys listed per page
+PAGE_SIZE = 50
 
-def print_project(project_name):
+# Columns of the statistics table: header, then the path of the value in a grid summary
+STATISTICS_COLUMNS = (
+    ('Grid squares', ('num_grid_squares',)),
+    ('Foil holes', ('num_foil_holes',)),
+    ('Micrographs', ('num_micrographs',)),
+    ('Quality p50', ('quality', 'p50')),
+    ('Defocus p50', ('micrographs', 'defocus', 'p50')),
+    ('Ice thickness p50', ('micrographs', 'ice_thickness', 'p50')),
+    ('CTF resolution p50', ('micrographs', 'ctf_max_resolution_estimate', 'p50')),
+    ('Micrographs/h', ('collection', 'micrographs_per_hour'))
+)
+
+
+def _statistic(summary, path):
+    """Value at a path of nested summary dictionaries, None if any level is missing"""
+    for key in path:
+        summary = summary.get(key) if isinstance(summary, dict) else None
+    return summary
+
+
+def statistics_table(summary):
+    """
+    Rows of the statistics table of an acquisition summary, one per grid plus a total
+
+    Args:
+        summary (dict): Acquisition summary as stored by summarize_metadata_nodes
+
+    Returns:
+        tuple: Column names and rows
+    """
+    headers = ['Grid'] + [header for header, _ in STATISTICS_COLUMNS]
+    rows = [[grid.get('name') or grid.get('uuid')] + [_statistic(grid, path) for _, path in STATISTICS_COLUMNS]
+            for grid in summary.get('grids', [])]
+    rows.append(['Total'] + [_statistic(summary, path) for _, path in STATISTICS_COLUMNS])
+    return headers, rows
+
+
+def tree_summary(acquisition_id):
+    """
+    Lines of an indented tree with the entities stored below each grid of an acquisition
+
+    Args:
+        acquisition_id (str): UUID of the acquisition
+
+    Returns:
+        list: Lines of the tree, and the (grid UUID, grid name, grid squares, foil holes,
+            micrographs) counts they show
+    """
+    counts = get_acquisition_counts(acquisition_id)
+    lines = [f'acquisition {acquisition_id} ({len(counts)} grids)']
+    for position, (grid_uuid, name, grid_squares, foil_holes, micrographs) in enumerate(counts):
+        branch = '└──' if position == len(counts) - 1 else '├──'
+        lines.append(f'{branch} grids[{position}] {name or grid_uuid}: {grid_squares} grid squares, '
+                     f'{foil_holes} foil holes, {micrographs} micrographs')
+    return lines, counts
+
+
+def print_project(project_name, page=1, page_size=PAGE_SIZE, key=None, tree=False, path=None):
     """
     Print information for a FandanGO project
 
+    Values are never loaded whole: keys are listed with the size of their
+    values and a short preview, and the metadata document is only read
+    through the stored hierarchy, down to what a JSON path selects.
+
     Args:
         project_name (str): Name of the project to display
+        page (int): Page of keys to display, starting at 1
+        page_size (int): Keys per page
+        key (str): Only display keys matching this glob pattern
+        tree (bool): Display a tree summary of the stored acquisition
+        path (str): JSON path into the metadata document to display, e.g. $.grids[0].grid_info
 
     Returns:
         success (bool): Whether the operation succeeded
-        info: Project information or error message
+        info: Project information and acquisition statistics, or error message
     """
     print('FandanGO project info:\n')
     success = False
     info = None
 
     try:
-        column_names, project_info = get_project_info(project_name)
-        print(tabulate(project_info, headers=column_names, tablefmt="pretty"))
+        total, project_info = get_project_keys(project_name, key, page_size, (page - 1) * page_size)
+        print(tabulate(project_info, headers=['Key', 'Size', 'Stored size', 'Value'], tablefmt="pretty"))
+        pages = max(1, math.ceil(total / page_size))
+        if project_info:
+            print(f'Keys {(page - 1) * page_size + 1}-{(page - 1) * page_size + len(project_info)} '
+                  f'of {total} (page {page} of {pages})')
+        else:
+            print(f'No keys on page {page} ({total} keys, {pages} pages)')
+        info = {'project': project_info, 'total_keys': total, 'page': page, 'pages': pages}
+
+        # Precomputed statistics, so the metadata document is never loaded
+        acquisition_id = get_project_acquisition(project_name)
+        summaries = get_summaries(acquisition_id, SUMMARY_ACQUISITION) if acquisition_id else []
+        statistics = summaries[0] if summaries else None
+        if statistics:
+            headers, rows = statistics_table(statistics)
+            print(f"\nAcquisition statistics ({statistics.get('name') or acquisition_id}):\n")
+            print(tabulate(rows, headers=headers, tablefmt="pretty"))
+        info['statistics'] = statistics
+
+        if (tree or path) and not acquisition_id:
+            info = f'Project {project_name} has no extracted acquisition'
+            print(info)
+            return success, info
+
+        if tree:
+            lines, info['tree'] = tree_summary(acquisition_id)
+            print('\nStored hierarchy:\n')
+            print('\n'.join(lines))
+
+        if path:
+            # Imported here, the query module is only needed to drill down
+            from fandango_dls.utils.metadata_query import query_metadata
+            canonical, info['result'] = query_metadata(acquisition_id, path)
+            print(f'\n{canonical}:\n')
+            print(dumps(info['result'], indent=2))
+
         success = True
-        info = project_info
+    except (LookupError, ValueError) as e:
+        info = f'Error querying project metadata: {e}'
+        print(info)
     except Exception as e:
         info = f'Error retrieving project info: {e}'
         print(info)
@@ -42,10 +154,21 @@ def perform_action(args):
     Args:
         args (dict): Dictionary containing:
             - name: Project name
+            - page: Page of keys to display (optional)
+            - page-size: Keys per page (optional)
+            - key: Glob pattern of the keys to display (optional)
+            - tree: Display a tree summary of the stored acquisition (optional)
+            - path: JSON path into the metadata to display (optional)
 
     Returns:
         dict: Results dictionary with success status and info
     """
-    success, info = print_project(args['name'])
+    try:
+        page = max(1, int(args.get('page') or 1))
+        page_size = max(1, int(args.get('page-size') or PAGE_SIZE))
+    except ValueError as e:
+        return {'success': False, 'info': f'Invalid page: {e}'}
+    success, info = print_project(args['name'], page, page_size, args.get('key'),
+                                  parse_flag(args.get('tree')), args.get('path'))
     results = {'success': success, 'info': info}
     return results
@@ -4,26 +4,111 @@ Send metadata action for DLS Cryo-EM plugin
 Sends extracted metadata to ARIA system
 """
 
-import json
-from datetime import datetime
-from fandango_dls.db.sqlite_db import get_project_metadata, get_project_data_location
+import configparser
+import os
+from fandango_dls.constants import SUMMARY_ACQUISITION
+from fandango_dls.db.sqlite_db import (
+    get_project_metadata,
+    get_project_data_location,
+    get_project_acquisition,
+    get_acquisition,
+    get_summaries,
+    DepositionLedger
+)
+from fandango_dls.utils.aria_upload import AriaSession, ChunkedUploader, iter_metadata_chunks, iter_document_chunks
+from fandango_dls.utils.retry import RetryPolicy
+from fandango_dls.utils.serialization import loads, DecodeError
 
 # Import ARIA client from fandanGO-aria
 try:
     from aria.client import AriaClient
-    from aria.data_manager import Bucket, Field
 except ImportError:
     AriaClient = None
     print("Warning: fandanGO-aria not available. Install to enable ARIA integration.")
 
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+aria_config = config['ARIA'] if config.has_section('ARIA') else {}
+aria_chunk_grid_squares = int(aria_config.get('CHUNK_GRID_SQUARES', 0))
+aria_upload_workers = int(aria_config.get('UPLOAD_WORKERS', 4))
+aria_retry_attempts = int(aria_config.get('RETRY_ATTEMPTS', 3))
+aria_retry_backoff = float(aria_config.get('RETRY_BACKOFF', 1))
 
-def send_metadata_to_aria(project_name, visit_id):
+
+def aria_retry_policy():
+    """Retry policy for ARIA calls as configured in config.yaml"""
+    return RetryPolicy(attempts=aria_retry_attempts, backoff=aria_retry_backoff)
+
+
+def deposit_summary(uploader, acquisition_id):
+    """
+    Deposit the precomputed statistics of an acquisition as a record of their own
+
+    Args:
+        uploader (ChunkedUploader): Uploader bound to the project's ARIA session
+        acquisition_id (str): UUID of the SmartEM acquisition
+
+    Returns:
+        Record ID of the summary, or None for projects extracted without statistics
+    """
+    summaries = get_summaries(acquisition_id, SUMMARY_ACQUISITION) if acquisition_id else []
+    if not summaries:
+        return None
+    record_id, _, _ = uploader.deposit('summary', summaries[0])
+    return record_id
+
+
+def send_chunked_metadata(project_name, uploader, chunk_size):
+    """
+    Upload the project metadata as concurrent per-chunk records plus an index record
+
+    Args:
+        project_name (str): FandanGO project name
+        uploader (ChunkedUploader): Uploader bound to the project's ARIA session
+        chunk_size (int): Maximum number of grid squares per chunk
+
+    Returns:
+        info (dict): Index record and field IDs and the number of chunks
+    """
+    acquisition_id = get_project_acquisition(project_name)
+    acquisition = get_acquisition(acquisition_id) if acquisition_id else None
+    if acquisition is not None:
+        acquisition_info = acquisition[0]
+        chunks = iter_metadata_chunks(acquisition_id, chunk_size)
+    else:
+        # Projects extracted before the hierarchy was stored in tables
+        metadata_json_str = get_project_metadata(project_name)
+        if not metadata_json_str:
+            raise ValueError(f'No metadata found for project {project_name}. Run generate-metadata first.')
+        metadata = loads(metadata_json_str)
+        acquisition_info = metadata.get('acquisition')
+        chunks = iter_document_chunks(metadata, chunk_size)
+
+    print(f'... uploading metadata in chunks of {chunk_size} grid squares with {uploader.max_workers} workers')
+    entries = uploader.upload(chunks)
+    record_id, field_id = uploader.push_index(acquisition_info, entries)
+
+    return {
+        'record_id': record_id,
+        'field_id': field_id,
+        'num_chunks': len(entries)
+    }
+
+
+def send_metadata_to_aria(project_name, visit_id, chunk_size=None, upload_workers=None, aria_client=None):
     """
     Send FandanGO project metadata to ARIA
 
+    Entities already deposited for the project in this visit are recorded in
+    the deposition ledger; re-running only uploads content that changed.
+
     Args:
         project_name (str): FandanGO project name
         visit_id (int): ARIA visit ID
+        chunk_size (int): Grid squares per uploaded record, 0 for a single record;
+            defaults to config.yaml
+        upload_workers (int): Concurrent chunk uploads, defaults to config.yaml
+        aria_client (AriaClient): Logged-in client to share, a new login is made if needed otherwise
 
     Returns:
         success (bool): Whether submission succeeded
@@ -39,56 +124,60 @@ def send_metadata_to_aria(project_name, visit_id):
         print(info)
         return success, info
 
+    chunk_size = aria_chunk_grid_squares if chunk_size is None else chunk_size
+    upload_workers = upload_workers or aria_upload_workers
+
     try:
-        # Retrieve stored metadata from database
-        metadata_json_str = get_project_metadata(project_name)
-        if not metadata_json_str:
+        # Chunks are read from the stored hierarchy, so the whole metadata
+        # document is only loaded for a single-record upload
+        if chunk_size > 0:
+            metadata_json_str = None
+            extracted = get_project_acquisition(project_name) is not None
+        else:
+            metadata_json_str = get_project_metadata(project_name)
+            extracted = bool(metadata_json_str)
+        if not extracted:
             info = f"No metadata found for project {project_name}. Run generate-metadata first."
             print(info)
             return success, info
 
-        metadata = json.loads(metadata_json_str)
-
-        # Initialize ARIA client and login
-        aria = AriaClient(True)
-        aria.login()
-
-        # Create data bucket with embargo date (3 years from now)
-        today = datetime.today()
-        visit = aria.new_data_manager(int(visit_id), 'visit', True)
-        embargo_date = datetime(today.year + 3, today.month, today.day).strftime('%Y-%m-%d')
-        bucket = Bucket(visit.entity_id, visit.entity_type, embargo_date)
-        visit.push(bucket)
-
-        # Create record for DLS Cryo-EM metadata
-        record_dls_cryoem = visit.create_record(bucket.id, 'DLS_CRYOEM')
-
-        # Push SmartEM metadata as JSON field
-        field = Field(record_dls_cryoem.id, 'JSON', metadata)
-        visit.push(field)
-
-        if not isinstance(field, Field):
-            success = False
-            info = "Failed to create metadata field in ARIA"
-            return success, info
-
-        # Add data location reference if available
+        # ARIA login and bucket creation happen only if something needs uploading
+        session = AriaSession(visit_id, DepositionLedger(project_name, visit_id), client=aria_client)
+        uploader = ChunkedUploader(session, max_workers=upload_workers, retry=aria_retry_policy())
+
+        if chunk_size > 0:
+            info = send_chunked_metadata(project_name, uploader, chunk_size)
+        else:
+            # Push SmartEM metadata as a single JSON field of a DLS Cryo-EM record,
+            # parsed only if it was not deposited already
+            record_id, field_id, _ = uploader.deposit('document', None, serialized=metadata_json_str)
+            info = {
+                'record_id': record_id,
+                'field_id': field_id
+            }
+
+        # Add the acquisition statistics and data location reference if available
+        info['summary_record_id'] = deposit_summary(uploader, get_project_acquisition(project_name))
         data_location = get_project_data_location(project_name)
         if data_location:
-            record_data_location = visit.create_record(bucket.id, 'Generic')
-            location_field = Field(record_data_location.id, 'DATA_LOCATION', data_location)
-            visit.push(location_field)
+            uploader.deposit('data_location', data_location, schema='Generic', field_type='DATA_LOCATION')
+
+        stats = uploader.stats()
+        if stats['pushed']:
+            print(f'... uploaded {stats["pushed"]} entities, {stats["bytes_uploaded"]} bytes '
+                  f'(largest payload {stats["peak_payload_bytes"]} bytes), {stats["skipped"]} already deposited')
+            print(f'Successfully sent metadata for project {project_name} to ARIA!')
+        else:
+            print(f'Metadata for project {project_name} is already deposited in ARIA, nothing to send')
 
         success = True
-        print(f'Successfully sent metadata for project {project_name} to ARIA!')
-        info = {
-            'bucket': bucket.__dict__,
-            'record': record_dls_cryoem.__dict__,
-            'field': field.__dict__,
-            'visit_id': visit_id
-        }
-
-    except json.JSONDecodeError as e:
+        info.update({
+            'bucket': session.bucket_details(),
+            'visit_id': visit_id,
+            'upload': stats
+        })
+
+    except DecodeError as e:
         info = f"Failed to parse stored metadata: {e}"
         print(info)
     except Exception as e:
@@ -106,10 +195,14 @@ def perform_action(args):
         args (dict): Dictionary containing:
             - name: Project name
             - visit-id: ARIA visit ID
+            - chunk-size: Optional grid squares per uploaded record (0 = single record)
+            - upload-workers: Optional number of concurrent chunk uploads
 
     Returns:
         dict: Results dictionary with success status and info
     """
-    success, info = send_metadata_to_aria(args['name'], args['visit-id'])
+    chunk_size = int(args['chunk-size']) if args.get('chunk-size') is not None else None
+    upload_workers = int(args['upload-workers']) if args.get('upload-workers') is not None else None
+    success, info = send_metadata_to_aria(args['name'], args['visit-id'], chunk_size, upload_workers)
     results = {'success': success, 'info': info}
     return results
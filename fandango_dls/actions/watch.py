@@ -0,0 +1,355 @@
+"""
+Watch action for DLS Cryo-EM plugin
+
+Follows a live acquisition: one SmartEM client stays open while the
+acquisition is polled, each poll fetching only the grid squares and foil
+holes that changed since the previous one and appending them to the
+project store, until the session finishes
+"""
+
+import configparser
+import os
+import time
+from datetime import datetime
+from fandango_dls.actions import generate_metadata
+from fandango_dls.constants import NODE_ACQUISITION, SUMMARY_ACQUISITION
+from fandango_dls.db.sqlite_db import (
+    update_project,
+    store_metadata_nodes,
+    get_summaries,
+    iter_stored_metadata_nodes,
+    mark_acquisition_processed,
+    ExtractionState
+)
+from fandango_dls.utils.cli import split_list
+from fandango_dls.utils.metadata_writer import write_metadata_blob
+from fandango_dls.utils.metrics import metrics_directory, timed, write_prometheus_gauges
+from fandango_dls.utils.summaries import LiveSummaries
+
+config = configparser.ConfigParser()
+config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+watch_config = config['WATCH'] if config.has_section('WATCH') else {}
+watch_interval = float(watch_config.get('INTERVAL', 30))
+watch_idle_timeout = float(watch_config.get('IDLE_TIMEOUT', 0))
+watch_finished_statuses = split_list(watch_config.get('FINISHED_STATUSES', 'completed'))
+
+# Acquisition summary counts followed between polls
+COUNTS = ('num_grid_squares', 'num_foil_holes', 'num_micrographs')
+
+
+class WatchProgress:
+    """
+    Lag and throughput of a watch, updated after every poll
+
+    Counts start from the previous extraction of the acquisition, if any, so
+    only entities appended by the watch are counted as new. The lag of a
+    poll is the time from the acquisition of the latest micrograph to the
+    end of the poll that stored it.
+
+    Args:
+        statistics (dict): Acquisition summary of the previous extraction, or empty
+    """
+
+    def __init__(self, statistics):
+        self.started = time.time()
+        self.polls = 0
+        self.failed_polls = 0
+        self.counts = {name: statistics.get(name) or 0 for name in COUNTS}
+        self.new = dict.fromkeys(COUNTS, 0)
+        self.last_new = dict.fromkeys(COUNTS, 0)
+        self.last_poll_seconds = None
+        self.last_change = self.started
+        self.lag_seconds = None
+
+    def update(self, statistics, poll_seconds):
+        """Account a successful poll, given the acquisition summary it stored"""
+        now = time.time()
+        counts = {name: statistics.get(name) or 0 for name in COUNTS}
+        self.last_new = {name: max(0, counts[name] - self.counts[name]) for name in COUNTS}
+        for name in COUNTS:
+            self.new[name] += self.last_new[name]
+        self.counts = counts
+        self.polls += 1
+        self.last_poll_seconds = poll_seconds
+        if any(self.last_new.values()):
+            self.last_change = now
+        last_micrograph = (statistics.get('collection') or {}).get('last')
+        if self.last_new['num_micrographs'] and last_micrograph:
+            self.lag_seconds = max(0.0, now - datetime.fromisoformat(last_micrograph).timestamp())
+
+    def throughput(self):
+        """New micrographs stored per second since the watch started"""
+        return self.new['num_micrographs'] / max(time.time() - self.started, 1e-9)
+
+    def describe_poll(self):
+        """One-line report of the last poll"""
+        lag = f', lag {self.lag_seconds:.1f}s' if self.last_new['num_micrographs'] and self.lag_seconds is not None else ''
+        return (f"... poll {self.polls} in {self.last_poll_seconds:.2f}s: "
+                f"+{self.last_new['num_grid_squares']} grid squares, +{self.last_new['num_foil_holes']} foil holes, "
+                f"+{self.last_new['num_micrographs']} micrographs{lag}")
+
+    def gauges(self):
+        """Prometheus gauges of the watch"""
+        gauges = {
+            'watch_polls': (self.polls, 'Successful polls of the watched acquisition'),
+            'watch_failed_polls': (self.failed_polls, 'Failed polls of the watched acquisition'),
+            'watch_micrographs': (self.counts['num_micrographs'], 'Micrographs stored for the watched acquisition'),
+            'watch_micrographs_per_second': (round(self.throughput(), 4),
+                                             'New micrographs stored per second since the watch started'),
+            'watch_seconds_since_change': (round(time.time() - self.last_change, 3),
+                                           'Seconds since a poll last found new entities')
+        }
+        if self.last_poll_seconds is not None:
+            gauges['watch_last_poll_seconds'] = (round(self.last_poll_seconds, 4), 'Duration of the last poll')
+        if self.lag_seconds is not None:
+            gauges['watch_lag_seconds'] = (round(self.lag_seconds, 3),
+                                           'Seconds from acquisition of the latest micrograph to its storage')
+        return gauges
+
+    def report(self):
+        """Progress of the whole watch"""
+        return {
+            'polls': self.polls,
+            'failed_polls': self.failed_polls,
+            'seconds': round(time.time() - self.started, 3),
+            'counts': dict(self.counts),
+            'new': dict(self.new),
+            'micrographs_per_second': round(self.throughput(), 4),
+            'lag_seconds': None if self.lag_seconds is None else round(self.lag_seconds, 3)
+        }
+
+
+class WatchState(ExtractionState):
+    """
+    Extraction state kept for the whole watch of an acquisition
+
+    Grid square records and grid outlines are remembered between polls, so
+    finding out what changed costs no database reads after the first poll.
+    Grid squares found unchanged are passed on as their record only: their
+    subtree stays in the store, and LiveSummaries has their statistics.
+    """
+
+    def __init__(self, acquisition_id, scope_key=None):
+        super().__init__(acquisition_id, reuse=True, scope_key=scope_key)
+        self.infos = {}
+        self.grids = {}
+        self.reused = set()
+
+    def start_poll(self):
+        """Forget what the previous poll reused or failed to fetch"""
+        self.reused = set()
+        self.incomplete_grids = set()
+
+    def get_info(self, grid_square_uuid):
+        if grid_square_uuid not in self.infos:
+            info = super().get_info(grid_square_uuid)
+            if info is None:
+                return None
+            self.infos[grid_square_uuid] = info
+        return self.infos[grid_square_uuid]
+
+    def load(self, grid_square_uuid):
+        self.reused.add(grid_square_uuid)
+        return {'grid_square_info': self.infos[grid_square_uuid]}
+
+    def save(self, grid_square_uuid, subtree):
+        saved = super().save(grid_square_uuid, subtree)
+        if saved:
+            self.infos[grid_square_uuid] = subtree['grid_square_info']
+        return saved
+
+    def checkpoint_grid(self, grid_uuid, outline=None):
+        super().checkpoint_grid(grid_uuid, outline)
+        # Grids with failed grid squares are stored again by the next poll
+        if grid_uuid in self.incomplete_grids:
+            self.grids.pop(grid_uuid, None)
+        elif outline is not None:
+            self.grids[grid_uuid] = outline
+
+    def stored_grid(self, grid_uuid):
+        return self.grids.get(grid_uuid)
+
+
+class AcquisitionPoller:
+    """
+    Incremental extraction of a live acquisition into the store
+
+    The extraction state and statistics are kept from one poll to the next,
+    so the work of a poll, besides the listing requests, is proportional to
+    what changed since the previous one.
+
+    Args:
+        acquisition_id (str): UUID of the acquisition
+        scope (ExtractionScope): Levels, grid squares and fields to extract
+    """
+
+    def __init__(self, acquisition_id, scope):
+        self.acquisition_id = acquisition_id
+        self.scope = scope
+        self.state = WatchState(acquisition_id, scope_key=scope.key)
+        self.summaries = LiveSummaries(acquisition_id)
+
+    def poll(self, client):
+        """
+        Extract the acquisition into the store once
+
+        Grid squares unchanged since the previous poll are reused without
+        fetching their children, and so are the micrographs of unchanged
+        foil holes of changed grid squares. Only grids whose grid squares
+        changed are stored again, and only their summaries are updated.
+
+        Args:
+            client (FandanGOSmartEMClient): Open SmartEM client
+
+        Returns:
+            str: Status of the acquisition, None if unknown
+        """
+        self.state.start_poll()
+        nodes = store_metadata_nodes(self.acquisition_id,
+                                     client.iter_acquisition_metadata(self.acquisition_id, self.state, self.scope),
+                                     self.state)
+        status = None
+        for node_type, node in self.summaries.summarize(nodes, self.state.reused):
+            if node_type == NODE_ACQUISITION:
+                status = (node or {}).get('status')
+        return status
+
+
+def watch_acquisition(project_name, acquisition_id, interval=None, max_polls=None, idle_timeout=None, scope=None,
+                      metrics_dir=None):
+    """
+    Continuously ingest a live acquisition until it finishes
+
+    Polls start every `interval` seconds (or right after the previous one if
+    it took longer), so new data is stored at most one interval plus one
+    poll after SmartEM has it. The watch stops when the acquisition reaches
+    a finished status, after `max_polls` polls, after `idle_timeout` seconds
+    without new entities, or on Ctrl-C. The metadata document of the project
+    is then written from the store, without further API calls.
+
+    Args:
+        project_name (str): FandanGO project name
+        acquisition_id (str): UUID of the SmartEM acquisition
+        interval (float): Seconds between poll starts, defaults to config.yaml
+        max_polls (int): Stop after this many polls, None for no limit
+        idle_timeout (float): Stop after this many seconds without new entities, 0 for never
+        scope (ExtractionScope): Levels, grid squares and fields to extract, defaults to config.yaml
+        metrics_dir (str): Directory where the Prometheus gauges of the watch are refreshed after every poll
+
+    Returns:
+        success (bool): Whether the watch ran and its metadata was stored
+        info (dict): Lag and throughput of the watch and the stored metadata
+    """
+    print(f'FandanGO will watch acquisition {acquisition_id} for project {project_name}...')
+    success = False
+    info = None
+    interval = watch_interval if interval is None else interval
+    idle_timeout = watch_idle_timeout if idle_timeout is None else idle_timeout
+
+    try:
+        scope = scope or generate_metadata.extraction_scope()
+
+        # Responses of a live acquisition change between polls, so none are cached
+        with generate_metadata.open_smartem_client(cache=False) as client:
+            print(f'... connected to SmartEM API at {generate_metadata.smartem_api_url}, polling every {interval}s')
+            progress = WatchProgress((get_summaries(acquisition_id, SUMMARY_ACQUISITION) or [{}])[0])
+            update_project(project_name, 'acquisition_id', acquisition_id)
+            poller = AcquisitionPoller(acquisition_id, scope)
+            status = None
+
+            try:
+                while True:
+                    poll_start = time.perf_counter()
+                    try:
+                        with timed('watch.poll'):
+                            status = poller.poll(client)
+                        statistics = (get_summaries(acquisition_id, SUMMARY_ACQUISITION) or [{}])[0]
+                        progress.update(statistics, time.perf_counter() - poll_start)
+                        print(progress.describe_poll())
+                    except Exception as e:
+                        progress.failed_polls += 1
+                        print(f'... poll failed, retrying in {interval}s: {e}')
+
+                    if metrics_dir:
+                        try:
+                            write_prometheus_gauges(metrics_dir, 'watch', progress.gauges())
+                        except OSError as e:
+                            print(f'... could not write Prometheus metrics because of: {e}')
+
+                    if status in watch_finished_statuses:
+                        print(f'... acquisition is {status}, stopping')
+                        break
+                    if max_polls and progress.polls + progress.failed_polls >= max_polls:
+                        print(f'... {max_polls} polls done, stopping')
+                        break
+                    if idle_timeout and time.time() - progress.last_change >= idle_timeout:
+                        print(f'... no new data for {idle_timeout}s, stopping')
+                        break
+                    time.sleep(max(0.0, interval - (time.perf_counter() - poll_start)))
+            except KeyboardInterrupt:
+                print('... watch interrupted, storing what was extracted')
+
+            if not progress.polls:
+                info = f'... no poll of acquisition {acquisition_id} succeeded'
+                print(info)
+                return success, info
+
+            metadata_blob, summary = write_metadata_blob(iter_stored_metadata_nodes(acquisition_id))
+            update_project(project_name, 'metadata_blob', metadata_blob)
+            mark_acquisition_processed(acquisition_id, project_name)
+
+            success = True
+            info = {
+                'acquisition_id': acquisition_id,
+                'status': status,
+                'num_grids': summary['num_grids'],
+                'num_grid_squares': summary['num_grid_squares'],
+                'metadata_blob': metadata_blob,
+                **progress.report()
+            }
+            print(f"... watched {info['polls']} polls in {info['seconds']}s: "
+                  f"{info['new']['num_micrographs']} new micrographs, {info['micrographs_per_second']} per second")
+
+    except ImportError as e:
+        info = (
+            f'... SmartEM client not available. Please install smartem-decisions package '
+            f'or add it to PYTHONPATH. Error: {e}'
+        )
+        print(info)
+
+    except Exception as e:
+        info = f'... failed to watch acquisition: {e}'
+        print(info)
+
+    return success, info
+
+
+def perform_action(args):
+    """
+    Entry point for the watch action
+
+    Args:
+        args (dict): Dictionary containing:
+            - name: Project name
+            - acquisition-id: SmartEM acquisition UUID
+            - interval (optional): seconds between polls, overriding config.yaml
+            - max-polls (optional): stop after this many polls
+            - idle-timeout (optional): stop after this many seconds without new data
+            - depth, atlas, quality-predictions, grid-square-status,
+              min-quality (optional): extraction scope overriding config.yaml
+
+    Returns:
+        dict: Results dictionary with success status and info
+    """
+    try:
+        scope = generate_metadata.extraction_scope(args)
+        interval = float(args['interval']) if args.get('interval') else None
+        max_polls = int(args['max-polls']) if args.get('max-polls') else None
+        idle_timeout = float(args['idle-timeout']) if args.get('idle-timeout') else None
+    except ValueError as e:
+        return {'success': False, 'info': f'Invalid watch arguments: {e}'}
+
+    success, info = watch_acquisition(args['name'], args['acquisition-id'], interval, max_polls, idle_timeout,
+                                      scope, metrics_directory(args))
+    results = {'success': success, 'info': info}
+    return results
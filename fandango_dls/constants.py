@@ -5,9 +5,32 @@
 ACTION_GENERATE_METADATA = 'generate-metadata'
 ACTION_SEND_METADATA = 'send-metadata'
 ACTION_PRINT_PROJECT = 'print-project'
+ACTION_BATCH = 'batch'
+ACTION_GENERATE_AND_SEND = 'generate-and-send'
+ACTION_EXPORT = 'export'
+ACTION_WATCH = 'watch'
 
 #
 # DDBB
 #
 
 DBNAME = 'fandango-cryoem-dls.sqlite'
+CACHE_DBNAME = 'smartem-cache.sqlite'
+BLOBS_DIRNAME = 'blobs'
+
+#
+# Metadata stream node types (see FandanGOSmartEMClient.iter_acquisition_metadata)
+#
+
+NODE_ACQUISITION = 'acquisition'
+NODE_GRID = 'grid'
+NODE_GRID_SQUARE = 'grid_square'
+NODE_GRID_END = 'grid_end'
+
+#
+# Levels of precomputed statistics (see fandango_dls.utils.summaries)
+#
+
+SUMMARY_ACQUISITION = 'acquisition'
+SUMMARY_GRID = 'grid'
+SUMMARY_GRID_SQUARE = 'grid_square'
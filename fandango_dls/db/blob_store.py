@@ -0,0 +1,132 @@
+"""
+Content-addressed storage for metadata documents
+
+Metadata documents are stored as compact JSON, compressed with zstd when the
+zstandard package is installed (gzip otherwise), in files named after the
+SHA-256 of the uncompressed document. Identical extractions therefore map to
+the same blob and are only stored once.
+"""
+
+import gzip
+import hashlib
+import io
+import os
+import uuid
+
+from fandango_dls.constants import BLOBS_DIRNAME
+from fandango_dls.db import sqlite as ddbb
+from fandango_dls.db.sqlite import transaction, connect_to_ddbb
+from fandango_dls.utils.metrics import timed
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_ZSTD = 'zstd'
+CODEC_GZIP = 'gzip'
+CODEC_NONE = 'none'
+CODEC_EXTENSIONS = {CODEC_ZSTD: '.json.zst', CODEC_GZIP: '.json.gz', CODEC_NONE: '.json'}
+
+
+def default_codec():
+    """Codec configured as METADATA_CODEC in config.yaml, else the best one available"""
+    configured = ddbb.config['DDBB'].get('METADATA_CODEC')
+    if configured:
+        return configured
+    return CODEC_ZSTD if zstandard is not None else CODEC_GZIP
+
+
+def blob_path(digest, codec):
+    """Path of the blob holding the document with the given SHA-256"""
+    return os.path.join(ddbb.ddbb_path, BLOBS_DIRNAME, digest[:2], digest + CODEC_EXTENSIONS[codec])
+
+
+def _open_compressed(path, codec, mode):
+    """Open a binary stream that (de)compresses with the given codec"""
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise ImportError('zstandard is required to read or write zstd metadata blobs')
+        fp = open(path, mode)
+        if mode == 'wb':
+            return zstandard.ZstdCompressor(level=3).stream_writer(fp, closefd=True)
+        return zstandard.ZstdDecompressor().stream_reader(fp, closefd=True)
+    if codec == CODEC_GZIP:
+        return gzip.open(path, mode, compresslevel=6)
+    if codec == CODEC_NONE:
+        return open(path, mode)
+    raise ValueError(f'Unknown metadata blob codec: {codec}')
+
+
+class BlobWriter(io.TextIOBase):
+    """
+    Text stream that hashes and compresses everything written to it
+
+    The blob is written to a temporary file; commit() moves it to its
+    content-addressed path, or discards it if that blob already exists.
+    """
+
+    def __init__(self, codec=None):
+        self.codec = codec or default_codec()
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp_path = os.path.join(ddbb.ddbb_path, BLOBS_DIRNAME, f'.{uuid.uuid4().hex}.tmp')
+        os.makedirs(os.path.dirname(self._tmp_path), exist_ok=True)
+        self._fp = _open_compressed(self._tmp_path, self.codec, 'wb')
+
+    def write(self, text):
+        data = text.encode('utf-8')
+        self._hash.update(data)
+        self._fp.write(data)
+        self.size += len(data)
+        return len(text)
+
+    def commit(self):
+        """
+        Finish the blob and register it in the database
+
+        Returns:
+            str: SHA-256 hex digest identifying the blob
+        """
+        with timed('blob.commit') as sample:
+            self._fp.close()
+            digest = self._hash.hexdigest()
+            path = blob_path(digest, self.codec)
+            stored_size = sample['bytes'] = os.path.getsize(self._tmp_path)
+            if os.path.exists(path):
+                os.remove(self._tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(self._tmp_path, path)
+            with transaction() as cursor:
+                cursor.execute('INSERT OR IGNORE INTO metadata_blobs VALUES (?, ?, ?, ?)',
+                               (digest, self.codec, self.size, stored_size))
+        return digest
+
+    def discard(self):
+        """Abandon the blob, removing its temporary file"""
+        self._fp.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def read_blob(digest):
+    """
+    Read and decompress a stored metadata document
+
+    Args:
+        digest (str): SHA-256 hex digest returned by BlobWriter.commit
+
+    Returns:
+        str: The document, or None if the blob is unknown
+    """
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute('SELECT codec FROM metadata_blobs WHERE digest = ?', (digest,))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    with timed('blob.read') as sample:
+        with _open_compressed(blob_path(digest, result[0]), result[0], 'rb') as fp:
+            document = fp.read().decode('utf-8')
+        sample['bytes'] = len(document)
+    return document
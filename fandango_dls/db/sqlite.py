@@ -1,4 +1,7 @@
+import atexit
 import os
+import threading
+from contextlib import contextmanager
 from sqlite3 import dbapi2 as sqlite
 from fandango_dls.constants import DBNAME
 import configparser
@@ -8,20 +11,219 @@ config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file_
 ddbb_path = config['DDBB'].get('DDBB_PATH')
 
 
+# Tuning applied to every connection: WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL is durable under WAL except for the
+# last transactions before a power loss.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -65536',
+    'PRAGMA busy_timeout = 30000'
+)
+
+_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+_schema_ready = False
+_generation = 0
+
+
 def connect_to_ddbb():
-    connection = sqlite.connect(database=os.path.join(ddbb_path, DBNAME))
-    create_ddbb_data(connection)
+    """
+    Get the calling thread's database connection
+
+    Connections are opened once per thread and reused for the life of the
+    process, and the schema is only checked by the first connection. They
+    are in autocommit mode: transactions are only started by transaction().
+    """
+    global _schema_ready
+    connection = getattr(_local, 'connection', None)
+    if connection is None or _local.generation != _generation:
+        connection = sqlite.connect(database=os.path.join(ddbb_path, DBNAME), check_same_thread=False,
+                                    isolation_level=None)
+        for pragma in PRAGMAS:
+            connection.execute(pragma)
+        with _connections_lock:
+            if not _schema_ready:
+                create_ddbb_data(connection)
+                _schema_ready = True
+            _connections.append(connection)
+        _local.connection = connection
+        _local.generation = _generation
+        _local.depth = 0
     return connection
 
 
+@contextmanager
+def transaction():
+    """
+    Run a block of writes on the calling thread's connection as one transaction
+
+    Yields a cursor. The outermost block commits once on exit, or rolls back
+    if it raises, so wrapping many writes (e.g. executemany batches) in a
+    single block costs one commit. Nested blocks become savepoints of the
+    enclosing transaction. The outermost block takes the write lock up front
+    (BEGIN IMMEDIATE), so concurrent writers wait on busy_timeout instead of
+    failing to upgrade a read lock.
+    """
+    connection = connect_to_ddbb()
+    depth = _local.depth
+    cursor = connection.cursor()
+    cursor.execute(f'SAVEPOINT nested_{depth}' if depth else 'BEGIN IMMEDIATE')
+    _local.depth = depth + 1
+    try:
+        yield cursor
+    except BaseException:
+        # Including KeyboardInterrupt, so an interrupted run leaves no open
+        # transaction on the pooled connection
+        if depth:
+            cursor.execute(f'ROLLBACK TO nested_{depth}')
+            cursor.execute(f'RELEASE nested_{depth}')
+        else:
+            cursor.execute('ROLLBACK')
+        raise
+    else:
+        if depth:
+            cursor.execute(f'RELEASE nested_{depth}')
+        else:
+            cursor.execute('COMMIT')
+    finally:
+        _local.depth = depth
+
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# of them a database has already been through.
+MIGRATIONS = [
+    # 1: key/value project table and incremental extraction state
+    [
+        '''CREATE TABLE IF NOT EXISTS project_info (
+                project_name TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL);''',
+        '''CREATE TABLE IF NOT EXISTS grid_square_state (
+                acquisition_id TEXT NOT NULL,
+                grid_square_uuid TEXT NOT NULL,
+                subtree TEXT NOT NULL,
+                PRIMARY KEY (acquisition_id, grid_square_uuid));'''
+    ],
+    # 2: unique project keys and normalized acquisition hierarchy
+    [
+        '''DELETE FROM project_info WHERE rowid NOT IN (
+                SELECT MAX(rowid) FROM project_info GROUP BY project_name, key);''',
+        '''CREATE UNIQUE INDEX idx_project_info_key ON project_info (project_name, key);''',
+        '''CREATE TABLE projects (
+                project_name TEXT PRIMARY KEY);''',
+        '''INSERT INTO projects SELECT DISTINCT project_name FROM project_info;''',
+        '''CREATE TABLE acquisitions (
+                uuid TEXT PRIMARY KEY,
+                data TEXT NOT NULL);''',
+        '''CREATE TABLE grids (
+                uuid TEXT PRIMARY KEY,
+                acquisition_uuid TEXT NOT NULL REFERENCES acquisitions (uuid),
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                atlas TEXT);''',
+        '''CREATE INDEX idx_grids_acquisition ON grids (acquisition_uuid, position);''',
+        '''CREATE TABLE grid_squares (
+                uuid TEXT PRIMARY KEY,
+                grid_uuid TEXT REFERENCES grids (uuid),
+                position INTEGER,
+                data TEXT NOT NULL,
+                quality_prediction TEXT);''',
+        '''CREATE INDEX idx_grid_squares_grid ON grid_squares (grid_uuid, position);''',
+        '''CREATE TABLE foil_holes (
+                uuid TEXT PRIMARY KEY,
+                grid_square_uuid TEXT NOT NULL REFERENCES grid_squares (uuid),
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL);''',
+        '''CREATE INDEX idx_foil_holes_grid_square ON foil_holes (grid_square_uuid, position);''',
+        '''CREATE TABLE micrographs (
+                uuid TEXT PRIMARY KEY,
+                foil_hole_uuid TEXT NOT NULL REFERENCES foil_holes (uuid),
+                position INTEGER NOT NULL,
+                data TEXT NOT NULL);''',
+        '''CREATE INDEX idx_micrographs_foil_hole ON micrographs (foil_hole_uuid, position);''',
+        # Grid square subtrees now live in the normalized tables
+        '''DROP TABLE grid_square_state;'''
+    ],
+    # 3: content-addressed compressed metadata documents
+    [
+        '''CREATE TABLE metadata_blobs (
+                digest TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL);'''
+    ],
+    # 4: extraction checkpoints for resuming interrupted runs
+    [
+        '''CREATE TABLE extraction_checkpoints (
+                acquisition_id TEXT NOT NULL,
+                entity TEXT NOT NULL,
+                uuid TEXT NOT NULL,
+                PRIMARY KEY (acquisition_id, entity, uuid));'''
+    ],
+    # 5: ledger of entities deposited in ARIA; IDs keep the type ARIA returned
+    [
+        '''CREATE TABLE depositions (
+                project_name TEXT NOT NULL,
+                visit_id TEXT NOT NULL,
+                entity_key TEXT NOT NULL,
+                content_hash TEXT,
+                record_id,
+                field_id,
+                details TEXT,
+                deposited_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (project_name, visit_id, entity_key));'''
+    ],
+    # 6: precomputed statistics per grid square, grid and acquisition
+    [
+        '''CREATE TABLE summaries (
+                level TEXT NOT NULL,
+                uuid TEXT NOT NULL,
+                acquisition_uuid TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (level, uuid));''',
+        '''CREATE INDEX idx_summaries_acquisition ON summaries (acquisition_uuid, level);'''
+    ],
+    # 7: index of processed acquisitions, so discovery only returns new sessions
+    [
+        '''CREATE TABLE processed_acquisitions (
+                uuid TEXT PRIMARY KEY,
+                project_name TEXT NOT NULL,
+                status TEXT,
+                start_time TEXT,
+                processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);''',
+        '''INSERT OR IGNORE INTO processed_acquisitions (uuid, project_name, status, start_time)
+                SELECT p.value, p.project_name, json_extract(a.data, '$.status'), json_extract(a.data, '$.start_time')
+                FROM project_info p JOIN acquisitions a ON a.uuid = p.value
+                WHERE p.key = 'acquisition_id';'''
+    ]
+]
+
+
 def create_ddbb_data(connection):
     cursor = connection.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS project_info (
-                        project_name TEXT NOT NULL,
-                        key TEXT NOT NULL,
-                        value TEXT NOT NULL);''')
-    connection.commit()
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        cursor.execute('BEGIN')
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute(f'PRAGMA user_version = {number}')
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
 
+@atexit.register
+def close_connection_to_ddbb():
+    """Close every pooled connection; threads reconnect on their next call"""
+    global _schema_ready, _generation
+    with _connections_lock:
+        for connection in _connections:
+            connection.close()
+        _connections.clear()
+        _schema_ready = False
+        _generation += 1
 
-def close_connection_to_ddbb(connection):
-    connection.close()
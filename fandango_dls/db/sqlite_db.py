@@ -1,68 +1,747 @@
-from fandango_dls.db.sqlite import connect_to_ddbb, close_connection_to_ddbb
+import threading
+from fandango_dls.db.sqlite import connect_to_ddbb, transaction
+from fandango_dls.db.blob_store import read_blob
+from fandango_dls.constants import NODE_ACQUISITION, NODE_GRID, NODE_GRID_SQUARE, NODE_GRID_END
+from fandango_dls.utils.metrics import timed
+from fandango_dls.utils.serialization import dumps, loads
 
 
+@timed('db.update_project')
 def update_project(project_name, key, value):
     """Update or insert project information in the database"""
-    connection = None
     try:
-        connection = connect_to_ddbb()
-        cursor = connection.cursor()
-        cursor.execute('INSERT INTO project_info VALUES (?, ?, ?)', (project_name, key, value))
-        connection.commit()
+        with transaction() as cursor:
+            cursor.execute('INSERT OR IGNORE INTO projects VALUES (?)', (project_name,))
+            cursor.execute('INSERT INTO project_info VALUES (?, ?, ?) '
+                           'ON CONFLICT (project_name, key) DO UPDATE SET value = excluded.value',
+                           (project_name, key, value))
         print(f'... project {project_name} updated: "{key}" = "{value}"')
     except Exception as e:
         print(f'... project could not be updated because of: {e}')
-    finally:
-        if connection:
-            close_connection_to_ddbb(connection)
 
 
+@timed('db.get_project_info')
 def get_project_info(project_name):
     """Get all project information from the database"""
-    connection = None
     try:
-        connection = connect_to_ddbb()
-        cursor = connection.cursor()
+        cursor = connect_to_ddbb().cursor()
         cursor.execute('SELECT * FROM project_info WHERE project_name = ?', (project_name,))
         project_info = cursor.fetchall()
         column_names = [columns[0] for columns in cursor.description]
         return column_names, project_info
     except Exception as e:
         print(f'... could not check projects because of: {e}')
-    finally:
-        if connection:
-            close_connection_to_ddbb(connection)
 
 
+@timed('db.get_project_keys')
+def get_project_keys(project_name, key_pattern=None, limit=-1, offset=0, preview=60):
+    """
+    Get a page of project keys with the sizes of their values, without reading whole values
+
+    Args:
+        project_name (str): Name of the project
+        key_pattern (str): Only keys matching this glob pattern, e.g. 'metadata_*'
+        limit (int): Maximum number of keys, -1 for all of them
+        offset (int): Number of keys skipped
+        preview (int): Characters of each value returned
+
+    Returns:
+        total (int): Number of keys matching the pattern
+        rows (list): (key, size in bytes, stored size in bytes, value preview) tuples; the
+            sizes of a metadata blob are those of the document it points to
+    """
+    try:
+        cursor = connect_to_ddbb().cursor()
+        where = 'p.project_name = ?' + (' AND p.key GLOB ?' if key_pattern else '')
+        params = (project_name, key_pattern) if key_pattern else (project_name,)
+        cursor.execute(f'SELECT COUNT(*) FROM project_info p WHERE {where}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute('SELECT p.key, COALESCE(b.size, length(CAST(p.value AS BLOB))), '
+                       'COALESCE(b.stored_size, length(CAST(p.value AS BLOB))), '
+                       "CASE WHEN length(p.value) > ? THEN substr(p.value, 1, ?) || '...' ELSE p.value END "
+                       'FROM project_info p LEFT JOIN metadata_blobs b '
+                       "ON p.key = 'metadata_blob' AND b.digest = p.value "
+                       f'WHERE {where} ORDER BY p.key LIMIT ? OFFSET ?',
+                       (preview, preview) + params + (limit, offset))
+        return total, cursor.fetchall()
+    except Exception as e:
+        print(f'... could not check projects because of: {e}')
+        return 0, []
+
+
+@timed('db.get_project_metadata')
 def get_project_metadata(project_name):
-    """Get metadata JSON for a project"""
-    connection = None
+    """Get metadata JSON for a project, decompressing its stored metadata blob"""
     try:
-        connection = connect_to_ddbb()
-        cursor = connection.cursor()
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT value FROM project_info WHERE project_name = ? AND key = "metadata_blob"', (project_name,))
+        result = cursor.fetchone()
+        if result:
+            return read_blob(result[0])
+        # Older extractions stored a plain JSON file or the JSON text itself
+        cursor.execute('SELECT value FROM project_info WHERE project_name = ? AND key = "metadata_file"', (project_name,))
+        result = cursor.fetchone()
+        if result:
+            with open(result[0], encoding='utf-8') as f:
+                return f.read()
         cursor.execute('SELECT value FROM project_info WHERE project_name = ? AND key = "metadata_json"', (project_name,))
         result = cursor.fetchone()
         return result[0] if result else None
     except Exception as e:
         print(f'... could not retrieve metadata because of: {e}')
         return None
-    finally:
-        if connection:
-            close_connection_to_ddbb(connection)
 
 
 def get_project_data_location(project_name):
     """Get data location/retrieval info for a project"""
-    connection = None
     try:
-        connection = connect_to_ddbb()
-        cursor = connection.cursor()
+        cursor = connect_to_ddbb().cursor()
         cursor.execute('SELECT value FROM project_info WHERE project_name = ? AND key = "data_location"', (project_name,))
         result = cursor.fetchone()
         return result[0] if result else None
     except Exception as e:
         print(f'... could not retrieve data location because of: {e}')
         return None
-    finally:
-        if connection:
-            close_connection_to_ddbb(connection)
+
+
+@timed('db.save_acquisition')
+def save_acquisition(acquisition_uuid, acquisition_info):
+    """Insert or update an acquisition record"""
+    try:
+        with transaction() as cursor:
+            cursor.execute('INSERT INTO acquisitions VALUES (?, ?) '
+                           'ON CONFLICT (uuid) DO UPDATE SET data = excluded.data',
+                           (acquisition_uuid, dumps(acquisition_info)))
+    except Exception as e:
+        print(f'... could not save acquisition because of: {e}')
+
+
+def _delete_grid_square_children(cursor, grid_square_uuids):
+    """Delete the foil holes and micrographs of grid squares"""
+    params = [(gs_uuid,) for gs_uuid in grid_square_uuids]
+    cursor.executemany('DELETE FROM micrographs WHERE foil_hole_uuid IN '
+                       '(SELECT uuid FROM foil_holes WHERE grid_square_uuid = ?)', params)
+    cursor.executemany('DELETE FROM foil_holes WHERE grid_square_uuid = ?', params)
+
+
+@timed('db.save_grid')
+def save_grid(acquisition_uuid, position, grid_info, atlas, grid_square_uuids):
+    """
+    Insert or update a grid record and attach its grid squares in order, returning success
+
+    Grid squares stored under the grid but missing from grid_square_uuids,
+    because they are gone upstream or out of the extraction scope, are
+    deleted with their subtrees and summaries in the same transaction.
+    """
+    try:
+        with transaction() as cursor:
+            cursor.execute('SELECT uuid FROM grid_squares WHERE grid_uuid = ?', (grid_info['uuid'],))
+            listed = set(grid_square_uuids)
+            stale = [gs_uuid for gs_uuid, in cursor.fetchall() if gs_uuid not in listed]
+            if stale:
+                _delete_grid_square_children(cursor, stale)
+                cursor.executemany('DELETE FROM summaries WHERE uuid = ?', [(gs_uuid,) for gs_uuid in stale])
+                cursor.executemany('DELETE FROM grid_squares WHERE uuid = ?', [(gs_uuid,) for gs_uuid in stale])
+            cursor.execute('INSERT INTO grids VALUES (?, ?, ?, ?, ?) '
+                           'ON CONFLICT (uuid) DO UPDATE SET acquisition_uuid = excluded.acquisition_uuid, '
+                           'position = excluded.position, data = excluded.data, atlas = excluded.atlas',
+                           (grid_info['uuid'], acquisition_uuid, position, dumps(grid_info),
+                            dumps(atlas) if atlas is not None else None))
+            cursor.executemany('UPDATE grid_squares SET grid_uuid = ?, position = ? WHERE uuid = ?',
+                               [(grid_info['uuid'], gs_position, gs_uuid)
+                                for gs_position, gs_uuid in enumerate(grid_square_uuids)])
+        return True
+    except Exception as e:
+        print(f'... could not save grid because of: {e}')
+        return False
+
+
+@timed('db.save_grid_square_tree')
+def save_grid_square_tree(gs_data):
+    """Insert or replace a grid square together with its foil holes and micrographs, returning success"""
+    try:
+        with transaction() as cursor:
+            gs_info = gs_data['grid_square_info']
+            quality = gs_data.get('quality_prediction')
+            cursor.execute('INSERT INTO grid_squares (uuid, data, quality_prediction) VALUES (?, ?, ?) '
+                           'ON CONFLICT (uuid) DO UPDATE SET data = excluded.data, '
+                           'quality_prediction = excluded.quality_prediction',
+                           (gs_info['uuid'], dumps(gs_info), dumps(quality) if quality is not None else None))
+            _delete_grid_square_children(cursor, [gs_info['uuid']])
+            foil_holes = gs_data.get('foil_holes', [])
+            cursor.executemany('INSERT OR REPLACE INTO foil_holes VALUES (?, ?, ?, ?)',
+                               [(fh_data['foil_hole_info']['uuid'], gs_info['uuid'], fh_position,
+                                 dumps(fh_data['foil_hole_info']))
+                                for fh_position, fh_data in enumerate(foil_holes)])
+            cursor.executemany('INSERT OR REPLACE INTO micrographs VALUES (?, ?, ?, ?)',
+                               [(micrograph['uuid'], fh_data['foil_hole_info']['uuid'], m_position, dumps(micrograph))
+                                for fh_data in foil_holes
+                                for m_position, micrograph in enumerate(fh_data.get('micrographs', []))])
+        return True
+    except Exception as e:
+        print(f'... could not save grid square because of: {e}')
+        return False
+
+
+@timed('db.get_grid_square_info')
+def get_grid_square_info(grid_square_uuid):
+    """Get the stored record of a grid square, without its children, or None if unknown"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data FROM grid_squares WHERE uuid = ?', (grid_square_uuid,))
+        result = cursor.fetchone()
+        return loads(result[0]) if result else None
+    except Exception as e:
+        print(f'... could not retrieve grid square because of: {e}')
+        return None
+
+
+@timed('db.get_foil_hole_infos')
+def get_foil_hole_infos(grid_square_uuid):
+    """Get the stored records of the foil holes of a grid square, without their micrographs, keyed by UUID"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT uuid, data FROM foil_holes WHERE grid_square_uuid = ?', (grid_square_uuid,))
+        return {fh_uuid: loads(data) for fh_uuid, data in cursor.fetchall()}
+    except Exception as e:
+        print(f'... could not retrieve foil holes because of: {e}')
+        return {}
+
+
+@timed('db.get_grid_square_tree')
+def get_grid_square_tree(grid_square_uuid):
+    """Get a grid square subtree with its foil holes and micrographs, or None if unknown"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data, quality_prediction FROM grid_squares WHERE uuid = ?', (grid_square_uuid,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+        micrographs = {}
+        cursor.execute('SELECT m.foil_hole_uuid, m.data FROM micrographs m '
+                       'JOIN foil_holes f ON m.foil_hole_uuid = f.uuid '
+                       'WHERE f.grid_square_uuid = ? ORDER BY m.foil_hole_uuid, m.position', (grid_square_uuid,))
+        for fh_uuid, data in cursor.fetchall():
+            micrographs.setdefault(fh_uuid, []).append(loads(data))
+        cursor.execute('SELECT uuid, data FROM foil_holes WHERE grid_square_uuid = ? ORDER BY position',
+                       (grid_square_uuid,))
+        return {
+            'grid_square_info': loads(result[0]),
+            'foil_holes': [
+                {'foil_hole_info': loads(data), 'micrographs': micrographs.get(fh_uuid, [])}
+                for fh_uuid, data in cursor.fetchall()
+            ],
+            'quality_prediction': loads(result[1]) if result[1] is not None else None
+        }
+    except Exception as e:
+        print(f'... could not retrieve grid square because of: {e}')
+        return None
+
+
+@timed('db.get_grid_tree')
+def get_grid_tree(grid_uuid):
+    """Get a grid subtree with all of its grid squares, or None if unknown"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data, atlas FROM grids WHERE uuid = ?', (grid_uuid,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+        cursor.execute('SELECT uuid FROM grid_squares WHERE grid_uuid = ? ORDER BY position', (grid_uuid,))
+        grid_square_uuids = [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f'... could not retrieve grid because of: {e}')
+        return None
+
+    return {
+        'grid_info': loads(result[0]),
+        'grid_squares': [get_grid_square_tree(gs_uuid) for gs_uuid in grid_square_uuids],
+        'atlas': loads(result[1]) if result[1] is not None else None
+    }
+
+
+@timed('db.get_grid_outline')
+def get_grid_outline(grid_uuid):
+    """Get the grid record, ordered grid square UUIDs and atlas of a stored grid, or None if unknown"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data, atlas FROM grids WHERE uuid = ?', (grid_uuid,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+        cursor.execute('SELECT uuid FROM grid_squares WHERE grid_uuid = ? ORDER BY position', (grid_uuid,))
+        return (loads(result[0]), [row[0] for row in cursor.fetchall()],
+                loads(result[1]) if result[1] is not None else None)
+    except Exception as e:
+        print(f'... could not retrieve grid because of: {e}')
+        return None
+
+
+@timed('db.get_acquisition')
+def get_acquisition(acquisition_uuid):
+    """Get a stored acquisition record and the ordered UUIDs of its grids, or None if unknown"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data FROM acquisitions WHERE uuid = ?', (acquisition_uuid,))
+        result = cursor.fetchone()
+        if not result:
+            return None
+        cursor.execute('SELECT uuid FROM grids WHERE acquisition_uuid = ? ORDER BY position', (acquisition_uuid,))
+        return loads(result[0]), [row[0] for row in cursor.fetchall()]
+    except Exception as e:
+        print(f'... could not retrieve acquisition because of: {e}')
+        return None
+
+
+# Rows of every level of an acquisition as (uuid, parent uuid, position,
+# data, attached data), in hierarchy order
+ENTITY_ROWS_QUERIES = {
+    'acquisition': '''SELECT uuid, NULL, 0, data, NULL FROM acquisitions WHERE uuid = ?''',
+    'grid': '''SELECT uuid, acquisition_uuid, position, data, atlas FROM grids
+               WHERE acquisition_uuid = ? ORDER BY position''',
+    'grid_square': '''SELECT gs.uuid, gs.grid_uuid, gs.position, gs.data, gs.quality_prediction
+                      FROM grid_squares gs JOIN grids g ON gs.grid_uuid = g.uuid
+                      WHERE g.acquisition_uuid = ? ORDER BY g.position, gs.position''',
+    'foil_hole': '''SELECT fh.uuid, fh.grid_square_uuid, fh.position, fh.data, NULL
+                    FROM foil_holes fh JOIN grid_squares gs ON fh.grid_square_uuid = gs.uuid
+                    JOIN grids g ON gs.grid_uuid = g.uuid
+                    WHERE g.acquisition_uuid = ? ORDER BY g.position, gs.position, fh.position''',
+    'micrograph': '''SELECT m.uuid, m.foil_hole_uuid, m.position, m.data, NULL
+                     FROM micrographs m JOIN foil_holes fh ON m.foil_hole_uuid = fh.uuid
+                     JOIN grid_squares gs ON fh.grid_square_uuid = gs.uuid
+                     JOIN grids g ON gs.grid_uuid = g.uuid
+                     WHERE g.acquisition_uuid = ? ORDER BY g.position, gs.position, fh.position, m.position'''
+}
+
+
+def iter_entity_rows(acquisition_uuid, level, batch_size=10000):
+    """
+    Stream the stored rows of one hierarchy level of an acquisition
+
+    Args:
+        acquisition_uuid (str): UUID of the acquisition
+        level (str): One of the keys of ENTITY_ROWS_QUERIES
+        batch_size (int): Rows fetched from SQLite at a time
+
+    Yields:
+        Lists of (uuid, parent uuid, position, data JSON, attached JSON or None)
+        tuples; the attached data is the atlas of a grid or the quality
+        prediction of a grid square
+    """
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute(ENTITY_ROWS_QUERIES[level], (acquisition_uuid,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+# Hierarchy levels below the acquisition: table and column referencing the parent
+ENTITY_TABLES = {
+    'grid': ('grids', 'acquisition_uuid'),
+    'grid_square': ('grid_squares', 'grid_uuid'),
+    'foil_hole': ('foil_holes', 'grid_square_uuid'),
+    'micrograph': ('micrographs', 'foil_hole_uuid')
+}
+
+
+def get_child_uuids(level, parent_uuid, limit=-1, offset=0):
+    """Get the UUIDs of the stored entities of a level below a parent, in document order"""
+    table, parent_column = ENTITY_TABLES[level]
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute(f'SELECT uuid FROM {table} WHERE {parent_column} = ? ORDER BY position LIMIT ? OFFSET ?',
+                   (parent_uuid, limit, offset))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def has_child(level, parent_uuid, uuid):
+    """Whether an entity of a level is stored below a parent"""
+    table, parent_column = ENTITY_TABLES[level]
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute(f'SELECT 1 FROM {table} WHERE uuid = ? AND {parent_column} = ?', (uuid, parent_uuid))
+    return cursor.fetchone() is not None
+
+
+def get_entity_fields(level, uuid):
+    """
+    Get the fields of a stored entity as they appear in the metadata document, without its children
+
+    Args:
+        level (str): 'acquisition' or one of the keys of ENTITY_TABLES
+        uuid (str): UUID of the entity
+
+    Returns:
+        dict: For instance grid_info and atlas of a grid; a micrograph is returned
+            as is. None if the entity is unknown
+    """
+    cursor = connect_to_ddbb().cursor()
+    if level == 'acquisition':
+        cursor.execute('SELECT data FROM acquisitions WHERE uuid = ?', (uuid,))
+        result = cursor.fetchone()
+        return {'acquisition': loads(result[0])} if result else None
+    if level == 'grid':
+        cursor.execute('SELECT data, atlas FROM grids WHERE uuid = ?', (uuid,))
+        result = cursor.fetchone()
+        return {'grid_info': loads(result[0]),
+                'atlas': loads(result[1]) if result[1] is not None else None} if result else None
+    if level == 'grid_square':
+        cursor.execute('SELECT data, quality_prediction FROM grid_squares WHERE uuid = ?', (uuid,))
+        result = cursor.fetchone()
+        return {'grid_square_info': loads(result[0]),
+                'quality_prediction': loads(result[1]) if result[1] is not None else None} if result else None
+    table, _ = ENTITY_TABLES[level]
+    cursor.execute(f'SELECT data FROM {table} WHERE uuid = ?', (uuid,))
+    result = cursor.fetchone()
+    if not result:
+        return None
+    return {'foil_hole_info': loads(result[0])} if level == 'foil_hole' else loads(result[0])
+
+
+@timed('db.get_foil_hole_tree')
+def get_foil_hole_tree(foil_hole_uuid):
+    """Get a foil hole with its micrographs, or None if unknown"""
+    fields = get_entity_fields('foil_hole', foil_hole_uuid)
+    if fields is None:
+        return None
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute('SELECT data FROM micrographs WHERE foil_hole_uuid = ? ORDER BY position', (foil_hole_uuid,))
+    fields['micrographs'] = [loads(row[0]) for row in cursor.fetchall()]
+    return fields
+
+
+@timed('db.get_acquisition_counts')
+def get_acquisition_counts(acquisition_uuid):
+    """
+    Count the stored entities below every grid of an acquisition
+
+    Returns:
+        list: (grid UUID, grid name, grid squares, foil holes, micrographs) tuples, in document order
+    """
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute("SELECT g.uuid, json_extract(g.data, '$.name'), "
+                   '(SELECT COUNT(*) FROM grid_squares gs WHERE gs.grid_uuid = g.uuid), '
+                   '(SELECT COUNT(*) FROM foil_holes fh JOIN grid_squares gs ON fh.grid_square_uuid = gs.uuid '
+                   ' WHERE gs.grid_uuid = g.uuid), '
+                   '(SELECT COUNT(*) FROM micrographs m JOIN foil_holes fh ON m.foil_hole_uuid = fh.uuid '
+                   ' JOIN grid_squares gs ON fh.grid_square_uuid = gs.uuid WHERE gs.grid_uuid = g.uuid) '
+                   'FROM grids g WHERE g.acquisition_uuid = ? ORDER BY g.position', (acquisition_uuid,))
+    return cursor.fetchall()
+
+
+def get_project_acquisition(project_name):
+    """Get the SmartEM acquisition UUID extracted for a project"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT value FROM project_info WHERE project_name = ? AND key = "acquisition_id"', (project_name,))
+        result = cursor.fetchone()
+        return result[0] if result else None
+    except Exception as e:
+        print(f'... could not retrieve acquisition id because of: {e}')
+        return None
+
+
+@timed('db.mark_acquisition_processed')
+def mark_acquisition_processed(acquisition_uuid, project_name):
+    """Record in the discovery index that an acquisition was extracted, with its stored status and start time"""
+    try:
+        with transaction() as cursor:
+            cursor.execute("INSERT INTO processed_acquisitions (uuid, project_name, status, start_time) "
+                           "SELECT uuid, ?, json_extract(data, '$.status'), json_extract(data, '$.start_time') "
+                           "FROM acquisitions WHERE uuid = ? "
+                           "ON CONFLICT (uuid) DO UPDATE SET project_name = excluded.project_name, "
+                           "status = excluded.status, start_time = excluded.start_time, "
+                           "processed_at = CURRENT_TIMESTAMP",
+                           (project_name, acquisition_uuid))
+    except Exception as e:
+        print(f'... could not index acquisition because of: {e}')
+
+
+@timed('db.get_processed_acquisitions')
+def get_processed_acquisitions(since=None):
+    """
+    Get the acquisitions of the discovery index
+
+    Args:
+        since (str): Only acquisitions started at or after this ISO date/time
+
+    Returns:
+        dict: Status of each processed acquisition at its last extraction, by UUID
+    """
+    cursor = connect_to_ddbb().cursor()
+    if since:
+        cursor.execute('SELECT uuid, status FROM processed_acquisitions WHERE start_time >= ?', (since,))
+    else:
+        cursor.execute('SELECT uuid, status FROM processed_acquisitions')
+    return dict(cursor.fetchall())
+
+
+@timed('db.save_checkpoint')
+def save_checkpoint(acquisition_id, entity, uuid):
+    """Record that a grid or grid square of an acquisition has been fully extracted"""
+    try:
+        with transaction() as cursor:
+            cursor.execute('INSERT OR IGNORE INTO extraction_checkpoints VALUES (?, ?, ?)',
+                           (acquisition_id, entity, uuid))
+    except Exception as e:
+        print(f'... could not save checkpoint because of: {e}')
+
+
+def get_checkpoints(acquisition_id, entity):
+    """Get the UUIDs of checkpointed grids or grid squares of an acquisition"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT uuid FROM extraction_checkpoints WHERE acquisition_id = ? AND entity = ?',
+                       (acquisition_id, entity))
+        return {row[0] for row in cursor.fetchall()}
+    except Exception as e:
+        print(f'... could not retrieve checkpoints because of: {e}')
+        return set()
+
+
+def clear_checkpoints(acquisition_id):
+    """Forget the checkpoints of an acquisition before a fresh extraction"""
+    try:
+        with transaction() as cursor:
+            cursor.execute('DELETE FROM extraction_checkpoints WHERE acquisition_id = ?', (acquisition_id,))
+    except Exception as e:
+        print(f'... could not clear checkpoints because of: {e}')
+
+
+@timed('db.save_summaries')
+def save_summaries(acquisition_uuid, summaries):
+    """Store (level, summary) pairs of an acquisition, updating previous summaries of the same entities in place"""
+    try:
+        with transaction() as cursor:
+            cursor.executemany('INSERT INTO summaries VALUES (?, ?, ?, ?) ON CONFLICT (level, uuid) DO UPDATE '
+                               'SET acquisition_uuid = excluded.acquisition_uuid, data = excluded.data',
+                               [(level, summary['uuid'], acquisition_uuid, dumps(summary))
+                                for level, summary in summaries])
+    except Exception as e:
+        print(f'... could not save summaries because of: {e}')
+
+
+@timed('db.replace_summaries')
+def replace_summaries(acquisition_uuid, summaries):
+    """Store (level, summary) pairs of an acquisition in place of all of its previous summaries, atomically"""
+    try:
+        with transaction() as cursor:
+            cursor.execute('DELETE FROM summaries WHERE acquisition_uuid = ?', (acquisition_uuid,))
+            cursor.executemany('INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)',
+                               [(level, summary['uuid'], acquisition_uuid, dumps(summary))
+                                for level, summary in summaries])
+    except Exception as e:
+        print(f'... could not save summaries because of: {e}')
+
+
+@timed('db.get_summaries')
+def get_summaries(acquisition_uuid, level):
+    """Get the summaries of one level of an acquisition, in extraction order"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('SELECT data FROM summaries WHERE acquisition_uuid = ? AND level = ? ORDER BY rowid',
+                       (acquisition_uuid, level))
+        return [loads(row[0]) for row in cursor.fetchall()]
+    except Exception as e:
+        print(f'... could not retrieve summaries because of: {e}')
+        return []
+
+
+def store_metadata_nodes(acquisition_id, nodes, state=None):
+    """
+    Pass a metadata node stream through, recording acquisition and grid rows
+
+    Grid square subtrees are saved by ExtractionState as they are fetched;
+    this links them to their grid in stream order once the grid is complete,
+    and checkpoints the grid in the given state. Grids the state remembers
+    storing with the same record, atlas and grid squares are not rewritten.
+    """
+    grid_position = 0
+    for node_type, node in nodes:
+        if node_type == NODE_ACQUISITION:
+            save_acquisition(acquisition_id, node)
+        elif node_type == NODE_GRID:
+            grid_info, atlas = node['grid_info'], node['atlas']
+            grid_square_uuids = []
+        elif node_type == NODE_GRID_SQUARE:
+            grid_square_uuids.append(node['grid_square_info']['uuid'])
+        elif node_type == NODE_GRID_END:
+            outline = (grid_position, grid_info, atlas, grid_square_uuids)
+            if not (state and state.stored_grid(grid_info['uuid']) == outline):
+                with transaction():
+                    if save_grid(acquisition_id, grid_position, grid_info, atlas, grid_square_uuids) and state:
+                        state.checkpoint_grid(grid_info['uuid'], outline)
+            grid_position += 1
+        yield node_type, node
+
+
+def iter_stored_metadata_nodes(acquisition_id):
+    """
+    Replay the stored hierarchy of an acquisition as a metadata node stream
+
+    Yields the same (node_type, payload) tuples as an extraction, read from
+    the normalized tables instead of the SmartEM API, one grid square
+    subtree at a time.
+    """
+    acquisition = get_acquisition(acquisition_id)
+    if acquisition is None:
+        raise ValueError(f'Acquisition {acquisition_id} has not been extracted')
+    acquisition_info, grid_uuids = acquisition
+    yield NODE_ACQUISITION, acquisition_info
+    for grid_uuid in grid_uuids:
+        grid_info, grid_square_uuids, atlas = get_grid_outline(grid_uuid)
+        yield NODE_GRID, {'grid_info': grid_info, 'atlas': atlas}
+        for grid_square_uuid in grid_square_uuids:
+            yield NODE_GRID_SQUARE, get_grid_square_tree(grid_square_uuid)
+        yield NODE_GRID_END, None
+
+
+class ExtractionState:
+    """
+    Extraction progress of an acquisition, used for incremental and resumed runs
+
+    Freshly extracted grid squares are saved and checkpointed unless part of
+    their subtree failed to download, and so are grids without failures. Stored
+    grid square and foil hole records are handed back for comparison when
+    reuse is enabled, or when resuming and the grid square was checkpointed by
+    the interrupted run; subtrees are only loaded once found unchanged.
+    Resuming also replays fully checkpointed grids. A run that neither
+    resumes nor reuses starts from a clean set of checkpoints.
+
+    Stored subtrees hold only what the extraction scope of their run fetched,
+    so the key of a restricted scope is checkpointed too, and a run with a
+    different scope neither reuses nor resumes.
+    """
+
+    def __init__(self, acquisition_id, reuse=True, resume=False, scope_key=None):
+        self.acquisition_id = acquisition_id
+        previous_scope_key = next(iter(get_checkpoints(acquisition_id, 'scope')), None)
+        if (reuse or resume) and previous_scope_key != scope_key:
+            print('... no previous extraction with the same scope, extracting from scratch')
+            reuse = resume = False
+        self.reuse = reuse
+        self.resume = resume
+        if resume:
+            self.grids_done = get_checkpoints(acquisition_id, 'grid')
+            self.grid_squares_done = get_checkpoints(acquisition_id, 'grid_square')
+        else:
+            clear_checkpoints(acquisition_id)
+            self.grids_done = set()
+            self.grid_squares_done = set()
+            if scope_key is not None:
+                save_checkpoint(acquisition_id, 'scope', scope_key)
+        self.incomplete_grids = set()
+
+    def get_info(self, grid_square_uuid):
+        if self.reuse or grid_square_uuid in self.grid_squares_done:
+            return get_grid_square_info(grid_square_uuid)
+        return None
+
+    def get_foil_hole_infos(self, grid_square_uuid):
+        return get_foil_hole_infos(grid_square_uuid)
+
+    def load(self, grid_square_uuid):
+        return get_grid_square_tree(grid_square_uuid)
+
+    def load_foil_hole(self, foil_hole_uuid):
+        return get_foil_hole_tree(foil_hole_uuid)
+
+    def save(self, grid_square_uuid, subtree):
+        with transaction():
+            saved = save_grid_square_tree(subtree)
+            if saved:
+                save_checkpoint(self.acquisition_id, 'grid_square', grid_square_uuid)
+        return saved
+
+    def completed_grid(self, grid_uuid):
+        outline = get_grid_outline(grid_uuid) if grid_uuid in self.grids_done else None
+        return outline[1:] if outline else None
+
+    def skip_checkpoint(self, grid_uuid):
+        self.incomplete_grids.add(grid_uuid)
+
+    def checkpoint_grid(self, grid_uuid, outline=None):
+        """Checkpoint a stored grid unless part of it failed; outline is what it was stored with"""
+        if grid_uuid not in self.incomplete_grids:
+            save_checkpoint(self.acquisition_id, 'grid', grid_uuid)
+
+    def stored_grid(self, grid_uuid):
+        """Outline (position, record, atlas, grid square UUIDs) a grid was last stored with, if remembered"""
+        return None
+
+
+@timed('db.save_deposition')
+def save_deposition(project_name, visit_id, entity_key, content_hash, record_id, field_id=None, details=None):
+    """Record an entity deposited in ARIA, replacing any previous deposition of the same key"""
+    try:
+        with transaction() as cursor:
+            cursor.execute('''INSERT OR REPLACE INTO depositions
+                              (project_name, visit_id, entity_key, content_hash, record_id, field_id, details)
+                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                           (project_name, str(visit_id), entity_key, content_hash, record_id, field_id, details))
+        return True
+    except Exception as e:
+        print(f'... could not save deposition because of: {e}')
+        return False
+
+
+@timed('db.get_depositions')
+def get_depositions(project_name, visit_id):
+    """Get the ledger of a project's depositions in an ARIA visit, keyed by entity key"""
+    try:
+        cursor = connect_to_ddbb().cursor()
+        cursor.execute('''SELECT entity_key, content_hash, record_id, field_id, details FROM depositions
+                          WHERE project_name = ? AND visit_id = ?''', (project_name, str(visit_id)))
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+    except Exception as e:
+        print(f'... could not retrieve depositions because of: {e}')
+        return {}
+
+
+class DepositionLedger:
+    """
+    What a project has already deposited in an ARIA visit
+
+    Every entity (bucket, metadata record, chunk, index) is tracked under a
+    stable key with the hash of the content it holds. A record is logged
+    without a hash as soon as it is created and gets one once its field is
+    pushed. A run interrupted in between pushes the field into that record
+    instead of creating another one, while new content for a fully
+    deposited entity goes to a new record whose details name the one it
+    supersedes.
+    """
+
+    def __init__(self, project_name, visit_id):
+        self.project_name = project_name
+        self.visit_id = visit_id
+        self.entries = get_depositions(project_name, visit_id)
+        self.pushed = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def is_current(self, entity_key, content_hash):
+        """Whether the entity was fully deposited with this content"""
+        entry = self.entries.get(entity_key)
+        current = entry is not None and entry[0] == content_hash
+        if current:
+            with self._lock:
+                self.skipped += 1
+        return current
+
+    def get(self, entity_key):
+        """Ledger entry (content_hash, record_id, field_id, details) of an entity, if any"""
+        return self.entries.get(entity_key)
+
+    def existing_record(self, entity_key):
+        """Record created for the entity by an earlier run whose field push never completed"""
+        entry = self.entries.get(entity_key)
+        return entry[1] if entry is not None and entry[0] is None else None
+
+    def record(self, entity_key, record_id, content_hash=None, field_id=None, details=None):
+        """Log a created record, or a deposited entity when content_hash is given"""
+        entry = (content_hash, record_id, field_id, details)
+        with self._lock:
+            self.entries[entity_key] = entry
+            if content_hash is not None:
+                self.pushed += 1
+        save_deposition(self.project_name, self.visit_id, entity_key, *entry)
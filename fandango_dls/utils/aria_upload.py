@@ -0,0 +1,446 @@
+"""
+Chunked ARIA deposition for FandanGO plugin
+
+Splits an acquisition tree into chunks of at most N grid squares (a chunk
+never spans two grids) and uploads every chunk as its own DLS_CRYOEM record
+with a bounded pool of workers. An index record lists the chunks in order so
+consumers can reassemble the tree.
+
+Every deposited entity is logged in the plugin's deposition ledger with the
+hash of its content, so re-running a deposition reuses the bucket and skips
+anything already uploaded unchanged. Changed content goes to a new record and
+the redeposited index points to it, so the index never references a record
+whose field is out of date.
+"""
+
+import hashlib
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fandango_dls.constants import NODE_GRID, NODE_GRID_SQUARE, NODE_GRID_END
+from fandango_dls.db.sqlite_db import get_acquisition, get_grid_outline, get_grid_square_tree, DepositionLedger
+from fandango_dls.utils.metrics import timed
+from fandango_dls.utils.retry import RetryPolicy
+from fandango_dls.utils.serialization import dumps, loads
+
+try:
+    from aria.client import AriaClient
+    from aria.data_manager import Bucket, Field
+except ImportError:
+    AriaClient = None
+    Field = None
+
+# Identifies the layout of the index record and its chunks
+CHUNK_FORMAT = 'fandango-dls-chunked/2'
+RECORD_SCHEMA = 'DLS_CRYOEM'
+
+# Ledger keys of the bucket and the index record
+BUCKET_KEY = 'bucket'
+INDEX_KEY = 'index'
+
+
+def _chunk_starts(num_grid_squares: int, grid_squares_per_chunk: int):
+    """Offsets of the chunks of a grid; a grid without squares still gets one chunk"""
+    return range(0, num_grid_squares, grid_squares_per_chunk) or [0]
+
+
+def chunk_key(chunk: Dict[str, Any]) -> str:
+    """Ledger key of a chunk, stable across runs with the same chunk size"""
+    return f"chunk:{(chunk.get('grid_info') or {}).get('uuid')}:{chunk['grid_square_offset']}"
+
+
+def content_hash(serialized: str) -> str:
+    """Hash identifying the content of a deposited field"""
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+class AriaSession:
+    """
+    ARIA visit and bucket opened on first use
+
+    Logging in and creating the bucket are deferred until something actually
+    needs uploading, and a bucket already recorded in the ledger is reused
+    instead of creating another one.
+    """
+
+    def __init__(self, visit_id, ledger: DepositionLedger, client=None):
+        """
+        Initialize the session
+
+        Args:
+            visit_id: ARIA visit ID
+            ledger: Deposition ledger of the project in this visit
+            client: Logged-in AriaClient to share, a new one is created if omitted
+        """
+        if AriaClient is None:
+            raise ImportError("ARIA client not available. Please install fandanGO-aria package.")
+        self.visit_id = visit_id
+        self.ledger = ledger
+        self._client = client
+        self._visit = None
+        self._bucket_id = None
+        self._lock = threading.RLock()
+
+    @property
+    def visit(self):
+        """Data manager of the visit, logging in on first access"""
+        with self._lock:
+            if self._visit is None:
+                if self._client is None:
+                    self._client = AriaClient(True)
+                    with timed('aria.login'):
+                        self._client.login()
+                self._visit = self._client.new_data_manager(int(self.visit_id), 'visit', True)
+            return self._visit
+
+    @property
+    def bucket_id(self):
+        """ID of the project's bucket in the visit, created on first access"""
+        with self._lock:
+            if self._bucket_id is None:
+                entry = self.ledger.get(BUCKET_KEY)
+                if entry is not None:
+                    self._bucket_id = entry[1]
+                else:
+                    # Create data bucket with embargo date (3 years from now)
+                    today = datetime.today()
+                    embargo_date = datetime(today.year + 3, today.month, today.day).strftime('%Y-%m-%d')
+                    bucket = Bucket(self.visit.entity_id, self.visit.entity_type, embargo_date)
+                    with timed('aria.push_bucket'):
+                        self.visit.push(bucket)
+                    self.ledger.record(BUCKET_KEY, bucket.id, details=dumps(bucket.__dict__, default=str))
+                    self._bucket_id = bucket.id
+            return self._bucket_id
+
+    def bucket_details(self) -> Optional[Dict[str, Any]]:
+        """Attributes of the bucket as returned by ARIA when it was created"""
+        entry = self.ledger.get(BUCKET_KEY)
+        return loads(entry[3]) if entry and entry[3] else None
+
+
+def iter_metadata_chunks(acquisition_uuid: str, grid_squares_per_chunk: int) -> Iterator[Dict[str, Any]]:
+    """
+    Build upload chunks from the normalized acquisition tables
+
+    Grid square subtrees are loaded one chunk at a time, so memory is bounded
+    by the chunk size rather than the acquisition size.
+
+    Args:
+        acquisition_uuid: UUID of an extracted acquisition
+        grid_squares_per_chunk: Maximum number of grid squares per chunk
+
+    Yields:
+        Chunk dictionaries in document order
+    """
+    acquisition = get_acquisition(acquisition_uuid)
+    if acquisition is None:
+        raise ValueError(f'Acquisition {acquisition_uuid} has no stored hierarchy')
+    _, grid_uuids = acquisition
+
+    for grid_uuid in grid_uuids:
+        grid_info, gs_uuids, atlas = get_grid_outline(grid_uuid)
+        for start in _chunk_starts(len(gs_uuids), grid_squares_per_chunk):
+            yield {
+                'format': CHUNK_FORMAT,
+                'acquisition_uuid': acquisition_uuid,
+                'grid_info': grid_info,
+                'atlas': atlas if start == 0 else None,
+                'grid_square_offset': start,
+                'grid_squares': [get_grid_square_tree(gs_uuid)
+                                 for gs_uuid in gs_uuids[start:start + grid_squares_per_chunk]]
+            }
+
+
+def iter_document_chunks(metadata: Dict[str, Any], grid_squares_per_chunk: int) -> Iterator[Dict[str, Any]]:
+    """
+    Build upload chunks from an already parsed metadata document
+
+    Used for projects extracted before the normalized tables existed.
+
+    Args:
+        metadata: Metadata document as produced by extract_acquisition_metadata
+        grid_squares_per_chunk: Maximum number of grid squares per chunk
+
+    Yields:
+        Chunk dictionaries in document order
+    """
+    acquisition_uuid = (metadata.get('acquisition') or {}).get('uuid')
+    for grid_data in metadata.get('grids', []):
+        grid_squares = grid_data.get('grid_squares', [])
+        for start in _chunk_starts(len(grid_squares), grid_squares_per_chunk):
+            yield {
+                'format': CHUNK_FORMAT,
+                'acquisition_uuid': acquisition_uuid,
+                'grid_info': grid_data.get('grid_info'),
+                'atlas': grid_data.get('atlas') if start == 0 else None,
+                'grid_square_offset': start,
+                'grid_squares': grid_squares[start:start + grid_squares_per_chunk]
+            }
+
+
+def chunk_metadata_nodes(acquisition_uuid: str, nodes: Iterable[Tuple[str, Any]], grid_squares_per_chunk: int,
+                         emit: Callable[[Dict[str, Any]], None]) -> Iterator[Tuple[str, Any]]:
+    """
+    Pass a metadata node stream through, emitting upload chunks as they fill up
+
+    Chunks are identical to those of iter_metadata_chunks and are emitted
+    as soon as they are full, so no more than one chunk is held at a time.
+
+    Args:
+        acquisition_uuid: UUID of the acquisition being extracted
+        nodes: Iterable of (node_type, payload) tuples
+        grid_squares_per_chunk: Maximum number of grid squares per chunk
+        emit: Called with every chunk
+
+    Yields:
+        The nodes, unchanged
+    """
+    def flush():
+        emit({
+            'format': CHUNK_FORMAT,
+            'acquisition_uuid': acquisition_uuid,
+            'grid_info': grid_info,
+            'atlas': atlas if offset == 0 else None,
+            'grid_square_offset': offset,
+            'grid_squares': grid_squares
+        })
+
+    for node_type, node in nodes:
+        if node_type == NODE_GRID:
+            grid_info, atlas = node['grid_info'], node['atlas']
+            offset = 0
+            grid_squares = []
+        elif node_type == NODE_GRID_SQUARE:
+            grid_squares.append(node)
+            if len(grid_squares) == grid_squares_per_chunk:
+                flush()
+                offset += len(grid_squares)
+                grid_squares = []
+        elif node_type == NODE_GRID_END:
+            # A grid without squares still gets its (empty) first chunk
+            if grid_squares or offset == 0:
+                flush()
+        yield node_type, node
+
+
+class PipelineAborted(Exception):
+    """Raised in the producer of a ChunkQueue once its consumer has given up"""
+
+
+class ChunkQueue:
+    """
+    Bounded hand-off of chunks from an extraction thread to the uploader
+
+    The producer blocks while the queue is full, so extraction never runs
+    more than maxsize chunks ahead of the upload. Iterating yields chunks
+    until the producer finishes, re-raising the producer's error if any.
+    """
+
+    _END = object()
+
+    def __init__(self, maxsize: int):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._aborted = threading.Event()
+        self._error = None
+
+    def put(self, chunk: Dict[str, Any]):
+        """Hand a chunk to the consumer, raising PipelineAborted if it stopped consuming"""
+        while not self._aborted.is_set():
+            try:
+                self._queue.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineAborted('Upload stopped, abandoning extraction')
+
+    def finish(self, error: Optional[BaseException] = None):
+        """Signal the end of the chunks, optionally with the error that ended them"""
+        self._error = error
+        try:
+            self.put(self._END)
+        except PipelineAborted:
+            pass
+
+    def abort(self):
+        """Stop accepting chunks, releasing a blocked producer"""
+        self._aborted.set()
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        while True:
+            chunk = self._queue.get()
+            if chunk is self._END:
+                if self._error is not None:
+                    raise self._error
+                return
+            yield chunk
+
+
+class ChunkedUploader:
+    """
+    Deposits metadata in an ARIA bucket with a bounded worker pool.
+
+    Each chunk becomes a record holding one JSON field. Record creation and
+    field push are retried independently, so a failed push never creates a
+    second record for the same chunk, and entities the ledger already holds
+    with identical content are not uploaded again. Changed content is pushed
+    to a new record, leaving the superseded one to earlier indexes.
+    """
+
+    def __init__(self, session: AriaSession, max_workers: int = 4, retry: Optional[RetryPolicy] = None):
+        """
+        Initialize the uploader
+
+        Args:
+            session: ARIA session of the visit, with its deposition ledger
+            max_workers: Maximum number of chunks uploading at once
+            retry: Retry policy for each ARIA call
+        """
+        self.session = session
+        self.ledger = session.ledger
+        self.max_workers = max(1, max_workers)
+        self.retry = retry or RetryPolicy()
+        self.logger = logging.getLogger(__name__)
+        self.bytes_uploaded = 0
+        self.peak_payload_bytes = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self, entity_key: str, content: Any, serialized: Optional[str] = None,
+                schema: str = RECORD_SCHEMA, field_type: str = 'JSON') -> Tuple[Any, Any, int]:
+        """
+        Deposit content as a record with one field, unless the ledger already has it
+
+        Args:
+            entity_key: Ledger key of the entity
+            content: Field content, or None to parse it from serialized only
+                if the entity actually needs uploading
+            serialized: JSON serialization of content if already available
+            schema: Record schema
+            field_type: Field type
+
+        Returns:
+            Tuple of (record ID, field ID, serialized size in characters)
+        """
+        if serialized is None:
+            with timed('serialize.json_dumps'):
+                serialized = dumps(content)
+        digest = content_hash(serialized)
+        if self.ledger.is_current(entity_key, digest):
+            _, record_id, field_id, _ = self.ledger.get(entity_key)
+            return record_id, field_id, len(serialized)
+
+        description = f'{entity_key} record'
+        # A push interrupted after creating the record completes in it; a
+        # changed entity gets a new record, which the ledger and the index
+        # then point to instead of the superseded one
+        record_id = self.ledger.existing_record(entity_key)
+        if record_id is None:
+            previous = self.ledger.get(entity_key)
+            bucket_id = self.session.bucket_id
+            with timed('aria.create_record'):
+                record = self.retry.call(self.session.visit.create_record, bucket_id, schema, description=description)
+            record_id = record.id
+            details = dumps({'supersedes': previous[1]}) if previous is not None else None
+            self.ledger.record(entity_key, record_id, details=details)
+        if content is None:
+            with timed('serialize.json_loads'):
+                content = loads(serialized)
+        field = Field(record_id, field_type, content)
+        with timed('aria.push') as sample:
+            sample['bytes'] = len(serialized)
+            self.retry.call(self.session.visit.push, field, description=f'{entity_key} field')
+        field_id = getattr(field, 'id', None)
+        self.ledger.record(entity_key, record_id, digest, field_id, details=self.ledger.get(entity_key)[3])
+
+        with self._lock:
+            self.bytes_uploaded += len(serialized)
+            self.peak_payload_bytes = max(self.peak_payload_bytes, len(serialized))
+        return record_id, field_id, len(serialized)
+
+    def upload(self, chunks: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Upload chunks, keeping at most max_workers built chunks in memory
+
+        Args:
+            chunks: Chunk dictionaries, grouped by grid
+
+        Returns:
+            One entry per chunk, in input order, with its record/field IDs and size
+        """
+        start = time.perf_counter()
+        entries = []
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='aria-upload') as executor:
+            window = deque()
+            for chunk in chunks:
+                window.append(executor.submit(self.upload_chunk, chunk))
+                if len(window) >= self.max_workers:
+                    entries.append(window.popleft().result())
+            while window:
+                entries.append(window.popleft().result())
+        self.elapsed = time.perf_counter() - start
+        return entries
+
+    def upload_chunk(self, chunk: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Upload one chunk as a record with a JSON field
+
+        Args:
+            chunk: Chunk dictionary
+
+        Returns:
+            Index entry describing the uploaded chunk
+        """
+        record_id, field_id, size = self.deposit(chunk_key(chunk), chunk)
+        return {
+            'grid_uuid': (chunk.get('grid_info') or {}).get('uuid'),
+            'grid_square_offset': chunk['grid_square_offset'],
+            'num_grid_squares': len(chunk['grid_squares']),
+            'record_id': record_id,
+            'field_id': field_id,
+            'bytes': size
+        }
+
+    def push_index(self, acquisition_info: Dict[str, Any], entries: List[Dict[str, Any]]) -> Tuple[Any, Any]:
+        """
+        Deposit the index record tying the uploaded chunks together
+
+        Args:
+            acquisition_info: Acquisition record
+            entries: Entries returned by upload
+
+        Returns:
+            Tuple of (index record ID, index field ID)
+        """
+        # Put chunks in document order: grids as first seen, then by offset
+        grid_order = {}
+        for entry in entries:
+            grid_order.setdefault(entry['grid_uuid'], len(grid_order))
+        entries = sorted(entries, key=lambda e: (grid_order[e['grid_uuid']], e['grid_square_offset']))
+        for chunk_index, entry in enumerate(entries):
+            entry['chunk_index'] = chunk_index
+
+        index = {
+            'format': CHUNK_FORMAT,
+            'acquisition': acquisition_info,
+            'num_chunks': len(entries),
+            'chunks': entries
+        }
+        record_id, field_id, _ = self.deposit(INDEX_KEY, index)
+        return record_id, field_id
+
+    def stats(self) -> Dict[str, Any]:
+        """Upload volume, peak payload size and throughput of this uploader"""
+        return {
+            'pushed': self.ledger.pushed,
+            'skipped': self.ledger.skipped,
+            'bytes_uploaded': self.bytes_uploaded,
+            'peak_payload_bytes': self.peak_payload_bytes,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'throughput_bytes_per_second': round(self.bytes_uploaded / self.elapsed) if self.elapsed else None
+        }
@@ -0,0 +1,33 @@
+"""
+Command-line argument helpers for FandanGO plugin actions
+"""
+
+
+def parse_flag(value):
+    """
+    Interpret an optional on/off command-line argument
+
+    Args:
+        value: Raw argument value (None when the argument was not given)
+
+    Returns:
+        bool: True for values such as 'true', 'yes', 'on' or '1'
+    """
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+
+
+def split_list(value):
+    """
+    Split an optional comma-separated config or command-line value
+
+    Args:
+        value: Raw value (None when it was not given)
+
+    Returns:
+        list: Stripped non-empty items
+    """
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
@@ -0,0 +1,214 @@
+"""
+Columnar export of stored acquisitions for FandanGO plugin
+
+Flattens the stored hierarchy of an acquisition into one table per level
+(acquisitions, grids, grid_squares, foil_holes, micrographs), each row
+carrying its parent's UUID and the acquisition UUID as foreign keys. Tables
+are written as Parquet or Arrow IPC files, one file per acquisition in a
+directory per table, so a dataset spanning many sessions can be scanned
+with pyarrow.dataset. Each file is written batch by batch against the schema
+unified over all its batches, so memory is bounded by the batch size. Arrow
+IPC files are written uncompressed, so they can be memory-mapped and read
+without copying.
+
+Requires pyarrow.
+"""
+
+import os
+from contextlib import ExitStack
+from typing import Any, Dict, Iterator, List, Optional
+
+from fandango_dls.db.sqlite_db import iter_entity_rows
+from fandango_dls.utils.metrics import timed
+from fandango_dls.utils.serialization import dumps, loads
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+FORMAT_PARQUET = 'parquet'
+FORMAT_ARROW = 'arrow'
+FORMAT_EXTENSIONS = {FORMAT_PARQUET: '.parquet', FORMAT_ARROW: '.arrow'}
+
+# Exported tables: hierarchy level, table name, foreign key column to the
+# parent, and the prefix of the columns of attached data
+TABLES = (
+    ('acquisition', 'acquisitions', None, None),
+    ('grid', 'grids', 'acquisition_uuid', 'atlas'),
+    ('grid_square', 'grid_squares', 'grid_uuid', 'quality_prediction'),
+    ('foil_hole', 'foil_holes', 'grid_square_uuid', None),
+    ('micrograph', 'micrographs', 'foil_hole_uuid', None)
+)
+
+
+def _flat_value(value: Any) -> Any:
+    """Scalar column value; nested lists and objects are kept as JSON text"""
+    return dumps(value) if isinstance(value, (dict, list)) else value
+
+
+def _flat_rows(acquisition_uuid: str, level: str, parent_key: Optional[str], attached_prefix: Optional[str],
+               rows: List[tuple]) -> List[Dict[str, Any]]:
+    """Flatten stored rows of a level into column dictionaries"""
+    records = []
+    for uuid, parent_uuid, position, data, attached in rows:
+        record = {'uuid': uuid, 'acquisition_uuid': acquisition_uuid}
+        if parent_key:
+            record[parent_key] = parent_uuid
+            record['position'] = position
+        for name, value in loads(data).items():
+            record.setdefault(name, _flat_value(value))
+        if attached_prefix:
+            for name, value in (loads(attached) if attached else {}).items():
+                record[f'{attached_prefix}_{name}'] = _flat_value(value)
+        records.append(record)
+    return records
+
+
+def _records_table(records: List[Dict[str, Any]], schema=None):
+    """
+    Arrow table of column dictionaries
+
+    Without a schema, the columns are the union of the keys of all records,
+    not only those of the first one, since optional fields and attached data
+    are missing from some entities; each column's type is inferred over all
+    its values.
+    """
+    if schema is not None:
+        return pyarrow.Table.from_pylist(records, schema=schema)
+    names = list(dict.fromkeys(name for record in records for name in record))
+    return pyarrow.Table.from_pydict({name: [record.get(name) for record in records] for name in names})
+
+
+def _level_batches(acquisition_uuid: str, level: str, parent_key: Optional[str], attached_prefix: Optional[str],
+                   batch_size: int, schema=None) -> Iterator[Any]:
+    """Arrow tables of one level of an acquisition, one per batch of stored rows"""
+    for rows in iter_entity_rows(acquisition_uuid, level, batch_size):
+        yield _records_table(_flat_rows(acquisition_uuid, level, parent_key, attached_prefix, rows), schema)
+
+
+def _unified_schema(schemas: List[Any]):
+    """
+    Schema every table of a list of schemas can be converted to, None if empty
+
+    Columns missing from some tables become nullable and numeric columns
+    mixing integers and floats are promoted.
+    """
+    if not schemas:
+        return None
+    return pyarrow.unify_schemas(schemas, promote_options='permissive')
+
+
+def _write_batches(batches: Iterator[Any], schema, path: str, fmt: str, compression: Optional[str]) -> int:
+    """Write tables of the given schema to path atomically, one at a time, returning the rows written"""
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    rows = 0
+    try:
+        with ExitStack() as stack:
+            if fmt == FORMAT_PARQUET:
+                writer = stack.enter_context(
+                    pyarrow.parquet.ParquetWriter(tmp_path, schema, compression=compression or 'zstd'))
+            else:
+                sink = stack.enter_context(pyarrow.OSFile(tmp_path, 'wb'))
+                writer = stack.enter_context(pyarrow.ipc.new_file(sink, schema))
+            for table in batches:
+                writer.write_table(table)
+                rows += table.num_rows
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    return rows
+
+
+def table_path(directory: str, table_name: str, acquisition_uuid: str, fmt: str) -> str:
+    """Path of the file holding one table of an acquisition"""
+    return os.path.join(directory, table_name, acquisition_uuid + FORMAT_EXTENSIONS[fmt])
+
+
+def export_acquisition(acquisition_uuid: str, directory: str, fmt: str = FORMAT_PARQUET,
+                       compression: Optional[str] = None, batch_size: int = 10000) -> Dict[str, Dict[str, Any]]:
+    """
+    Export the stored hierarchy of an acquisition as columnar tables
+
+    Args:
+        acquisition_uuid: UUID of an extracted acquisition
+        directory: Root directory of the exported dataset
+        fmt: 'parquet' or 'arrow' (Arrow IPC)
+        compression: Parquet compression codec, zstd by default
+        batch_size: Rows decoded and converted at a time
+
+    Returns:
+        Dictionary mapping each table name to its path, rows and bytes
+    """
+    if pyarrow is None:
+        raise ImportError('pyarrow is required for columnar export, install it with pip install pyarrow')
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f'Unknown export format: {fmt}')
+
+    exported = {}
+    for level, table_name, parent_key, attached_prefix in TABLES:
+        with timed(f'export.{table_name}') as sample:
+            # Stored rows are decoded twice, to infer the schema of the file
+            # and then to write it, rather than held in memory in between
+            level_rows = (acquisition_uuid, level, parent_key, attached_prefix, batch_size)
+            schema = _unified_schema([table.schema for table in _level_batches(*level_rows)])
+            if schema is None:
+                continue
+            path = table_path(directory, table_name, acquisition_uuid, fmt)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            rows = _write_batches(_level_batches(*level_rows, schema=schema), schema, path, fmt, compression)
+            sample['bytes'] = os.path.getsize(path)
+        exported[table_name] = {'path': path, 'rows': rows, 'bytes': sample['bytes']}
+    return exported
+
+
+def open_table(path: str):
+    """
+    Read one exported file; Arrow IPC files are memory-mapped, without copying
+
+    Args:
+        path: Path of a .parquet or .arrow file
+
+    Returns:
+        pyarrow.Table
+    """
+    if path.endswith(FORMAT_EXTENSIONS[FORMAT_ARROW]):
+        return pyarrow.ipc.open_file(pyarrow.memory_map(path, 'r')).read_all()
+    return pyarrow.parquet.read_table(path, memory_map=True)
+
+
+def _file_schema(path: str):
+    """Schema of an exported file, read from its footer"""
+    if path.endswith(FORMAT_EXTENSIONS[FORMAT_ARROW]):
+        with pyarrow.memory_map(path, 'r') as source:
+            return pyarrow.ipc.open_file(source).schema
+    return pyarrow.parquet.read_schema(path, memory_map=True)
+
+
+def open_dataset(directory: str, table_name: str, fmt: str = FORMAT_PARQUET):
+    """
+    Open one table of every exported acquisition as a single dataset
+
+    Each acquisition's file has its own schema, so the dataset is opened
+    with the schema unified over all of them: columns missing from some
+    files read as nulls and integer columns that are floats elsewhere are
+    promoted.
+
+    Args:
+        directory: Root directory of the exported dataset
+        table_name: Table, e.g. 'micrographs'
+        fmt: Format the dataset was exported in
+
+    Returns:
+        pyarrow.dataset.Dataset, scanned lazily
+    """
+    import pyarrow.dataset
+    table_directory = os.path.join(directory, table_name)
+    paths = sorted(os.path.join(table_directory, name) for name in os.listdir(table_directory)
+                   if name.endswith(FORMAT_EXTENSIONS[fmt]))
+    return pyarrow.dataset.dataset(paths, schema=_unified_schema([_file_schema(path) for path in paths]),
+                                   format='parquet' if fmt == FORMAT_PARQUET else 'ipc')
@@ -0,0 +1,148 @@
+"""
+JSON-path queries over stored acquisitions for FandanGO plugin
+
+Evaluates a path into the metadata document of an acquisition, such as
+$.grids[0].grid_squares['<uuid>'].quality_prediction.value, against the
+normalized hierarchy tables: the path is followed level by level with
+indexed lookups, and only the entity or subtree it ends on is loaded, so a
+grid square can be inspected without reading the whole document.
+
+Supported steps are .field, [index] (position within a list) and
+['key'] (UUID of a grid, grid square, foil hole or micrograph, or a
+field name).
+"""
+
+import re
+from typing import Any, List, Tuple, Union
+
+from fandango_dls.db.sqlite_db import (
+    get_acquisition,
+    get_child_uuids,
+    get_entity_fields,
+    get_foil_hole_tree,
+    get_grid_square_tree,
+    get_grid_tree,
+    has_child
+)
+
+# List holding the children of each level in the metadata document, and their level
+CHILDREN = {
+    'acquisition': ('grids', 'grid'),
+    'grid': ('grid_squares', 'grid_square'),
+    'grid_square': ('foil_holes', 'foil_hole'),
+    'foil_hole': ('micrographs', 'micrograph')
+}
+
+_STEP = re.compile(r"\.?([A-Za-z_][A-Za-z0-9_]*)|\[\s*(-?\d+)\s*\]|\[\s*(['\"])(.*?)\3\s*\]")
+
+
+def parse_path(path: str) -> List[Union[str, int]]:
+    """
+    Split a JSON path into field names and list indices
+
+    Args:
+        path: Path such as $.grids[0].grid_info.name; the leading $ is optional
+
+    Returns:
+        Steps of the path, strings for fields and UUIDs, integers for indices
+    """
+    text = path.strip()
+    if text.startswith('$'):
+        text = text[1:]
+    steps = []
+    position = 0
+    while position < len(text):
+        match = _STEP.match(text, position)
+        if not match:
+            raise ValueError(f'Invalid JSON path {path!r} at {text[position:]!r}')
+        name, index, _, key = match.groups()
+        steps.append(int(index) if index is not None else name if name is not None else key)
+        position = match.end()
+    return steps
+
+
+def _materialize(level: str, uuid: str) -> Any:
+    """Subtree of a stored entity, as it appears in the metadata document"""
+    if level == 'acquisition':
+        acquisition_info, grid_uuids = get_acquisition(uuid)
+        return {'acquisition': acquisition_info, 'grids': [get_grid_tree(grid_uuid) for grid_uuid in grid_uuids]}
+    if level == 'grid':
+        return get_grid_tree(uuid)
+    if level == 'grid_square':
+        return get_grid_square_tree(uuid)
+    if level == 'foil_hole':
+        return get_foil_hole_tree(uuid)
+    return get_entity_fields(level, uuid)
+
+
+def _step_into_value(value: Any, step: Union[str, int], path: str) -> Any:
+    """Follow a step inside an already loaded value"""
+    try:
+        if isinstance(value, list) and isinstance(step, int):
+            return value[step]
+        if isinstance(value, dict) and isinstance(step, str):
+            return value[step]
+    except (IndexError, KeyError):
+        pass
+    raise LookupError(f'{path!r} does not exist in the metadata: no {step!r}')
+
+
+def _child_uuid(level: str, parent_uuid: str, step: Union[str, int], path: str) -> str:
+    """UUID of the child of a stored entity selected by position or UUID"""
+    if isinstance(step, int):
+        if step < 0:
+            raise ValueError(f'Negative indices are not supported: {path!r}')
+        uuids = get_child_uuids(level, parent_uuid, limit=1, offset=step)
+        if uuids:
+            return uuids[0]
+    elif has_child(level, parent_uuid, step):
+        return step
+    raise LookupError(f'{path!r} does not exist in the metadata: no {level} {step!r}')
+
+
+def query_metadata(acquisition_uuid: str, path: str) -> Tuple[str, Any]:
+    """
+    Evaluate a JSON path against the stored metadata of an acquisition
+
+    Args:
+        acquisition_uuid: UUID of an extracted acquisition
+        path: JSON path into its metadata document
+
+    Returns:
+        The path in canonical form and the value it points to
+    """
+    if get_entity_fields('acquisition', acquisition_uuid) is None:
+        raise LookupError(f'Acquisition {acquisition_uuid} has not been extracted')
+
+    # The cursor is a stored entity (level, uuid), a list of stored children
+    # (child level, parent uuid), or a loaded value
+    entity = ('acquisition', acquisition_uuid)
+    children = None
+    value = None
+    loaded = False
+    canonical = '$'
+    for step in parse_path(path):
+        if isinstance(step, int):
+            canonical += f'[{step}]'
+        elif children is not None or not step.isidentifier():
+            canonical += f"['{step}']"
+        else:
+            canonical += f'.{step}'
+        if loaded:
+            value = _step_into_value(value, step, canonical)
+        elif children is not None:
+            child_level, parent_uuid = children
+            entity = (child_level, _child_uuid(child_level, parent_uuid, step, canonical))
+            children = None
+        elif isinstance(step, str) and CHILDREN.get(entity[0], (None,))[0] == step:
+            children = (CHILDREN[entity[0]][1], entity[1])
+        else:
+            value = _step_into_value(get_entity_fields(*entity), step, canonical)
+            loaded = True
+
+    if loaded:
+        return canonical, value
+    if children is not None:
+        child_level, parent_uuid = children
+        return canonical, [_materialize(child_level, uuid) for uuid in get_child_uuids(child_level, parent_uuid)]
+    return canonical, _materialize(*entity)
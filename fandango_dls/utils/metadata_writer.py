@@ -0,0 +1,149 @@
+"""
+Streaming metadata writer for FandanGO plugin
+
+Writes the node stream produced by
+FandanGOSmartEMClient.iter_acquisition_metadata to a JSON document
+incrementally, so the whole acquisition tree is never held in memory.
+The output is identical to serializing the tree returned by
+extract_acquisition_metadata with fandango_dls.utils.serialization.dumps,
+either indented or compact.
+"""
+
+from typing import Any, Dict, IO, Iterable, Optional, Tuple
+
+from fandango_dls.constants import (
+    NODE_ACQUISITION,
+    NODE_GRID,
+    NODE_GRID_SQUARE,
+    NODE_GRID_END
+)
+from fandango_dls.db.blob_store import BlobWriter
+from fandango_dls.utils.metrics import timed
+from fandango_dls.utils.serialization import dumps
+
+
+class StreamingMetadataWriter:
+    """
+    Incremental writer for the acquisition metadata JSON document.
+
+    Nodes must be written in the order yielded by
+    iter_acquisition_metadata. Each node is serialized and written as soon
+    as it arrives.
+    """
+
+    def __init__(self, fp: IO[str], indent: Optional[int] = 2):
+        """
+        Initialize the writer
+
+        Args:
+            fp: Text file object to write the document to
+            indent: Indentation as in json.dumps, or None for compact output
+                without spaces
+        """
+        self.fp = fp
+        self.indent = indent
+        self.num_grids = 0
+        self.num_grid_squares = 0
+        self.acquisition_name = 'Unknown'
+        self._grid_squares_in_grid = 0
+        self._atlas = None
+        self._colon = ': ' if indent is not None else ':'
+
+    def _newline(self, level: int) -> str:
+        """Line break followed by the indentation of a nesting level"""
+        return '' if self.indent is None else '\n' + ' ' * self.indent * level
+
+    def _dumps(self, value: Any, level: int) -> str:
+        """
+        Serialize a value as it would appear nested at the given indent level
+
+        Args:
+            value: JSON-compatible value
+            level: Nesting level of the value within the document
+
+        Returns:
+            JSON string whose continuation lines are indented for that level
+        """
+        if self.indent is None:
+            return dumps(value)
+        # JSON strings never contain raw newlines, so this only re-indents structure
+        return dumps(value, indent=self.indent).replace('\n', self._newline(level))
+
+    def _key(self, name: str) -> str:
+        """Object key followed by the key separator"""
+        return '"' + name + '"' + self._colon
+
+    @timed('serialize.write_node')
+    def write_node(self, node_type: str, node: Any):
+        """
+        Write a single node of the metadata stream
+
+        Args:
+            node_type: One of the NODE_* constants
+            node: JSON-compatible payload of the node
+        """
+        nl = self._newline
+        if node_type == NODE_ACQUISITION:
+            self.acquisition_name = (node or {}).get('name', 'Unknown')
+            self.fp.write('{' + nl(1) + self._key('acquisition') + self._dumps(node, 1) + ','
+                          + nl(1) + self._key('grids') + '[')
+        elif node_type == NODE_GRID:
+            separator = ',' if self.num_grids else ''
+            self.fp.write(separator + nl(2) + '{' + nl(3) + self._key('grid_info') + self._dumps(node['grid_info'], 3)
+                          + ',' + nl(3) + self._key('grid_squares') + '[')
+            # The atlas follows the grid squares in the document
+            self._atlas = self._dumps(node['atlas'], 3)
+            self.num_grids += 1
+            self._grid_squares_in_grid = 0
+        elif node_type == NODE_GRID_SQUARE:
+            separator = ',' if self._grid_squares_in_grid else ''
+            self.fp.write(separator + nl(4) + self._dumps(node, 4))
+            self._grid_squares_in_grid += 1
+            self.num_grid_squares += 1
+        elif node_type == NODE_GRID_END:
+            closing = nl(3) + ']' if self._grid_squares_in_grid else ']'
+            self.fp.write(closing + ',' + nl(3) + self._key('atlas') + self._atlas + nl(2) + '}')
+        else:
+            raise ValueError(f"Unknown metadata node type: {node_type}")
+
+    def close(self):
+        """Terminate the document"""
+        closing = self._newline(1) + ']' if self.num_grids else ']'
+        self.fp.write(closing + self._newline(0) + '}')
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summary of what has been written so far
+
+        Returns:
+            Dictionary with grid and grid square counts and the acquisition name
+        """
+        return {
+            'num_grids': self.num_grids,
+            'num_grid_squares': self.num_grid_squares,
+            'acquisition_name': self.acquisition_name
+        }
+
+
+def write_metadata_blob(nodes: Iterable[Tuple[str, Any]], codec: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Stream a metadata node iterable into a compressed content-addressed blob
+
+    Args:
+        nodes: Iterable of (node_type, payload) tuples
+        codec: Compression codec, defaults to the configured one
+
+    Returns:
+        Tuple of (blob digest, summary of the written document)
+    """
+    blob = BlobWriter(codec)
+    try:
+        writer = StreamingMetadataWriter(blob, indent=None)
+        for node_type, node in nodes:
+            writer.write_node(node_type, node)
+        writer.close()
+    except BaseException:
+        blob.discard()
+        raise
+
+    return blob.commit(), writer.summary()
@@ -0,0 +1,279 @@
+"""
+Instrumentation for FandanGO plugin actions
+
+Operations (SmartEM calls, database reads and writes, serialization, blob
+storage, ARIA pushes) are timed into a process-wide registry of latency
+histograms with call, error and byte counters. Every action returns a
+summary of the registry in its results, can dump a cProfile of its run,
+and can export the registry as a Prometheus textfile for the node
+exporter's textfile collector.
+"""
+
+import configparser
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf'))
+
+PROMETHEUS_PREFIX = 'fandango_dls'
+
+
+class Metrics:
+    """Thread-safe registry of per-operation latency histograms and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all observations"""
+        with self._lock:
+            self._operations = {}
+            self.started_at = time.time()
+
+    def observe(self, name: str, seconds: float, nbytes: Optional[int] = None, error: bool = False):
+        """
+        Record one execution of an operation
+
+        Args:
+            name: Operation name, dotted by subsystem (e.g. 'smartem.get_acquisition')
+            seconds: Duration of the execution
+            nbytes: Bytes transferred or written, if meaningful
+            error: Whether the execution failed
+        """
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = {
+                    'count': 0, 'errors': 0, 'sum': 0.0, 'max': 0.0, 'bytes': 0, 'buckets': [0] * len(BUCKETS)
+                }
+            operation['count'] += 1
+            operation['errors'] += int(error)
+            operation['sum'] += seconds
+            operation['max'] = max(operation['max'], seconds)
+            operation['bytes'] += nbytes or 0
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    operation['buckets'][i] += 1
+                    break
+
+    @staticmethod
+    def _quantile(operation: Dict[str, Any], q: float) -> float:
+        """Upper bound of the histogram bucket holding the q-quantile"""
+        rank = q * operation['count']
+        seen = 0
+        for bound, count in zip(BUCKETS, operation['buckets']):
+            seen += count
+            if seen >= rank:
+                return operation['max'] if bound == float('inf') else min(bound, operation['max'])
+        return operation['max']
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summary of all operations observed since the last reset
+
+        Returns:
+            Dictionary with the wall time since reset and, per operation,
+            count, errors, total seconds, mean/max latency, bucket-bound
+            p50/p95 latency and bytes
+        """
+        with self._lock:
+            operations = {name: dict(operation) for name, operation in self._operations.items()}
+            wall = time.time() - self.started_at
+        return {
+            'wall_seconds': round(wall, 3),
+            'operations': {
+                name: {
+                    'count': operation['count'],
+                    'errors': operation['errors'],
+                    'total_seconds': round(operation['sum'], 4),
+                    'mean_ms': round(operation['sum'] / operation['count'] * 1000, 3),
+                    'p50_ms': round(self._quantile(operation, 0.5) * 1000, 3),
+                    'p95_ms': round(self._quantile(operation, 0.95) * 1000, 3),
+                    'max_ms': round(operation['max'] * 1000, 3),
+                    'bytes': operation['bytes']
+                }
+                for name, operation in sorted(operations.items())
+            }
+        }
+
+    def prometheus_text(self, labels: Optional[Dict[str, str]] = None) -> str:
+        """
+        Render the registry in the Prometheus text exposition format
+
+        Args:
+            labels: Labels added to every sample, e.g. the action name
+
+        Returns:
+            Exposition text
+        """
+        def label_string(extra):
+            items = dict(labels or {}, **extra)
+            return '{' + ','.join(f'{key}="{value}"' for key, value in items.items()) + '}'
+
+        with self._lock:
+            operations = {name: dict(operation) for name, operation in self._operations.items()}
+
+        lines = [f'# HELP {PROMETHEUS_PREFIX}_operation_seconds Duration of plugin operations',
+                 f'# TYPE {PROMETHEUS_PREFIX}_operation_seconds histogram']
+        for name, operation in sorted(operations.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, operation['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_bucket'
+                             f'{label_string({"operation": name, "le": le})} {cumulative}')
+            lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_sum{label_string({"operation": name})} '
+                         f'{operation["sum"]}')
+            lines.append(f'{PROMETHEUS_PREFIX}_operation_seconds_count{label_string({"operation": name})} '
+                         f'{operation["count"]}')
+
+        for metric, key, description in (('operation_errors_total', 'errors', 'Failed plugin operations'),
+                                         ('operation_bytes_total', 'bytes', 'Bytes transferred or written')):
+            lines.append(f'# HELP {PROMETHEUS_PREFIX}_{metric} {description}')
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{metric} counter')
+            for name, operation in sorted(operations.items()):
+                lines.append(f'{PROMETHEUS_PREFIX}_{metric}{label_string({"operation": name})} {operation[key]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+# Registry shared by every instrumented module
+REGISTRY = Metrics()
+
+
+def observe(name: str, seconds: float, nbytes: Optional[int] = None, error: bool = False):
+    """Record one execution of an operation in the shared registry"""
+    REGISTRY.observe(name, seconds, nbytes, error)
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Time a block, or a function when used as a decorator, into the shared registry
+
+    Yields a dictionary where the block may set 'bytes' to the amount of
+    data it transferred.
+    """
+    sample = {'bytes': None}
+    start = time.perf_counter()
+    try:
+        yield sample
+    except BaseException:
+        REGISTRY.observe(name, time.perf_counter() - start, sample['bytes'], error=True)
+        raise
+    REGISTRY.observe(name, time.perf_counter() - start, sample['bytes'])
+
+
+def _write_textfile(directory: str, name: str, text: str):
+    """
+    Write <directory>/fandango_dls_<name>.prom
+
+    The file is written under a temporary name and renamed into place, so the
+    textfile collector never reads a partial file.
+    """
+    path = os.path.join(directory, f'{PROMETHEUS_PREFIX}_{name}.prom')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_prometheus_textfile(directory: str, action: str, success: bool):
+    """
+    Write the shared registry as <directory>/fandango_dls_<action>.prom
+
+    Args:
+        directory: Directory watched by the node exporter's textfile collector
+        action: Name of the action that ran
+        success: Whether the action succeeded
+    """
+    labels = {'action': action}
+    text = REGISTRY.prometheus_text(labels)
+    label = '{action="' + action + '"}'
+    text += (f'# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds End time of the last run\n'
+             f'# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge\n'
+             f'{PROMETHEUS_PREFIX}_last_run_timestamp_seconds{label} {time.time()}\n'
+             f'# HELP {PROMETHEUS_PREFIX}_last_run_success Whether the last run succeeded\n'
+             f'# TYPE {PROMETHEUS_PREFIX}_last_run_success gauge\n'
+             f'{PROMETHEUS_PREFIX}_last_run_success{label} {int(bool(success))}\n')
+    _write_textfile(directory, action, text)
+
+
+def write_prometheus_gauges(directory: str, action: str, gauges: Dict[str, Tuple[float, str]]):
+    """
+    Write the progress gauges of a running action as <directory>/fandango_dls_<action>_progress.prom
+
+    The file is separate from the one written when the action ends, so
+    neither overwrites the other, and holds only the gauges, so no series
+    appears in both.
+
+    Args:
+        directory: Directory watched by the node exporter's textfile collector
+        action: Name of the running action
+        gauges: Gauges as {name: (value, description)}
+    """
+    label = '{action="' + action + '"}'
+    text = ''
+    for name, (value, description) in gauges.items():
+        text += (f'# HELP {PROMETHEUS_PREFIX}_{name} {description}\n'
+                 f'# TYPE {PROMETHEUS_PREFIX}_{name} gauge\n'
+                 f'{PROMETHEUS_PREFIX}_{name}{label} {value}\n')
+    _write_textfile(directory, f'{action}_progress', text)
+
+
+def metrics_directory(args: Dict[str, Any]) -> Optional[str]:
+    """Prometheus textfile directory of a run: the metrics-dir argument, else config.yaml, else None"""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+    return args.get('metrics-dir') or (
+        config['METRICS'].get('PROMETHEUS_TEXTFILE_DIR') if config.has_section('METRICS') else None)
+
+
+def run_instrumented(action: str, perform_action: Callable[[Dict[str, Any]], Dict[str, Any]],
+                     args: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Run an action's perform_action with instrumentation
+
+    The shared registry is reset before the run and its summary is added to
+    the results as 'metrics'. With a 'profile' argument the run is profiled
+    with cProfile (calling thread only), the stats are dumped to that path
+    and the top functions printed. With a 'metrics-dir' argument, or
+    [METRICS] PROMETHEUS_TEXTFILE_DIR in config.yaml, the registry is also
+    written as a Prometheus textfile.
+
+    Args:
+        action: Action name
+        perform_action: Entry point of the action
+        args: Arguments of the action
+
+    Returns:
+        dict: Results of the action with its metrics summary
+    """
+    metrics_dir = metrics_directory(args)
+    profile_path = args.get('profile')
+
+    REGISTRY.reset()
+    if profile_path:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        results = profiler.runcall(perform_action, args)
+        profiler.dump_stats(profile_path)
+        print(f'... profile written to {profile_path}, top functions by cumulative time:')
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+    else:
+        results = perform_action(args)
+
+    if isinstance(results, dict):
+        results['metrics'] = REGISTRY.summary()
+        if metrics_dir:
+            try:
+                write_prometheus_textfile(metrics_dir, action, results.get('success'))
+            except OSError as e:
+                print(f'... could not write Prometheus metrics because of: {e}')
+    return results
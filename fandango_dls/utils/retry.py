@@ -0,0 +1,154 @@
+"""
+Retry and circuit breaker policies for SmartEM API calls
+
+Transient failures (network errors, timeouts, 429 and 5xx responses) are
+retried with exponential backoff and full jitter. A circuit breaker shared
+by all calls stops sending requests for a while once the server keeps
+failing, so a saturated SmartEM instance is not hammered by retries.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the server while the circuit breaker is open"""
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status code carried by an httpx/requests error, if any"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Whether a failed call is worth retrying
+
+    Only 429/5xx responses and network failures are transient: httpx
+    transport errors, requests connection errors and timeouts, and OS level
+    connection errors and timeouts. Other responses such as 404 and any
+    other error, e.g. a ValueError from a malformed response, are not.
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    code = status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    # The HTTP libraries are only looked up once loaded, as an error raised
+    # by one of them means it is, so checking does not import them
+    requests = sys.modules.get('requests')
+    if requests is not None and isinstance(error, requests.RequestException):
+        # Every requests error is an OSError, most are not network failures
+        return isinstance(error, (requests.ConnectionError, requests.Timeout))
+    httpx = sys.modules.get('httpx')
+    if httpx is not None and isinstance(error, httpx.TransportError):
+        return True
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After failure_threshold consecutive transient failures the circuit opens
+    and calls fail fast for reset_timeout seconds. The first call after that
+    is let through as a trial: success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 10, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if calls are currently being refused"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError('SmartEM circuit breaker is open after repeated failures')
+            # Half-open: let this call through as a trial, refuse the others
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter around a callable.
+
+    The delay before retry n (starting at 1) is drawn uniformly from
+    [0, min(max_backoff, backoff * 2 ** (n - 1))].
+    """
+
+    def __init__(self, attempts: int = 3, backoff: float = 0.5, max_backoff: float = 30,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize the policy
+
+        Args:
+            attempts: Total number of tries per call, including the first
+            backoff: Base delay in seconds
+            max_backoff: Upper bound of a single delay in seconds
+            circuit_breaker: Optional breaker shared by every call
+        """
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.circuit_breaker = circuit_breaker
+        self.retries = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def call(self, func: Callable, *args, description: str = 'call') -> Any:
+        """
+        Call func(*args), retrying transient failures
+
+        Args:
+            func: Callable to invoke
+            *args: Positional arguments for func
+            description: Name used in log messages
+
+        Returns:
+            Whatever func returns
+
+        Raises:
+            The last error once attempts are exhausted, any non-transient
+            error immediately, or CircuitOpenError while the breaker is open
+        """
+        for attempt in range(1, self.attempts + 1):
+            if self.circuit_breaker:
+                self.circuit_breaker.before_call()
+            try:
+                result = func(*args)
+            except Exception as e:
+                transient = is_transient(e)
+                if transient and self.circuit_breaker:
+                    self.circuit_breaker.record_failure()
+                if not transient or attempt == self.attempts:
+                    raise
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                self.logger.info(f"Retrying {description} in {delay:.2f}s after attempt {attempt} failed: {e}")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+            else:
+                if self.circuit_breaker:
+                    self.circuit_breaker.record_success()
+                return result
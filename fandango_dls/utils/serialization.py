@@ -0,0 +1,135 @@
+"""
+JSON serialization backend for FandanGO plugin
+
+Every JSON encode and decode of the plugin (database rows, metadata blobs,
+ARIA payloads) goes through this module, which uses the fastest encoder
+installed: orjson, then msgspec, then the standard library. The backend can
+be forced with JSON_BACKEND in the [DDBB] section of config.yaml.
+
+Backends agree on the parsed content but not byte for byte (orjson and
+msgspec write non-ASCII characters as UTF-8 and shortest floats without
+zero padding), so content-addressed blobs and ARIA content hashes change
+once when the backend changes.
+"""
+
+import configparser
+import json
+import os
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKEND_ORJSON = 'orjson'
+BACKEND_MSGSPEC = 'msgspec'
+BACKEND_STDLIB = 'json'
+
+# Raised by loads for malformed documents, whatever the backend
+DecodeError = json.JSONDecodeError
+
+
+def available_backends():
+    """Names of the installed backends, fastest first"""
+    return [name for name, module in ((BACKEND_ORJSON, orjson), (BACKEND_MSGSPEC, msgspec), (BACKEND_STDLIB, json))
+            if module is not None]
+
+
+def _configured_backend():
+    """Backend forced in config.yaml, else the fastest one installed"""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'config.yaml'))
+    configured = config['DDBB'].get('JSON_BACKEND') if config.has_section('DDBB') else None
+    if configured and configured not in available_backends():
+        raise ImportError(f'JSON backend {configured} is not installed')
+    return configured or available_backends()[0]
+
+
+backend = _configured_backend()
+
+
+def _stdlib_dumps(value, indent, sort_keys, default):
+    if indent is None:
+        return json.dumps(value, separators=(',', ':'), sort_keys=sort_keys, default=default)
+    return json.dumps(value, indent=indent, sort_keys=sort_keys, default=default)
+
+
+def dumps(value: Any, indent: Optional[int] = None, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Serialize a value to a JSON string
+
+    Values a fast backend rejects (e.g. integers beyond 64 bits) are
+    serialized by the standard library instead.
+
+    Args:
+        value: JSON-compatible value
+        indent: Indentation, or None for compact output without spaces
+        sort_keys: Sort object keys
+        default: Function converting values that are not JSON-compatible
+
+    Returns:
+        JSON document
+    """
+    try:
+        if backend == BACKEND_ORJSON and indent in (None, 2):
+            option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+            return orjson.dumps(value, default=default, option=option).decode('utf-8')
+        if backend == BACKEND_MSGSPEC and indent is None and not sort_keys:
+            return msgspec.json.encode(value, enc_hook=default).decode('utf-8')
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return _stdlib_dumps(value, indent, sort_keys, default)
+
+
+def loads(document: Union[str, bytes]) -> Any:
+    """
+    Parse a JSON document
+
+    Args:
+        document: JSON text, as str or UTF-8 bytes
+
+    Returns:
+        Parsed value
+
+    Raises:
+        DecodeError: If the document is not valid JSON
+    """
+    if backend == BACKEND_ORJSON:
+        return orjson.loads(document)
+    if backend == BACKEND_MSGSPEC:
+        try:
+            return msgspec.json.decode(document)
+        except msgspec.DecodeError as e:
+            raise DecodeError(str(e), document if isinstance(document, str) else '', 0) from None
+    return json.loads(document)
+
+
+def to_builtins(model: Any) -> Any:
+    """
+    Convert an API model to JSON-compatible builtins in a single pass
+
+    Pydantic models are dumped by pydantic-core in JSON mode, so dates,
+    UUIDs and enums come out as strings without a round-trip through a JSON
+    string. msgspec structs and dataclasses are converted by msgspec when
+    installed.
+
+    Args:
+        model: Pydantic model, msgspec struct, dataclass or mapping
+
+    Returns:
+        JSON-compatible dictionary
+    """
+    if hasattr(model, 'model_dump'):
+        return model.model_dump(mode='json')
+    if hasattr(model, 'dict'):
+        return model.dict()
+    if msgspec is not None and not isinstance(model, dict):
+        return msgspec.to_builtins(model, str_keys=True)
+    return dict(model)
@@ -0,0 +1,137 @@
+"""
+Persistent response cache for SmartEM API calls
+
+Responses are pickled into a small SQLite database keyed by API method and
+arguments, expire after a TTL unless marked immutable, and are evicted least
+recently used first once the cache grows beyond its size cap.
+"""
+
+import logging
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Tuple
+
+
+class SmartEMResponseCache:
+    """
+    On-disk TTL/LRU cache of SmartEMAPIClient responses.
+
+    Entries written while extracting an acquisition whose status is one of
+    immutable_statuses never expire, since a completed acquisition no
+    longer changes. They are still subject to LRU eviction.
+    """
+
+    def __init__(self, path: str, ttl: float = 3600, max_bytes: int = 1024 ** 3,
+                 immutable_statuses: Iterable[str] = ('completed',)):
+        """
+        Initialize the cache
+
+        Args:
+            path: SQLite file holding the cache
+            ttl: Seconds after which a mutable entry is stale
+            max_bytes: Total size of cached responses before LRU eviction
+            immutable_statuses: Acquisition statuses whose data never changes
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.immutable_statuses = {status.lower() for status in immutable_statuses}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                        key TEXT PRIMARY KEY,
+                                        value BLOB NOT NULL,
+                                        size INTEGER NOT NULL,
+                                        created_at REAL NOT NULL,
+                                        accessed_at REAL NOT NULL,
+                                        immutable INTEGER NOT NULL);''')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)')
+        self._connection.commit()
+        self._total_bytes = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def make_key(method: str, args: Tuple) -> str:
+        """Cache key of an API call"""
+        return ':'.join([method] + [str(arg) for arg in args])
+
+    def is_immutable(self, acquisition_info: Dict[str, Any]) -> bool:
+        """Whether an acquisition's data can be cached without expiry"""
+        status = str((acquisition_info or {}).get('status') or '').lower()
+        return status in self.immutable_statuses
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Tuple of (hit, value); value is None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, created_at, immutable FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (not row[2] and now - row[1] > self.ttl):
+                self.misses += 1
+                return False, None
+            self._connection.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return True, pickle.loads(row[0])
+
+    def put(self, key: str, value: Any, immutable: bool = False):
+        """
+        Store a response, evicting least recently used entries if over the size cap
+
+        Args:
+            key: Cache key from make_key
+            value: Picklable response
+            immutable: Whether the entry never expires
+        """
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            self.logger.debug(f"Response for {key} cannot be cached: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            previous = self._connection.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                     (key, data, len(data), now, now, int(immutable)))
+            self._total_bytes += len(data) - (previous[0] if previous else 0)
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        """Delete least recently used entries until the cache fits its size cap"""
+        while self._total_bytes > self.max_bytes:
+            rows = self._connection.execute(
+                'SELECT key, size FROM responses ORDER BY accessed_at LIMIT 100'
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._total_bytes -= size
+                self.evictions += 1
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counters since the cache was opened"""
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def close(self):
+        """Close the cache database"""
+        with self._lock:
+            self._connection.close()
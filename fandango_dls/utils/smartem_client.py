@@ -5,9 +5,22 @@ This module provides a simplified interface to the SmartEM API
 for extracting cryo-EM metadata from DLS systems.
 """
 
-import json
+import copy
+import heapq
+import inspect
 import logging
-from typing import Dict, Any, List
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
+from functools import partial
+from typing import Dict, Any, List, Callable, Iterator, Optional, Set, Tuple
+from fandango_dls.constants import NODE_ACQUISITION, NODE_GRID, NODE_GRID_SQUARE, NODE_GRID_END
+from fandango_dls.utils.retry import RetryPolicy
+from fandango_dls.utils.metrics import timed
+from fandango_dls.utils.serialization import dumps, to_builtins
+from fandango_dls.utils.smartem_cache import SmartEMResponseCache
+from fandango_dls.utils.transport import TransportSettings, configure_transport, track_response_bytes
 
 # Import from smartem-decisions if available
 try:
@@ -16,6 +29,183 @@ except ImportError:
     SmartEMAPIClient = None
     logging.warning("smartem_backend not available. Install smartem-decisions package.")
 
+# Hierarchy levels whose fetches can run concurrently. The limit of a level
+# bounds how many requests for entities of that level are in flight at once,
+# e.g. 'micrographs' bounds parallel get_foil_hole_micrographs calls.
+LEVEL_GRID_SQUARES = 'grid_squares'
+LEVEL_FOIL_HOLES = 'foil_holes'
+LEVEL_MICROGRAPHS = 'micrographs'
+EXTRACTION_LEVELS = (LEVEL_GRID_SQUARES, LEVEL_FOIL_HOLES, LEVEL_MICROGRAPHS)
+
+# SmartEMAPIClient listing methods used by the bulk fetch path, with the
+# per-parent method each one replaces and the attribute linking a listed
+# child to its parent. Listings are requested one grid at a time, filtered
+# by the BULK_LISTING_SCOPE keyword; levels whose listing is missing, does
+# not accept that filter or fails fall back to the per-parent method, so
+# the entities of the whole server are never listed.
+BULK_LISTINGS = {
+    LEVEL_FOIL_HOLES: ('get_foil_holes', 'get_foil_holes_for_gridsquare', 'gridsquare_uuid'),
+    LEVEL_MICROGRAPHS: ('get_micrographs', 'get_foil_hole_micrographs', 'foilhole_uuid')
+}
+BULK_LISTING_SCOPE = 'grid_uuid'
+
+# Calls that are never served from the response cache: the acquisition
+# record decides whether the rest of its data is immutable, and the
+# acquisition listing is expected to change
+UNCACHED_METHODS = {'get_acquisition', 'get_acquisitions'}
+
+# Entity kinds whose serialized fields can be projected by an ExtractionScope
+PROJECTABLE_KINDS = ('acquisition', 'grid', 'atlas', 'grid_square', 'quality_prediction', 'foil_hole', 'micrograph')
+
+# Keyword arguments of the acquisition listing that filter or page it on the
+# server, by query attribute; the first name the listing accepts is used.
+# Filters are always applied again locally, so servers ignoring them are safe.
+ACQUISITION_FILTER_PARAMETERS = {
+    'since': ('start_time_from', 'start_time_gte', 'since'),
+    'until': ('start_time_to', 'start_time_lte', 'until'),
+    'status': ('status',),
+    'instrument': ('instrument_id', 'instrument')
+}
+ACQUISITION_PAGE_PARAMETERS = (('limit', 'offset'), ('limit', 'skip'), ('page_size', 'page'))
+
+
+class AcquisitionQuery:
+    """
+    Which SmartEM acquisitions a discovery returns
+
+    Args:
+        since: Only acquisitions started at or after this ISO date/time
+        until: Only acquisitions started before this ISO date/time
+        statuses: Only acquisitions in these statuses
+        instruments: Only acquisitions on these instruments (instrument_id
+            or instrument_model)
+        page_size: Acquisitions requested per page when the listing can be
+            paged on the server
+    """
+
+    def __init__(self, since: Optional[str] = None, until: Optional[str] = None,
+                 statuses: Optional[List[str]] = None, instruments: Optional[List[str]] = None,
+                 page_size: int = 100):
+        if page_size < 1:
+            raise ValueError(f'Invalid page size: {page_size}')
+        self.since = since
+        self.until = until
+        self.statuses = set(statuses) if statuses else None
+        self.instruments = set(instruments) if instruments else None
+        self.page_size = page_size
+
+    def matches(self, acquisition) -> bool:
+        """Whether an acquisition model or summary passes every filter"""
+        def field(name):
+            return acquisition.get(name) if isinstance(acquisition, dict) else getattr(acquisition, name, None)
+
+        start_time = str(field('start_time') or '')
+        if self.since and start_time < self.since:
+            return False
+        if self.until and start_time >= self.until:
+            return False
+        if self.statuses and field('status') not in self.statuses:
+            return False
+        if self.instruments and not {field('instrument_id'), field('instrument_model')} & self.instruments:
+            return False
+        return True
+
+    def server_filters(self) -> Dict[str, Any]:
+        """Filter values by query attribute, for the listing parameters of ACQUISITION_FILTER_PARAMETERS"""
+        filters = {'since': self.since, 'until': self.until}
+        # A listing parameter takes one value, several are filtered locally
+        if self.statuses and len(self.statuses) == 1:
+            filters['status'] = next(iter(self.statuses))
+        if self.instruments and len(self.instruments) == 1:
+            filters['instrument'] = next(iter(self.instruments))
+        return {name: value for name, value in filters.items() if value}
+
+
+def _start_time(acquisition) -> str:
+    """Sort key of an acquisition model: its start time, empty if unknown"""
+    return str(getattr(acquisition, 'start_time', None) or '')
+
+
+def _summary_start_time(acquisition: Dict[str, Any]) -> str:
+    """Sort key of an acquisition summary: its start time, empty if unknown"""
+    return str(acquisition.get('start_time') or '')
+
+
+class ExtractionScope:
+    """
+    Which part of an acquisition an extraction fetches
+
+    The default scope fetches everything. A narrower scope saves the API
+    calls and payload of what a deposition does not need: levels below the
+    depth are never requested, grid squares failing the filters are dropped
+    before their foil holes are fetched, and serialized entities keep only
+    the projected fields (plus 'uuid', which storage and chunking key on).
+
+    Args:
+        depth: Deepest level fetched: 'grid_squares', 'foil_holes' or 'micrographs'
+        atlas: Fetch the atlas of every grid
+        quality: Include grid square quality predictions
+        statuses: Keep only grid squares in these statuses
+        min_quality: Keep only grid squares whose quality prediction value
+            is at least this (grid squares without prediction are dropped)
+        fields: Fields kept per entity kind (see PROJECTABLE_KINDS), kinds
+            not listed keep every field
+    """
+
+    def __init__(self, depth: str = LEVEL_MICROGRAPHS, atlas: bool = True, quality: bool = True,
+                 statuses: Optional[List[str]] = None, min_quality: Optional[float] = None,
+                 fields: Optional[Dict[str, List[str]]] = None):
+        if depth not in EXTRACTION_LEVELS:
+            raise ValueError(f"Unknown extraction depth: {depth}")
+        for kind in fields or {}:
+            if kind not in PROJECTABLE_KINDS:
+                raise ValueError(f"Unknown entity kind to project: {kind}")
+        self.depth = depth
+        self.atlas = atlas
+        self.quality = quality
+        self.statuses = set(statuses) if statuses else None
+        self.min_quality = min_quality
+        self.fields = {kind: set(names) | {'uuid'} for kind, names in (fields or {}).items() if names}
+
+    @property
+    def key(self) -> Optional[str]:
+        """Canonical description of a restricted scope, None for the full scope"""
+        restrictions = {
+            'depth': self.depth if self.depth != LEVEL_MICROGRAPHS else None,
+            'atlas': None if self.atlas else False,
+            'quality': None if self.quality else False,
+            'statuses': sorted(self.statuses) if self.statuses else None,
+            'min_quality': self.min_quality,
+            'fields': {kind: sorted(names) for kind, names in sorted(self.fields.items())} or None
+        }
+        restricted = {name: value for name, value in restrictions.items() if value is not None}
+        return dumps(restricted, sort_keys=True) if restricted else None
+
+    def fetches(self, level: str) -> bool:
+        """Whether entities of a hierarchy level are fetched"""
+        return EXTRACTION_LEVELS.index(level) <= EXTRACTION_LEVELS.index(self.depth)
+
+    def keeps_status(self, gs_info: Dict[str, Any]) -> bool:
+        """Whether a serialized grid square passes the status filter"""
+        return self.statuses is None or gs_info.get('status') in self.statuses
+
+    def keeps_quality(self, quality_info: Optional[Dict[str, Any]]) -> bool:
+        """Whether a serialized quality prediction passes the quality filter"""
+        if self.min_quality is None:
+            return True
+        value = (quality_info or {}).get('value')
+        return value is not None and value >= self.min_quality
+
+    def project(self, kind: str, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Keep only the configured fields of a serialized entity"""
+        names = self.fields.get(kind)
+        if names is None or not isinstance(data, dict):
+            return data
+        return {name: value for name, value in data.items() if name in names}
+
+
+FULL_SCOPE = ExtractionScope()
+
 
 class FandanGOSmartEMClient:
     """
@@ -25,12 +215,27 @@ class FandanGOSmartEMClient:
     be sent to ARIA.
     """
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, max_workers: Optional[Dict[str, int]] = None,
+                 bulk_fetch: bool = False, cache: Optional[SmartEMResponseCache] = None,
+                 retry: Optional[RetryPolicy] = None, timeout: Optional[float] = None,
+                 transport: Optional[TransportSettings] = None):
         """
         Initialize the client
 
         Args:
             base_url: Base URL of the SmartEM API (e.g., "http://localhost:8000")
+            max_workers: Maximum number of in-flight requests per hierarchy
+                level, keyed by 'grid_squares', 'foil_holes' and 'micrographs'.
+                Missing levels default to 1 (serial).
+            bulk_fetch: Fetch foil holes and micrographs with one listing
+                request per level and grid, joined client-side by parent
+                UUID, instead of one request per parent
+            cache: Optional persistent cache serving repeated API calls
+            retry: Optional policy retrying transient API failures
+            timeout: Per-request timeout in seconds passed to SmartEMAPIClient
+            transport: Optional connection pool, keep-alive and HTTP/2
+                settings applied to the SmartEMAPIClient session. The pool
+                defaults to one connection per concurrent request.
         """
         if SmartEMAPIClient is None:
             raise ImportError(
@@ -38,10 +243,35 @@ class FandanGOSmartEMClient:
                 "Please install smartem-decisions package or add it to PYTHONPATH"
             )
 
-        self.client = SmartEMAPIClient(base_url=base_url)
+        self.client = SmartEMAPIClient(base_url=base_url, **({'timeout': timeout} if timeout else {}))
         self.logger = logging.getLogger(__name__)
-
-    def extract_acquisition_metadata(self, acquisition_uuid: str) -> Dict[str, Any]:
+        self.max_workers = {level: 1 for level in EXTRACTION_LEVELS}
+        for level, workers in (max_workers or {}).items():
+            if level not in self.max_workers:
+                raise ValueError(f"Unknown extraction level: {level}")
+            self.max_workers[level] = max(1, int(workers))
+        # Every level pool plus the calling thread may have a request in flight
+        self.transport = configure_transport(self.client, transport, sum(self.max_workers.values()) + 1)
+        # Response bytes received by the call in progress on each thread
+        self._received = threading.local()
+        track_response_bytes(self.client, self._count_received)
+        self.bulk_fetch = bulk_fetch
+        self.cache = cache
+        self.retry = retry
+        self.call_counts = Counter()
+        self.reuse_counts = Counter()
+        self.failures = []
+        self._incomplete = set()
+        self._counters_lock = threading.Lock()
+        self._executors = {}
+        self._state = None
+        self._immutable = False
+        self._bulk_index = {}
+        self._bulk_unsupported = set()
+        self._scope = FULL_SCOPE
+
+    def extract_acquisition_metadata(self, acquisition_uuid: str,
+                                     scope: Optional[ExtractionScope] = None) -> Dict[str, Any]:
         """
         Extract complete metadata for an acquisition session.
 
@@ -51,98 +281,492 @@ class FandanGOSmartEMClient:
         - Grid squares, foil holes, and micrographs
         - Quality metrics and imaging parameters
 
+        Sibling entities are fetched concurrently according to the
+        per-level worker limits given at construction time. The result
+        is ordered exactly as the SmartEM API returns each level, so the
+        output is identical to a serial walk.
+
         Args:
             acquisition_uuid: UUID of the acquisition to extract
+            scope: Optional restriction of the levels, grid squares and
+                fields extracted, everything by default
 
         Returns:
             Dictionary containing structured metadata ready for ARIA submission
         """
-        self.logger.info(f"Extracting metadata for acquisition {acquisition_uuid}")
+        metadata = {'acquisition': None, 'grids': []}
 
-        try:
-            # Get acquisition data
-            acquisition = self.client.get_acquisition(acquisition_uuid)
+        for node_type, node in self.iter_acquisition_metadata(acquisition_uuid, scope=scope):
+            if node_type == NODE_ACQUISITION:
+                metadata['acquisition'] = node
+            elif node_type == NODE_GRID:
+                grid_data = {'grid_info': node['grid_info'], 'grid_squares': [], 'atlas': node['atlas']}
+                metadata['grids'].append(grid_data)
+            elif node_type == NODE_GRID_SQUARE:
+                grid_data['grid_squares'].append(node)
 
-            # Get all grids for this acquisition
-            grids = self.client.get_acquisition_grids(acquisition_uuid)
+        return metadata
 
-            metadata = {
-                'acquisition': self._serialize_model(acquisition),
-                'grids': []
-            }
+    def iter_acquisition_metadata(self, acquisition_uuid: str, state=None,
+                                  scope: Optional[ExtractionScope] = None) -> Iterator[Tuple[str, Any]]:
+        """
+        Extract metadata for an acquisition session as a stream of nodes.
+
+        Nodes are yielded in document order as (node_type, payload) tuples:
+        - (NODE_ACQUISITION, acquisition dict), once
+        - (NODE_GRID, {'grid_info': dict, 'atlas': dict or None}), once per grid
+        - (NODE_GRID_SQUARE, grid square subtree), once per grid square of the
+          current grid, including its foil holes and micrographs
+        - (NODE_GRID_END, None), closing the current grid
+
+        Only a bounded window of grid square subtrees (one per worker) is held
+        at a time, so memory does not grow with the size of the acquisition.
+
+        When a state store is given, extraction is incremental: a grid square
+        whose record is unchanged since the stored subtree was extracted is
+        reused without fetching its children, and within a changed grid square
+        unchanged foil holes keep their stored micrographs. This relies on
+        SmartEM updating a parent record (status, counts, timestamps) as new
+        children are collected. Every freshly fetched grid square subtree is
+        saved back to the store.
+
+        A state store can also resume an interrupted extraction: grids it
+        reports as completed are replayed from the store without any API
+        call. Stored subtrees must come from an extraction with the same
+        scope (see ExtractionState).
+
+        A scope limits the extraction: levels below its depth are not
+        fetched, and neither is the atlas or the quality prediction when
+        excluded; grid squares failing its filters are left out of the
+        stream; serialized entities are projected to its fields.
 
-            # For each grid, get detailed data
-            for grid in grids:
-                grid_data = {
-                    'grid_info': self._serialize_model(grid),
-                    'grid_squares': [],
-                    'atlas': None
-                }
-
-                # Get grid squares for this grid
-                try:
-                    grid_squares = self.client.get_grid_squares_for_grid(grid.uuid)
-
-                    for gs in grid_squares:
-                        gs_data = {
-                            'grid_square_info': self._serialize_model(gs),
-                            'foil_holes': [],
-                            'quality_prediction': None
-                        }
-
-                        # Get foil holes for this grid square
-                        try:
-                            foil_holes = self.client.get_foil_holes_for_gridsquare(gs.uuid)
-                            for fh in foil_holes:
-                                fh_data = {
-                                    'foil_hole_info': self._serialize_model(fh),
-                                    'micrographs': []
-                                }
-
-                                # Get micrographs for this foil hole
-                                try:
-                                    micrographs = self.client.get_foil_hole_micrographs(fh.uuid)
-                                    fh_data['micrographs'] = [
-                                        self._serialize_model(m) for m in micrographs
-                                    ]
-                                except Exception as e:
-                                    self.logger.warning(f"Could not get micrographs for foil hole {fh.uuid}: {e}")
-
-                                gs_data['foil_holes'].append(fh_data)
-
-                        except Exception as e:
-                            self.logger.warning(f"Could not get foil holes for grid square {gs.uuid}: {e}")
-
-                        # Get quality prediction for this grid square
-                        try:
-                            quality = self.client.get_quality_prediction(gs.uuid)
-                            if quality:
-                                gs_data['quality_prediction'] = self._serialize_model(quality)
-                        except Exception as e:
-                            self.logger.debug(f"No quality prediction for grid square {gs.uuid}: {e}")
-
-                        grid_data['grid_squares'].append(gs_data)
-
-                except Exception as e:
-                    self.logger.warning(f"Could not get grid squares for grid {grid.uuid}: {e}")
-
-                # Get atlas for this grid
-                try:
-                    atlas = self.client.get_grid_atlas(grid.uuid)
-                    if atlas:
-                        grid_data['atlas'] = self._serialize_model(atlas)
-                except Exception as e:
-                    self.logger.debug(f"No atlas for grid {grid.uuid}: {e}")
+        Args:
+            acquisition_uuid: UUID of the acquisition to extract
+            state: Optional store with get(grid_square_uuid) returning a
+                previously extracted subtree to compare against or None,
+                save(grid_square_uuid, subtree), completed_grid(grid_uuid)
+                returning (grid square UUIDs, atlas) for a checkpointed grid
+                or None, load(grid_square_uuid) returning a stored subtree,
+                and skip_checkpoint(grid_uuid) for grids with failed subtrees
+            scope: Optional restriction of the levels, grid squares and
+                fields extracted, everything by default
+
+        Yields:
+            Tuples of (node_type, JSON-compatible payload)
+        """
+        self.logger.info(f"Extracting metadata for acquisition {acquisition_uuid}")
 
-                metadata['grids'].append(grid_data)
+        self.call_counts = Counter()
+        self.reuse_counts = Counter()
+        self.failures = []
+        self._incomplete = set()
+
+        try:
+            self._state = state
+            self._scope = scope or FULL_SCOPE
+            with self._level_executors():
+                # Get acquisition data
+                acquisition = self._call('get_acquisition', acquisition_uuid)
+                acquisition_info = self._serialize_model(acquisition)
+                self._immutable = self.cache is not None and self.cache.is_immutable(acquisition_info)
+                yield NODE_ACQUISITION, self._scope.project('acquisition', acquisition_info)
+
+                # Get all grids for this acquisition
+                grids = self._call('get_acquisition_grids', acquisition_uuid)
+                grid_fetches = self._imap_level(LEVEL_GRID_SQUARES, self._fetch_grid, grids)
+
+                # For each grid, stream its grid squares
+                for grid, grid_squares, atlas, checkpointed in grid_fetches:
+                    yield NODE_GRID, {'grid_info': self._scope.project('grid', self._serialize_model(grid)),
+                                      'atlas': atlas}
+                    if checkpointed is not None:
+                        for gs_uuid in checkpointed:
+                            yield NODE_GRID_SQUARE, self._state.load(gs_uuid)
+                    else:
+                        if self.bulk_fetch:
+                            self._prefetch_bulk(grid.uuid, grid_squares)
+                        for gs_data in self._imap_level(LEVEL_FOIL_HOLES, self._extract_grid_square, grid_squares):
+                            # Grid squares filtered out by the scope come back as None
+                            if gs_data is not None:
+                                yield NODE_GRID_SQUARE, gs_data
+                        if self._state and (grid.uuid in self._incomplete
+                                            or any(gs.uuid in self._incomplete for gs in grid_squares)):
+                            self._state.skip_checkpoint(grid.uuid)
+                        self._bulk_index = {}
+                    yield NODE_GRID_END, None
 
             self.logger.info(f"Successfully extracted metadata for acquisition {acquisition_uuid}")
-            return metadata
 
         except Exception as e:
             self.logger.error(f"Failed to extract metadata: {e}")
             raise
 
+        finally:
+            self._bulk_index = {}
+            self._state = None
+            self._scope = FULL_SCOPE
+            self._immutable = False
+
+    def _prefetch_bulk(self, grid_uuid: str, grid_squares: List[Any]):
+        """
+        Index the foil hole and micrograph listings of a grid
+
+        Only the listings of the grid being streamed are held, so memory is
+        bounded by the largest grid rather than the acquisition.
+
+        Args:
+            grid_uuid: UUID of the grid
+            grid_squares: Grid square models of the grid
+        """
+        self._bulk_index = {}
+        if not self._scope.fetches(LEVEL_FOIL_HOLES):
+            return
+        foil_holes = self._prefetch_children(LEVEL_FOIL_HOLES, grid_uuid, [gs.uuid for gs in grid_squares])
+
+        # Micrographs can only be joined once the foil holes of the grid are known
+        if foil_holes is not None and self._scope.fetches(LEVEL_MICROGRAPHS):
+            fh_uuids = [fh.uuid for siblings in foil_holes.values() for fh in siblings]
+            self._prefetch_children(LEVEL_MICROGRAPHS, grid_uuid, fh_uuids)
+
+    def _prefetch_children(self, level: str, grid_uuid: str,
+                           parent_uuids: List[str]) -> Optional[Dict[str, List[Any]]]:
+        """
+        Fetch the listing of a level for one grid and group it by parent UUID
+
+        Children whose parent is not in parent_uuids are dropped. If the
+        listing is not available or cannot be filtered by grid, the level is
+        marked unsupported and per-parent calls are used instead.
+
+        Args:
+            level: Hierarchy level to list
+            grid_uuid: UUID of the grid the listing is filtered by
+            parent_uuids: UUIDs of the parents in the grid
+
+        Returns:
+            Dictionary mapping parent UUID to its children, or None on fallback
+        """
+        listing, _, parent_field = BULK_LISTINGS[level]
+        if level in self._bulk_unsupported:
+            return None
+        if BULK_LISTING_SCOPE not in self._accepted_parameters(listing):
+            self.logger.info(f"Bulk listing of {level} cannot be filtered by grid, using per-entity calls")
+            self._bulk_unsupported.add(level)
+            return None
+
+        try:
+            children = self._call(listing, **{BULK_LISTING_SCOPE: grid_uuid})
+            index = {uuid: [] for uuid in parent_uuids}
+            for child in children:
+                if not hasattr(child, parent_field):
+                    raise ValueError(f"listed {level} have no {parent_field} attribute")
+                siblings = index.get(getattr(child, parent_field))
+                if siblings is not None:
+                    siblings.append(child)
+        except Exception as e:
+            self.logger.info(f"Bulk listing of {level} not available, falling back to per-entity calls: {e}")
+            self._bulk_unsupported.add(level)
+            return None
+
+        self._bulk_index[level] = index
+        return index
+
+    def _get_children(self, level: str, parent_uuid: str) -> List[Any]:
+        """
+        Get the children of a parent, from the bulk index when available
+
+        Args:
+            level: Hierarchy level of the children
+            parent_uuid: UUID of the parent entity
+
+        Returns:
+            List of child models
+        """
+        index = self._bulk_index.get(level)
+        if index is not None and parent_uuid in index:
+            return index[parent_uuid]
+        _, per_parent, _ = BULK_LISTINGS[level]
+        return self._call(per_parent, parent_uuid)
+
+    def _call(self, method: str, *args, **kwargs) -> Any:
+        """
+        Call a SmartEMAPIClient method, counting the round-trip
+
+        Responses are served from and stored in the response cache when one
+        is configured. Only calls that reach the server are counted.
+
+        Args:
+            method: Name of the SmartEMAPIClient method
+            *args: Positional arguments for the method
+            **kwargs: Keyword arguments for the method
+
+        Returns:
+            Whatever the SmartEMAPIClient method returns
+        """
+        func = getattr(self.client, method)
+        if kwargs:
+            func = partial(func, **kwargs)
+        cacheable = self.cache is not None and method not in UNCACHED_METHODS
+        if cacheable:
+            key = self.cache.make_key(method, args + tuple(f'{name}={value}' for name, value in sorted(kwargs.items())))
+            with timed('cache.get'):
+                hit, value = self.cache.get(key)
+            if hit:
+                return value
+
+        with self._counters_lock:
+            self.call_counts[method] += 1
+        self._received.bytes = 0
+        with timed(f'smartem.{method}') as sample:
+            value = self.retry.call(func, *args, description=method) if self.retry else func(*args)
+            sample['bytes'] = self._received.bytes
+
+        if cacheable:
+            with timed('cache.put'):
+                self.cache.put(key, value, self._immutable)
+        return value
+
+    def _count_received(self, nbytes: int):
+        """Add the body size of a response to the call in progress on this thread"""
+        self._received.bytes = getattr(self._received, 'bytes', 0) + nbytes
+
+    def _fetch_grid(self, grid) -> Tuple[Any, List[Any], Optional[Dict[str, Any]], Optional[List[str]]]:
+        """
+        Fetch the grid squares and atlas of a grid
+
+        Args:
+            grid: Grid model returned by the SmartEM API
+
+        Returns:
+            Tuple of (grid, grid square models, serialized atlas or None,
+            checkpointed grid square UUIDs or None). A grid completed by an
+            interrupted extraction has no models but the UUIDs to replay.
+        """
+        grid_squares = []
+        atlas_data = None
+
+        # Replay grids completed before an interruption
+        checkpoint = self._state.completed_grid(grid.uuid) if self._state else None
+        if checkpoint is not None:
+            self._count_reuse('grids')
+            grid_square_uuids, atlas_data = checkpoint
+            return grid, grid_squares, atlas_data, grid_square_uuids
+
+        # Get grid squares for this grid
+        try:
+            grid_squares = self._call('get_grid_squares_for_grid', grid.uuid)
+        except Exception as e:
+            self.logger.warning(f"Could not get grid squares for grid {grid.uuid}: {e}")
+            self._record_failure(LEVEL_GRID_SQUARES, grid.uuid, e)
+            self._incomplete.add(grid.uuid)
+
+        # Get atlas for this grid
+        if self._scope.atlas:
+            try:
+                atlas = self._call('get_grid_atlas', grid.uuid)
+                if atlas:
+                    atlas_data = self._scope.project('atlas', self._serialize_model(atlas))
+            except Exception as e:
+                self.logger.debug(f"No atlas for grid {grid.uuid}: {e}")
+
+        return grid, grid_squares, atlas_data, None
+
+    def _extract_grid_square(self, gs) -> Optional[Dict[str, Any]]:
+        """
+        Extract a grid square together with its foil holes and quality prediction
+
+        Args:
+            gs: Grid square model returned by the SmartEM API
+
+        Returns:
+            Dictionary with the grid square subtree, or None if the grid
+            square is filtered out by the extraction scope
+        """
+        scope = self._scope
+        gs_info = self._serialize_model(gs)
+        if not scope.keeps_status(gs_info):
+            return None
+        gs_info = scope.project('grid_square', gs_info)
+
+        # Reuse the stored subtree if the grid square has not changed; only
+        # its record is read to find out, the subtree once it is reused
+        stored_info = self._state.get_info(gs.uuid) if self._state else None
+        if stored_info is not None and stored_info == gs_info:
+            previous = self._state.load(gs.uuid)
+            if previous:
+                self._count_reuse(LEVEL_GRID_SQUARES)
+                return previous
+
+        gs_data = {
+            'grid_square_info': gs_info,
+            'foil_holes': [],
+            'quality_prediction': None
+        }
+
+        # Get quality prediction for this grid square, before its foil holes
+        # so that a grid square below the quality threshold costs one call
+        if scope.quality or scope.min_quality is not None:
+            quality_info = None
+            try:
+                quality = self._call('get_quality_prediction', gs.uuid)
+                if quality:
+                    quality_info = self._serialize_model(quality)
+            except Exception as e:
+                self.logger.debug(f"No quality prediction for grid square {gs.uuid}: {e}")
+            if not scope.keeps_quality(quality_info):
+                return None
+            if scope.quality:
+                gs_data['quality_prediction'] = scope.project('quality_prediction', quality_info)
+
+        # Get foil holes for this grid square
+        if scope.fetches(LEVEL_FOIL_HOLES):
+            try:
+                foil_holes = self._get_children(LEVEL_FOIL_HOLES, gs.uuid)
+                previous_foil_holes = self._state.get_foil_hole_infos(gs.uuid) if stored_info is not None else {}
+                gs_data['foil_holes'] = self._map_level(
+                    LEVEL_MICROGRAPHS,
+                    partial(self._extract_foil_hole, previous_foil_holes=previous_foil_holes),
+                    foil_holes
+                )
+                if any(fh.uuid in self._incomplete for fh in foil_holes):
+                    self._incomplete.add(gs.uuid)
+            except Exception as e:
+                self.logger.warning(f"Could not get foil holes for grid square {gs.uuid}: {e}")
+                self._record_failure(LEVEL_FOIL_HOLES, gs.uuid, e)
+                self._incomplete.add(gs.uuid)
+
+        # Incomplete subtrees are not saved, so they are refetched next time
+        if self._state and gs.uuid not in self._incomplete:
+            self._state.save(gs.uuid, gs_data)
+
+        return gs_data
+
+    def _extract_foil_hole(self, fh, previous_foil_holes: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Extract a foil hole together with its micrographs
+
+        Args:
+            fh: Foil hole model returned by the SmartEM API
+            previous_foil_holes: Stored foil hole records of the same grid
+                square, keyed by UUID
+
+        Returns:
+            Dictionary with the foil hole subtree
+        """
+        fh_info = self._scope.project('foil_hole', self._serialize_model(fh))
+
+        # Reuse the stored micrographs if the foil hole has not changed
+        if (previous_foil_holes or {}).get(fh.uuid) == fh_info:
+            previous = self._state.load_foil_hole(fh.uuid)
+            if previous:
+                self._count_reuse(LEVEL_FOIL_HOLES)
+                return previous
+
+        fh_data = {
+            'foil_hole_info': fh_info,
+            'micrographs': []
+        }
+
+        # Get micrographs for this foil hole
+        if self._scope.fetches(LEVEL_MICROGRAPHS):
+            try:
+                micrographs = self._get_children(LEVEL_MICROGRAPHS, fh.uuid)
+                fh_data['micrographs'] = [
+                    self._scope.project('micrograph', self._serialize_model(m)) for m in micrographs
+                ]
+            except Exception as e:
+                self.logger.warning(f"Could not get micrographs for foil hole {fh.uuid}: {e}")
+                self._record_failure(LEVEL_MICROGRAPHS, fh.uuid, e)
+                self._incomplete.add(fh.uuid)
+
+        return fh_data
+
+    def _record_failure(self, level: str, parent_uuid: str, error: Exception):
+        """Record a subtree that could not be fetched for the completeness report"""
+        with self._counters_lock:
+            self.failures.append({'level': level, 'parent_uuid': parent_uuid, 'error': str(error)})
+
+    def completeness_report(self) -> Dict[str, Any]:
+        """
+        Summary of subtrees that could not be fetched, even after retries
+
+        Returns:
+            Dictionary with a 'complete' flag and the list of failures, each
+            naming the level that failed and the UUID of its parent
+        """
+        return {'complete': not self.failures, 'failures': list(self.failures)}
+
+    def _count_reuse(self, level: str):
+        """Count a subtree reused from a previous extraction"""
+        with self._counters_lock:
+            self.reuse_counts[level] += 1
+
+    @contextmanager
+    def _level_executors(self):
+        """
+        Create one bounded thread pool per hierarchy level for an extraction
+
+        A separate pool per level means a parent task waiting on its
+        children can never starve the pool its children run in. Levels
+        limited to a single worker get no pool and run inline.
+        """
+        with ExitStack() as stack:
+            self._executors = {
+                level: stack.enter_context(
+                    ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'smartem-{level}')
+                )
+                for level, workers in self.max_workers.items()
+                if workers > 1
+            }
+            try:
+                yield
+            finally:
+                self._executors = {}
+
+    def _map_level(self, level: str, func: Callable, items) -> List[Any]:
+        """
+        Apply func to sibling entities, preserving order
+
+        Args:
+            level: Hierarchy level fetched by func for each item
+            func: Function extracting the subtree of one item
+            items: Sibling entities returned by the SmartEM API
+
+        Returns:
+            List of results in the same order as items
+        """
+        return list(self._imap_level(level, func, items))
+
+    def _imap_level(self, level: str, func: Callable, items) -> Iterator[Any]:
+        """
+        Lazily apply func to sibling entities, preserving order
+
+        At most max_workers[level] calls are in flight or waiting to be
+        consumed at any time, which keeps memory bounded when the results
+        are streamed.
+
+        Args:
+            level: Hierarchy level fetched by func for each item
+            func: Function extracting the subtree of one item
+            items: Sibling entities returned by the SmartEM API
+
+        Yields:
+            Results in the same order as items
+        """
+        executor = self._executors.get(level)
+        if executor is None:
+            for item in items:
+                yield func(item)
+            return
+
+        window = deque()
+        for item in items:
+            window.append(executor.submit(func, item))
+            if len(window) >= self.max_workers[level]:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+    @timed('serialize.model_dump')
     def _serialize_model(self, model) -> Dict[str, Any]:
         """
         Serialize a Pydantic model to JSON-compatible dictionary
@@ -153,38 +777,103 @@ class FandanGOSmartEMClient:
         Returns:
             JSON-compatible dictionary
         """
-        if hasattr(model, 'model_dump'):
-            return model.model_dump(mode='json')
-        elif hasattr(model, 'dict'):
-            return model.dict()
-        else:
-            return dict(model)
+        return to_builtins(model)
 
-    def get_available_acquisitions(self, limit: int = 10) -> List[Dict[str, Any]]:
+    def _accepted_parameters(self, method: str) -> Set[str]:
+        """Names of the parameters of a SmartEMAPIClient method, empty if it is missing or opaque"""
+        try:
+            return set(inspect.signature(getattr(self.client, method)).parameters)
+        except (AttributeError, TypeError, ValueError):
+            return set()
+
+    def _listing_parameters(self) -> Tuple[Dict[str, str], Optional[Tuple[str, str]]]:
         """
-        Get a list of recent acquisitions
+        Filter and paging keyword arguments accepted by the acquisition listing
+
+        Returns:
+            Listing parameter by query attribute, and the (size, position)
+            paging parameters or None if the listing cannot be paged
+        """
+        accepted = self._accepted_parameters('get_acquisitions')
+        filters = {}
+        for attribute, names in ACQUISITION_FILTER_PARAMETERS.items():
+            name = next((name for name in names if name in accepted), None)
+            if name:
+                filters[attribute] = name
+        paging = next((pair for pair in ACQUISITION_PAGE_PARAMETERS if set(pair) <= accepted), None)
+        return filters, paging
+
+    def iter_acquisitions(self, query: Optional[AcquisitionQuery] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over the acquisitions matching a query
+
+        Filters the listing accepts are sent to the server. When the listing
+        can be paged, pages of query.page_size acquisitions are requested
+        only as the iteration advances and yielded in the server's order,
+        which need not be by start time; otherwise the listing is fetched
+        once and sorted most recent first. Acquisitions are only serialized
+        when they are reached.
 
         Args:
-            limit: Maximum number of acquisitions to return
+            query: Filters, every acquisition by default
 
-        Returns:
-            List of acquisition summaries
+        Yields:
+            Acquisition summaries
         """
-        acquisitions = self.client.get_acquisitions()
+        query = query or AcquisitionQuery()
+        filters, paging = self._listing_parameters()
+        kwargs = {filters[name]: value for name, value in query.server_filters().items() if name in filters}
+
+        if paging is None:
+            acquisitions = sorted(self._call('get_acquisitions', **kwargs), key=_start_time, reverse=True)
+            for acquisition in acquisitions:
+                if query.matches(acquisition):
+                    yield self._serialize_model(acquisition)
+            return
+
+        size_name, position_name = paging
+        page = 0
+        while True:
+            # Offsets count acquisitions, page numbers start at 1
+            position = page * query.page_size if position_name in ('offset', 'skip') else page + 1
+            acquisitions = self._call('get_acquisitions', **kwargs,
+                                      **{size_name: query.page_size, position_name: position})
+            for acquisition in acquisitions:
+                if query.matches(acquisition):
+                    yield self._serialize_model(acquisition)
+            if len(acquisitions) < query.page_size:
+                return
+            page += 1
+
+    def get_available_acquisitions(self, limit: Optional[int] = 10, since: Optional[str] = None,
+                                   query: Optional[AcquisitionQuery] = None) -> List[Dict[str, Any]]:
+        """
+        Get a list of recent acquisitions
 
-        # Sort by start time (most recent first) and limit
-        sorted_acqs = sorted(
-            acquisitions,
-            key=lambda a: a.start_time if hasattr(a, 'start_time') and a.start_time else '',
-            reverse=True
-        )[:limit]
+        Args:
+            limit: Maximum number of acquisitions to return, None for no limit
+            since: Only return acquisitions started at or after this ISO date/time
+            query: Further filters; since overrides its start date
 
-        return [self._serialize_model(acq) for acq in sorted_acqs]
+        Returns:
+            List of acquisition summaries, most recent first
+        """
+        query = copy.copy(query) if query else AcquisitionQuery()
+        if since:
+            query.since = since
+        # Pages come in the server's order, so every page is read and only
+        # the limit most recent acquisitions are kept
+        acquisitions = self.iter_acquisitions(query)
+        if limit is None:
+            return sorted(acquisitions, key=_summary_start_time, reverse=True)
+        return heapq.nlargest(limit, acquisitions, key=_summary_start_time)
 
     def close(self):
-        """Close the client connection"""
+        """Close the client connection and response cache"""
         if self.client:
             self.client.close()
+        if self.cache:
+            self.cache.close()
 
     def __enter__(self):
         return self
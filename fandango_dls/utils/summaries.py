@@ -0,0 +1,413 @@
+"""
+Precomputed acquisition statistics for FandanGO plugin
+
+Summaries are computed while the metadata node stream passes through, from
+the micrographs of every grid square flattened into per-field arrays:
+counts, grid square status and quality prediction distributions, defocus,
+ice thickness, CTF resolution and motion percentiles, and the collection
+rate over time. They are stored per grid square, per grid and per
+acquisition, so displaying or depositing statistics never needs the full
+tree. A watched acquisition keeps the statistics of its grid squares between
+polls and only summarizes what changed. NumPy is used when installed, plain
+Python otherwise.
+"""
+
+import math
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fandango_dls.constants import (
+    NODE_ACQUISITION,
+    NODE_GRID,
+    NODE_GRID_SQUARE,
+    NODE_GRID_END,
+    SUMMARY_ACQUISITION,
+    SUMMARY_GRID,
+    SUMMARY_GRID_SQUARE
+)
+from fandango_dls.db.sqlite_db import get_grid_square_tree, replace_summaries, save_summaries
+from fandango_dls.utils.metrics import timed
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Numeric micrograph fields summarized as distributions
+MICROGRAPH_FIELDS = ('defocus', 'ice_thickness', 'ctf_max_resolution_estimate', 'total_motion')
+
+# Micrograph field holding its acquisition time, for the collection rate
+MICROGRAPH_TIME_FIELD = 'acquisition_datetime'
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def _number(value) -> float:
+    """Value as a float, NaN if it is missing or not numeric"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return math.nan
+
+
+def _timestamp(value) -> float:
+    """ISO date/time as POSIX seconds, NaN if it is missing or malformed"""
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _array(values: List[float]):
+    """Column of floats, as a NumPy array when available"""
+    return numpy.asarray(values, dtype=float) if numpy is not None else values
+
+
+def _concatenate(columns: List[Any]):
+    """Join columns into one"""
+    if numpy is not None:
+        return numpy.concatenate(columns) if columns else numpy.empty(0)
+    return [value for column in columns for value in column]
+
+
+def _valid(column) -> List[float]:
+    """Sorted non-NaN values of a column (a sorted array with NumPy)"""
+    if numpy is not None:
+        return numpy.sort(column[~numpy.isnan(column)])
+    return sorted(value for value in column if not math.isnan(value))
+
+
+def _percentile(values, q: float) -> float:
+    """Linearly interpolated percentile of sorted values, as numpy.percentile"""
+    position = (len(values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(values) - 1)
+    return float(values[lower] + (values[upper] - values[lower]) * (position - lower))
+
+
+def describe(column) -> Optional[Dict[str, Any]]:
+    """
+    Distribution of a column of numbers
+
+    Args:
+        column: Values, NaN for missing ones
+
+    Returns:
+        Dictionary with count, mean, min, percentiles and max of the
+        present values, or None if there are none
+    """
+    values = _valid(column)
+    if not len(values):
+        return None
+    if numpy is not None:
+        mean = float(values.mean())
+        percentiles = [float(p) for p in numpy.percentile(values, PERCENTILES)]
+    else:
+        mean = math.fsum(values) / len(values)
+        percentiles = [_percentile(values, q) for q in PERCENTILES]
+    stats = {'count': int(len(values)), 'mean': round(mean, 4), 'min': round(float(values[0]), 4)}
+    stats.update({f'p{q}': round(p, 4) for q, p in zip(PERCENTILES, percentiles)})
+    stats['max'] = round(float(values[-1]), 4)
+    return stats
+
+
+def collection_rate(times, per_hour: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Collection period and rate from micrograph acquisition times
+
+    Args:
+        times: POSIX timestamps, NaN for missing ones
+        per_hour: Also count micrographs per hour since the first one
+
+    Returns:
+        Dictionary with first and last acquisition time, hours and
+        micrographs per hour, or None without timestamps
+    """
+    values = _valid(times)
+    if not len(values):
+        return None
+    first, last = float(values[0]), float(values[-1])
+    hours = (last - first) / 3600
+    rate = {
+        'first': datetime.fromtimestamp(first).isoformat(),
+        'last': datetime.fromtimestamp(last).isoformat(),
+        'hours': round(hours, 3),
+        'micrographs_per_hour': round(len(values) / hours, 2) if hours > 0 else None
+    }
+    if per_hour:
+        if numpy is not None:
+            rate['per_hour'] = numpy.bincount(((values - first) // 3600).astype(int)).tolist()
+        else:
+            counts = Counter(int((value - first) // 3600) for value in values)
+            rate['per_hour'] = [counts.get(hour, 0) for hour in range(max(counts) + 1)]
+    return rate
+
+
+class _Columns:
+    """Flattened micrograph fields of a set of grid squares"""
+
+    def __init__(self):
+        self.parts = {field: [] for field in MICROGRAPH_FIELDS + (MICROGRAPH_TIME_FIELD,)}
+        self.quality = []
+        self.statuses = Counter()
+        self.num_grid_squares = 0
+        self.num_foil_holes = 0
+
+    def add(self, columns: Dict[str, Any]):
+        for field, column in columns.items():
+            self.parts[field].append(column)
+
+    def column(self, field: str):
+        return _concatenate(self.parts[field])
+
+    def describe(self, per_hour: bool) -> Dict[str, Any]:
+        micrographs = self.column(MICROGRAPH_TIME_FIELD)
+        return {
+            'num_grid_squares': self.num_grid_squares,
+            'num_foil_holes': self.num_foil_holes,
+            'num_micrographs': len(micrographs),
+            'grid_square_statuses': dict(self.statuses),
+            'quality': describe(_array(self.quality)),
+            'num_without_quality': sum(1 for value in self.quality if math.isnan(value)),
+            'micrographs': {field: describe(self.column(field)) for field in MICROGRAPH_FIELDS},
+            'collection': collection_rate(micrographs, per_hour)
+        }
+
+
+class GridSquareStatistics:
+    """
+    Flattened micrograph fields and counts of one grid square subtree
+
+    Args:
+        gs_data: Grid square subtree
+    """
+
+    def __init__(self, gs_data: Dict[str, Any]):
+        gs_info = gs_data.get('grid_square_info') or {}
+        foil_holes = gs_data.get('foil_holes') or []
+        micrographs = [m for fh in foil_holes for m in fh.get('micrographs') or []]
+        self.uuid = gs_info.get('uuid')
+        self.status = gs_info.get('status')
+        self.num_foil_holes = len(foil_holes)
+        self.num_micrographs = len(micrographs)
+        self.columns = {field: _array([_number(m.get(field)) for m in micrographs]) for field in MICROGRAPH_FIELDS}
+        self.columns[MICROGRAPH_TIME_FIELD] = _array([_timestamp(m.get(MICROGRAPH_TIME_FIELD)) for m in micrographs])
+        self.quality = _number((gs_data.get('quality_prediction') or {}).get('value'))
+
+    def summary(self, grid_uuid: Optional[str] = None) -> Dict[str, Any]:
+        """Summary of the grid square, in the grid of the given UUID"""
+        return {
+            'uuid': self.uuid,
+            'grid_uuid': grid_uuid,
+            'status': self.status,
+            'num_foil_holes': self.num_foil_holes,
+            'num_micrographs': self.num_micrographs,
+            'quality': None if math.isnan(self.quality) else self.quality,
+            'micrographs': {field: describe(self.columns[field]) for field in MICROGRAPH_FIELDS},
+            'collection': collection_rate(self.columns[MICROGRAPH_TIME_FIELD])
+        }
+
+
+class SummaryBuilder:
+    """
+    Incremental statistics of an acquisition
+
+    Grid squares are added as they are extracted; grid and acquisition
+    summaries are computed from their accumulated columns.
+    """
+
+    def __init__(self):
+        self.acquisition = _Columns()
+        self.grid = _Columns()
+        self.grids = []
+
+    def add_statistics(self, statistics: GridSquareStatistics):
+        """Accumulate the statistics of a grid square into its grid and the acquisition"""
+        for totals in (self.grid, self.acquisition):
+            totals.add(statistics.columns)
+            totals.quality.append(statistics.quality)
+            totals.statuses[statistics.status] += 1
+            totals.num_grid_squares += 1
+            totals.num_foil_holes += statistics.num_foil_holes
+
+    def add_grid_square(self, gs_data: Dict[str, Any], grid_uuid: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Summarize a grid square subtree and accumulate it into its grid
+
+        Args:
+            gs_data: Grid square subtree
+            grid_uuid: UUID of the grid the square belongs to
+
+        Returns:
+            Summary of the grid square
+        """
+        statistics = GridSquareStatistics(gs_data)
+        self.add_statistics(statistics)
+        return statistics.summary(grid_uuid)
+
+    def end_grid(self, grid_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Summarize the grid whose squares were added since the previous grid
+
+        Args:
+            grid_info: Serialized grid
+
+        Returns:
+            Summary of the grid
+        """
+        summary = {'uuid': grid_info.get('uuid'), 'name': grid_info.get('name')}
+        summary.update(self.grid.describe(per_hour=True))
+        return self.keep_grid(summary)
+
+    def keep_grid(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        End the grid whose squares were added since the previous grid with a
+        summary computed before, when none of them changed
+
+        Args:
+            summary: Summary of the grid
+
+        Returns:
+            The same summary
+        """
+        self.grids.append(summary)
+        self.grid = _Columns()
+        return summary
+
+    def finish(self, acquisition_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Summarize the whole acquisition
+
+        Args:
+            acquisition_info: Serialized acquisition
+
+        Returns:
+            Summary of the acquisition, including the summaries of its grids
+        """
+        summary = {'uuid': acquisition_info.get('uuid'), 'name': acquisition_info.get('name'),
+                   'num_grids': len(self.grids)}
+        summary.update(self.acquisition.describe(per_hour=True))
+        summary['grids'] = self.grids
+        return summary
+
+
+def summarize_metadata_nodes(acquisition_uuid: str,
+                             nodes: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+    """
+    Pass a metadata node stream through, computing and storing its statistics
+
+    Grid square and grid summaries are computed as their grid ends, and all
+    of them replace the summaries of the previous extraction in one
+    transaction once the stream is exhausted, so an interrupted or failed
+    extraction leaves the previous summaries in place.
+
+    Args:
+        acquisition_uuid: UUID of the acquisition being extracted
+        nodes: Iterable of (node_type, payload) tuples
+
+    Yields:
+        The same nodes, unchanged
+    """
+    builder = SummaryBuilder()
+    acquisition_info = {'uuid': acquisition_uuid}
+    grid_info = {}
+    square_summaries = []
+    summaries = []
+    for node_type, node in nodes:
+        if node_type == NODE_ACQUISITION:
+            acquisition_info = node or acquisition_info
+        elif node_type == NODE_GRID:
+            grid_info = node['grid_info'] or {}
+            square_summaries = []
+        elif node_type == NODE_GRID_SQUARE:
+            with timed('summary.grid_square'):
+                square_summaries.append(builder.add_grid_square(node, grid_info.get('uuid')))
+        elif node_type == NODE_GRID_END:
+            with timed('summary.grid'):
+                grid_summary = builder.end_grid(grid_info)
+            summaries.extend([(SUMMARY_GRID_SQUARE, summary) for summary in square_summaries]
+                             + [(SUMMARY_GRID, grid_summary)])
+        yield node_type, node
+
+    with timed('summary.acquisition'):
+        summary = builder.finish(acquisition_info)
+    replace_summaries(acquisition_uuid, summaries + [(SUMMARY_ACQUISITION, summary)])
+
+
+class LiveSummaries:
+    """
+    Statistics of an acquisition polled again and again, updated from the
+    grid squares that changed since the previous poll
+
+    The statistics of every grid square are kept between polls, so a grid
+    square reused from the store is neither loaded nor summarized again and
+    a grid none of whose squares changed keeps its summary. Only the
+    summaries of changed grid squares and grids, and the acquisition
+    summary, are saved after a poll.
+
+    Args:
+        acquisition_uuid: UUID of the polled acquisition
+    """
+
+    def __init__(self, acquisition_uuid: str):
+        self.acquisition_uuid = acquisition_uuid
+        self.squares = {}
+        self.grids = {}
+        self.acquisition_info = None
+
+    def summarize(self, nodes: Iterable[Tuple[str, Any]], reused: Set[str]) -> Iterator[Tuple[str, Any]]:
+        """
+        Pass the node stream of a poll through, updating its statistics
+
+        Args:
+            nodes: Iterable of (node_type, payload) tuples
+            reused: UUIDs of the grid squares reused from the store, whose
+                payload may be their record only
+
+        Yields:
+            The same nodes, unchanged
+        """
+        builder = SummaryBuilder()
+        acquisition_info = {'uuid': self.acquisition_uuid}
+        grid_info = {}
+        squares = {}
+        grids = {}
+        summaries = []
+        for node_type, node in nodes:
+            if node_type == NODE_ACQUISITION:
+                acquisition_info = node or acquisition_info
+            elif node_type == NODE_GRID:
+                grid_info = node['grid_info'] or {}
+                grid_squares = []
+                grid_changed = False
+            elif node_type == NODE_GRID_SQUARE:
+                gs_uuid = node['grid_square_info']['uuid']
+                statistics = self.squares.get(gs_uuid) if gs_uuid in reused else None
+                if statistics is None:
+                    # Squares reused before their statistics are known, on the
+                    # first poll, are read from the store once
+                    with timed('summary.grid_square'):
+                        statistics = GridSquareStatistics(get_grid_square_tree(gs_uuid) if gs_uuid in reused else node)
+                    summaries.append((SUMMARY_GRID_SQUARE, statistics.summary(grid_info.get('uuid'))))
+                    grid_changed = True
+                builder.add_statistics(statistics)
+                squares[gs_uuid] = statistics
+                grid_squares.append(gs_uuid)
+            elif node_type == NODE_GRID_END:
+                outline = (grid_info, grid_squares)
+                previous = self.grids.get(grid_info.get('uuid'))
+                if grid_changed or previous is None or previous[0] != outline:
+                    with timed('summary.grid'):
+                        grid_summary = builder.end_grid(grid_info)
+                    summaries.append((SUMMARY_GRID, grid_summary))
+                else:
+                    grid_summary = builder.keep_grid(previous[1])
+                grids[grid_info.get('uuid')] = (outline, grid_summary)
+            yield node_type, node
+
+        if summaries or acquisition_info != self.acquisition_info or grids.keys() != self.grids.keys():
+            with timed('summary.acquisition'):
+                summaries.append((SUMMARY_ACQUISITION, builder.finish(acquisition_info)))
+            save_summaries(self.acquisition_uuid, summaries)
+        # Grid squares and grids gone from the acquisition are forgotten
+        self.squares, self.grids, self.acquisition_info = squares, grids, acquisition_info
@@ -0,0 +1,180 @@
+"""
+HTTP transport tuning for the SmartEM client
+
+SmartEMAPIClient creates its own HTTP session with library defaults, which
+keep too few connections alive for concurrent extraction, so requests beyond
+the pool pay a fresh TCP (and TLS) handshake. configure_transport finds that
+session and gives it a keep-alive pool sized to the extraction's concurrency
+and, for httpx sessions with the h2 package installed, HTTP/2. Pools are
+built with the libraries' public transport classes; the rest of the session
+(headers, authentication, hooks, proxies) is kept. Both libraries already
+ask for gzip-compressed responses, so compression needs no setting.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Attributes under which SmartEMAPIClient may keep its HTTP session
+SESSION_ATTRIBUTES = ('_client', 'client', '_session', 'session', '_http_client', 'http_client')
+
+
+class TransportSettings:
+    """
+    Connection settings applied to the SmartEM HTTP session.
+
+    Args:
+        pool_size: Connections kept alive, 0 to size the pool to the number
+            of concurrent requests of the extraction
+        keepalive: Seconds an idle connection is kept (httpx only)
+        http2: Negotiate HTTP/2 (httpx with the h2 package only)
+    """
+
+    def __init__(self, pool_size: int = 0, keepalive: float = 30, http2: bool = False):
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.http2 = http2
+
+
+def _find_session(api_client):
+    """Return (attribute name, session) of the HTTP session of a client, or (None, None)"""
+    for name in SESSION_ATTRIBUTES:
+        session = getattr(api_client, name, None)
+        module = type(session).__module__
+        if module.startswith('httpx') or module.startswith('requests'):
+            return name, session
+    return None, None
+
+
+def _tune_httpx(session, settings: TransportSettings, pool_size: int):
+    """
+    Give an httpx.Client a default transport with a pool of the given size
+
+    httpx only takes transports when a client is built, so the client's
+    default transport is replaced by an httpx.HTTPTransport built with the
+    same TLS context and the new limits, before any connection is opened.
+    The client internals this relies on are checked first; without them,
+    or with a custom transport, the client is left alone. Requests routed
+    through proxy mounts keep their own pools.
+
+    Returns:
+        Tuple of (whether the pool was replaced, whether HTTP/2 is enabled)
+    """
+    import httpx
+
+    http2 = settings.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning('HTTP/2 requested but the h2 package is not installed, using HTTP/1.1')
+            http2 = False
+
+    transport = getattr(session, '_transport', None)
+    if transport is not None and type(transport) is not httpx.HTTPTransport:
+        logger.info('SmartEM httpx client uses a custom transport, keeping its connection pool')
+        return False, False
+    ssl_context = getattr(getattr(transport, '_pool', None), '_ssl_context', None)
+    if ssl_context is None:
+        logger.warning(f'httpx {httpx.__version__} client exposes no default transport and TLS context, '
+                       'keeping its connection pool')
+        return False, False
+
+    limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                          keepalive_expiry=settings.keepalive)
+    session._transport = httpx.HTTPTransport(verify=ssl_context, limits=limits, http2=http2)
+    transport.close()
+    return True, http2
+
+
+def _tune_requests(session, settings: TransportSettings, pool_size: int):
+    """
+    Mount connection pools of the given size on a requests.Session
+
+    The default adapters are replaced, keeping their retry configuration;
+    custom adapters are left alone.
+    """
+    from requests.adapters import HTTPAdapter
+
+    for prefix in ('http://', 'https://'):
+        adapter = session.adapters.get(prefix)
+        if adapter is not None and type(adapter) is not HTTPAdapter:
+            logger.info(f'SmartEM requests session has a custom adapter for {prefix}, keeping its connection pool')
+            continue
+        session.mount(prefix, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                          max_retries=adapter.max_retries if adapter is not None else 0))
+    if settings.http2:
+        logger.warning('HTTP/2 is not supported by requests sessions, using HTTP/1.1')
+
+
+def _body_bytes(response) -> int:
+    """Size of a response body, from Content-Length or else the loaded body"""
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit():
+        return int(length)
+    if hasattr(response, 'read'):
+        # httpx response hooks run before the body is read
+        response.read()
+    return len(response.content)
+
+
+def track_response_bytes(api_client, count: Callable[[int], None]) -> bool:
+    """
+    Report the body size of every response received by a client's HTTP session
+
+    Hooks run in the thread that made the request, so a caller can
+    attribute the bytes to the call in progress on that thread.
+
+    Args:
+        api_client: SmartEMAPIClient instance
+        count: Called with the body size in bytes of each response
+
+    Returns:
+        Whether the client exposes a known HTTP session to hook into
+    """
+    _, session = _find_session(api_client)
+    if session is None:
+        return False
+    if type(session).__module__.startswith('httpx'):
+        hooks = session.event_hooks
+        hooks['response'] = hooks['response'] + [lambda response: count(_body_bytes(response))]
+        session.event_hooks = hooks
+    else:
+        session.hooks['response'].append(lambda response, *args, **kwargs: count(_body_bytes(response)))
+    return True
+
+
+def configure_transport(api_client, settings: Optional[TransportSettings], concurrency: int) -> Dict[str, Any]:
+    """
+    Give the HTTP session of a SmartEMAPIClient a tuned connection pool
+
+    Args:
+        api_client: SmartEMAPIClient instance
+        settings: Transport settings, None to leave the session untouched
+        concurrency: Maximum number of requests the extraction has in flight
+
+    Returns:
+        Dictionary describing the applied transport, empty if nothing was changed
+    """
+    if settings is None:
+        return {}
+    _, session = _find_session(api_client)
+    if session is None:
+        logger.info('SmartEM client exposes no known HTTP session, keeping its default transport')
+        return {}
+
+    pool_size = settings.pool_size or concurrency
+    http2 = False
+    if type(session).__module__.startswith('httpx'):
+        tuned, http2 = _tune_httpx(session, settings, pool_size)
+        if not tuned:
+            pool_size = None
+        library = 'httpx'
+    else:
+        _tune_requests(session, settings, pool_size)
+        library = 'requests'
+
+    transport = {'library': library, 'pool_size': pool_size, 'http2': http2}
+    logger.info(f'SmartEM transport: {transport}')
+    return transport
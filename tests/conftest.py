@@ -0,0 +1,73 @@
+"""
+Shared fixtures for the FandanGO DLS plugin tests
+
+The plugin reads config.yaml from the repository root at import time; a
+checkout without one is given config.yaml.template for the session. The
+SmartEM and ARIA services are the in-process stand-ins of
+benchmarks/fake_services.py, serving a small synthetic acquisition.
+"""
+
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = os.path.join(ROOT, 'config.yaml')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+_created_config = not os.path.exists(CONFIG)
+if _created_config:
+    shutil.copyfile(os.path.join(ROOT, 'config.yaml.template'), CONFIG)
+
+
+def pytest_unconfigure(config):
+    if _created_config and os.path.exists(CONFIG):
+        os.remove(CONFIG)
+
+
+@pytest.fixture
+def ddbb(tmp_path, monkeypatch):
+    """Plugin database in a temporary directory, with fresh connections"""
+    from fandango_dls.db import sqlite
+    sqlite.close_connection_to_ddbb()
+    monkeypatch.setattr(sqlite, 'ddbb_path', str(tmp_path))
+    yield sqlite
+    sqlite.close_connection_to_ddbb()
+
+
+@pytest.fixture
+def dataset():
+    """Synthetic acquisition served by the SmartEM stand-in: 2 grids x 3 grid squares x 2 foil holes x 2 micrographs"""
+    from synthetic import SyntheticAcquisitions
+    return SyntheticAcquisitions(acquisitions=1, grids=2, grid_squares=3, foil_holes=2, micrographs=2)
+
+
+@pytest.fixture
+def smartem(dataset, ddbb, monkeypatch):
+    """SmartEM stand-in with the plugin pointed at it, without response cache"""
+    from fake_services import AriaStandIn, SmartEMStandIn, install_standins
+    from fandango_dls.actions import generate_metadata, send_metadata
+    from fandango_dls.utils import aria_upload, smartem_client
+
+    # Register the attributes install_standins replaces, so they are restored
+    for module, name in ((smartem_client, 'SmartEMAPIClient'), (generate_metadata, 'smartem_api_url'),
+                         (send_metadata, 'AriaClient'), (aria_upload, 'AriaClient'),
+                         (aria_upload, 'Bucket'), (aria_upload, 'Field')):
+        monkeypatch.setattr(module, name, getattr(module, name, None), raising=False)
+    monkeypatch.setattr(generate_metadata, 'smartem_cache_enabled', False)
+
+    smartem_standin = SmartEMStandIn(dataset)
+    aria_standin = AriaStandIn()
+    install_standins(smartem_standin.url, aria_standin.url)
+    smartem_standin.aria = aria_standin
+    yield smartem_standin
+    smartem_standin.close()
+    aria_standin.close()
+
+
+@pytest.fixture
+def aria(smartem):
+    """ARIA stand-in the plugin deposits to"""
+    return smartem.aria
@@ -0,0 +1,22 @@
+from fandango_dls.actions import batch, send_metadata
+from fandango_dls.db.sqlite_db import get_processed_acquisitions
+
+
+def test_acquisition_is_processed_only_once_sent(smartem, aria, monkeypatch):
+    send_metadata_to_aria = send_metadata.send_metadata_to_aria
+    monkeypatch.setattr(send_metadata, 'send_metadata_to_aria', lambda *args, **kwargs: (False, 'ARIA is down'))
+    success, info = batch.run_batch('batch', since='2024-01-01', visit_id='1', parallel=1, new_only=True)
+
+    assert not success
+    assert info['items'][0]['extract']['success'] and not info['items'][0]['send']['success']
+    assert get_processed_acquisitions() == {}
+
+    monkeypatch.setattr(send_metadata, 'send_metadata_to_aria', send_metadata_to_aria)
+    success, info = batch.run_batch('batch', since='2024-01-01', visit_id='1', parallel=1, new_only=True)
+
+    assert success and info['succeeded'] == 1
+    assert get_processed_acquisitions() == {'acq-0': 'completed'}
+
+    success, info = batch.run_batch('batch', since='2024-01-01', visit_id='1', parallel=1, new_only=True)
+
+    assert success and info['items'] == []
@@ -0,0 +1,64 @@
+import hashlib
+import os
+
+import pytest
+
+from fandango_dls.constants import BLOBS_DIRNAME
+from fandango_dls.db import blob_store, sqlite
+from fandango_dls.db.blob_store import BlobWriter, blob_path, read_blob
+from fandango_dls.db.sqlite import connect_to_ddbb
+
+DOCUMENT = '{"acquisition":{"name":"Séance"},"grids":[' + ','.join(['{"grid_info":{"uuid":"g"}}'] * 200) + ']}'
+
+
+@pytest.fixture(params=[blob_store.CODEC_ZSTD, blob_store.CODEC_GZIP, blob_store.CODEC_NONE])
+def codec(request):
+    if request.param == blob_store.CODEC_ZSTD:
+        pytest.importorskip('zstandard')
+    return request.param
+
+
+def store(document, codec, pieces=3):
+    writer = BlobWriter(codec)
+    step = len(document) // pieces + 1
+    for start in range(0, len(document), step):
+        writer.write(document[start:start + step])
+    return writer.commit()
+
+
+def blob_files():
+    return sorted(os.path.relpath(os.path.join(root, name), sqlite.ddbb_path)
+                  for root, _, names in os.walk(os.path.join(sqlite.ddbb_path, BLOBS_DIRNAME)) for name in names)
+
+
+def test_blob_round_trips_with_every_codec(ddbb, codec):
+    digest = store(DOCUMENT, codec)
+
+    assert digest == hashlib.sha256(DOCUMENT.encode('utf-8')).hexdigest()
+    assert read_blob(digest) == DOCUMENT
+    assert os.path.exists(blob_path(digest, codec))
+    if codec != blob_store.CODEC_NONE:
+        assert os.path.getsize(blob_path(digest, codec)) < len(DOCUMENT)
+
+
+def test_identical_documents_are_stored_once(ddbb, codec):
+    digest = store(DOCUMENT, codec)
+    files = blob_files()
+
+    assert store(DOCUMENT, codec, pieces=7) == digest
+    assert blob_files() == files == [os.path.relpath(blob_path(digest, codec), sqlite.ddbb_path)]
+    cursor = connect_to_ddbb().cursor()
+    cursor.execute('SELECT codec, size FROM metadata_blobs')
+    assert cursor.fetchall() == [(codec, len(DOCUMENT.encode('utf-8')))]
+
+
+def test_discarded_blob_leaves_nothing_behind(ddbb):
+    writer = BlobWriter(blob_store.CODEC_GZIP)
+    writer.write(DOCUMENT)
+    writer.discard()
+
+    assert blob_files() == []
+
+
+def test_unknown_blob_reads_as_none(ddbb):
+    assert read_blob('0' * 64) is None
@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+
+from fandango_dls.actions import export
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.utils.columnar_export import (
+    FORMAT_ARROW,
+    FORMAT_PARQUET,
+    _write_batches,
+    export_acquisition,
+    open_dataset,
+    open_table,
+    table_path
+)
+
+
+@pytest.mark.parametrize('fmt', [FORMAT_PARQUET, FORMAT_ARROW])
+def test_export_in_batches(smartem, dataset, tmp_path, fmt):
+    assert generate_metadata_from_smartem('project', 'acq-0')[0]
+
+    exported = export_acquisition('acq-0', str(tmp_path / 'export'), fmt, batch_size=5)
+
+    totals = dataset.total_entities()
+    for table_name, level in (('grids', 'grids'), ('grid_squares', 'grid_squares'),
+                              ('foil_holes', 'foil_holes'), ('micrographs', 'micrographs')):
+        assert exported[table_name]['rows'] == totals[level]
+        assert open_table(exported[table_name]['path']).num_rows == totals[level]
+    micrographs = open_table(exported['micrographs']['path'])
+    foil_holes = set(open_table(exported['foil_holes']['path']).column('uuid').to_pylist())
+    assert set(micrographs.column('foil_hole_uuid').to_pylist()) == foil_holes
+    assert not [name for name in os.listdir(tmp_path / 'export' / 'micrographs') if name.endswith('.tmp')]
+
+
+@pytest.fixture
+def sparse_dataset(dataset, monkeypatch):
+    """Synthetic acquisition whose first entities lack fields later ones have"""
+    quality_prediction, micrographs = dataset.quality_prediction, dataset.micrographs
+
+    def sparse_quality_prediction(grid_square_uuid):
+        return None if grid_square_uuid.endswith('-s0') else quality_prediction(grid_square_uuid)
+
+    def sparse_micrographs(foil_hole_uuid):
+        found = micrographs(foil_hole_uuid)
+        del found[0]['ice_thickness']
+        return found
+
+    monkeypatch.setattr(dataset, 'quality_prediction', sparse_quality_prediction)
+    monkeypatch.setattr(dataset, 'micrographs', sparse_micrographs)
+    return dataset
+
+
+@pytest.mark.parametrize('fmt', [FORMAT_PARQUET, FORMAT_ARROW])
+def test_export_keeps_fields_missing_from_first_rows(sparse_dataset, smartem, tmp_path, fmt):
+    assert generate_metadata_from_smartem('project', 'acq-0')[0]
+
+    # A single batch, whose first rows lack the fields
+    exported = export_acquisition('acq-0', str(tmp_path / 'export'), fmt)
+
+    grid_squares = open_table(exported['grid_squares']['path']).to_pylist()
+    values = {row['uuid']: row['quality_prediction_value'] for row in grid_squares}
+    assert values['acq-0-g0-s0'] is None
+    assert values['acq-0-g0-s1'] == sparse_dataset.quality_prediction('acq-0-g0-s1')['value']
+    micrographs = open_table(exported['micrographs']['path']).to_pylist()
+    assert micrographs[0]['ice_thickness'] is None
+    assert all(row['ice_thickness'] is not None for row in micrographs if not row['uuid'].endswith('-m0'))
+
+
+@pytest.mark.parametrize('fmt', [FORMAT_PARQUET, FORMAT_ARROW])
+def test_dataset_unifies_file_schemas(tmp_path, fmt):
+    tables = {
+        'acq-0': pyarrow.Table.from_pylist([{'uuid': 'm0', 'defocus': -2}]),
+        'acq-1': pyarrow.Table.from_pylist([{'uuid': 'm1', 'defocus': -1.5, 'ice_thickness': 30.0}])
+    }
+    for acquisition_uuid, table in tables.items():
+        path = table_path(str(tmp_path), 'micrographs', acquisition_uuid, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write_batches(iter([table]), table.schema, path, fmt, None)
+
+    table = open_dataset(str(tmp_path), 'micrographs', fmt).to_table().sort_by('uuid')
+
+    assert table.to_pylist() == [
+        {'uuid': 'm0', 'defocus': -2.0, 'ice_thickness': None},
+        {'uuid': 'm1', 'defocus': -1.5, 'ice_thickness': 30.0}
+    ]
+
+
+def test_export_reports_any_error(ddbb, monkeypatch):
+    def export_acquisition(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(export, 'get_project_acquisition', lambda project_name: 'acq-0')
+    monkeypatch.setattr(export, 'export_acquisition', export_acquisition)
+    success, info = export.export_project('project', 'unused')
+
+    assert not success
+    assert 'disk full' in info
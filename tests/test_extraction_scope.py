@@ -0,0 +1,78 @@
+import pytest
+
+from fandango_dls.utils.smartem_client import (
+    LEVEL_FOIL_HOLES,
+    LEVEL_GRID_SQUARES,
+    ExtractionScope,
+    FandanGOSmartEMClient
+)
+
+
+def extract(smartem, scope=None):
+    client = FandanGOSmartEMClient(base_url=smartem.url)
+    return client, client.extract_acquisition_metadata('acq-0', scope=scope)
+
+
+def grid_square_uuids(metadata):
+    return [gs_data['grid_square_info']['uuid'] for grid_data in metadata['grids']
+            for gs_data in grid_data['grid_squares']]
+
+
+@pytest.mark.parametrize('statuses, min_quality', [(['collected'], None), (None, 0.5), (['collected'], 0.2)])
+def test_filters_drop_grid_squares_before_fetching_their_children(smartem, statuses, min_quality):
+    _, full = extract(smartem)
+    client, scoped = extract(smartem, ExtractionScope(statuses=statuses, min_quality=min_quality))
+
+    kept = {gs_data['grid_square_info']['uuid']: gs_data for grid_data in full['grids']
+            for gs_data in grid_data['grid_squares']
+            if (statuses is None or gs_data['grid_square_info']['status'] in statuses)
+            and (min_quality is None or gs_data['quality_prediction']['value'] >= min_quality)}
+    assert 0 < len(kept) < len(grid_square_uuids(full))
+    assert grid_square_uuids(scoped) == list(kept)
+    assert [gs_data for grid_data in scoped['grids'] for gs_data in grid_data['grid_squares']] == list(kept.values())
+    # Grids and their atlases are kept whatever their grid squares
+    assert [{**grid_data, 'grid_squares': []} for grid_data in scoped['grids']] == \
+           [{**grid_data, 'grid_squares': []} for grid_data in full['grids']]
+    assert client.call_counts['get_foil_holes_for_gridsquare'] == len(kept)
+    if min_quality is None:
+        assert client.call_counts['get_quality_prediction'] == len(kept)
+
+
+def test_depth_and_projection_limit_requests_and_fields(smartem):
+    _, full = extract(smartem)
+    scope = ExtractionScope(depth=LEVEL_FOIL_HOLES, atlas=False, quality=False,
+                            fields={'grid_square': ['status'], 'foil_hole': ['diameter']})
+    client, scoped = extract(smartem, scope)
+
+    assert scoped['acquisition'] == full['acquisition']
+    assert grid_square_uuids(scoped) == grid_square_uuids(full)
+    for grid_data, full_grid_data in zip(scoped['grids'], full['grids']):
+        assert grid_data['grid_info'] == full_grid_data['grid_info']
+        assert grid_data['atlas'] is None
+        for gs_data, full_gs_data in zip(grid_data['grid_squares'], full_grid_data['grid_squares']):
+            full_info = full_gs_data['grid_square_info']
+            assert gs_data['grid_square_info'] == {'uuid': full_info['uuid'], 'status': full_info['status']}
+            assert gs_data['quality_prediction'] is None
+            assert gs_data['foil_holes'] == [
+                {'foil_hole_info': {'uuid': fh_data['foil_hole_info']['uuid'],
+                                    'diameter': fh_data['foil_hole_info']['diameter']},
+                 'micrographs': []}
+                for fh_data in full_gs_data['foil_holes']]
+    for method in ('get_grid_atlas', 'get_quality_prediction', 'get_foil_hole_micrographs', 'get_micrographs'):
+        assert client.call_counts[method] == 0
+
+
+def test_grid_square_depth_fetches_no_foil_holes(smartem):
+    client, scoped = extract(smartem, ExtractionScope(depth=LEVEL_GRID_SQUARES))
+
+    assert len(grid_square_uuids(scoped)) == 6
+    assert all(gs_data['foil_holes'] == [] for grid_data in scoped['grids'] for gs_data in grid_data['grid_squares'])
+    assert client.call_counts['get_foil_holes_for_gridsquare'] == 0
+    assert client.call_counts['get_foil_holes'] == 0
+
+
+def test_scope_rejects_unknown_depth_and_kinds():
+    with pytest.raises(ValueError):
+        ExtractionScope(depth='atlases')
+    with pytest.raises(ValueError):
+        ExtractionScope(fields={'detector': ['name']})
@@ -0,0 +1,11 @@
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+
+def test_extraction_with_a_client_without_retry_policy(smartem):
+    client = FandanGOSmartEMClient(base_url=smartem.url, retry=None)
+
+    success, info = generate_metadata_from_smartem('project', 'acq-0', client=client)
+
+    assert success
+    assert info['retries'] == 0
@@ -0,0 +1,47 @@
+import pytest
+
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.db import sqlite_db
+from fandango_dls.db.sqlite_db import get_project_metadata
+from fandango_dls.utils.smartem_client import LEVEL_FOIL_HOLES, LEVEL_GRID_SQUARES
+
+
+@pytest.fixture
+def changing_dataset(dataset, monkeypatch):
+    """Synthetic acquisition whose grid squares and foil holes can be edited between extractions"""
+    grid_squares, foil_holes = dataset.grid_squares, dataset.foil_holes
+    dataset.edits = {}
+
+    def edited(entities):
+        for entity in entities:
+            entity.update(dataset.edits.get(entity['uuid'], {}))
+        return entities
+
+    monkeypatch.setattr(dataset, 'grid_squares', lambda grid_uuid: edited(grid_squares(grid_uuid)))
+    monkeypatch.setattr(dataset, 'foil_holes', lambda grid_square_uuid: edited(foil_holes(grid_square_uuid)))
+    return dataset
+
+
+def test_incremental_extraction_reuses_unchanged_subtrees(changing_dataset, smartem, monkeypatch):
+    assert generate_metadata_from_smartem('incremental', 'acq-0', incremental=True)[0]
+
+    # One grid square and one of its foil holes change, and every grid gets a new grid square
+    changing_dataset.edits = {'acq-0-g0-s1': {'defocus': -1.0}, 'acq-0-g0-s1-f0': {'diameter': 1.5}}
+    changing_dataset.shape['grid_squares'] += 1
+    loaded = []
+    get_grid_square_tree = sqlite_db.get_grid_square_tree
+    monkeypatch.setattr(sqlite_db, 'get_grid_square_tree', lambda uuid: loaded.append(uuid) or get_grid_square_tree(uuid))
+
+    success, incremental = generate_metadata_from_smartem('incremental', 'acq-0', incremental=True)
+    assert success
+    monkeypatch.setattr(sqlite_db, 'get_grid_square_tree', get_grid_square_tree)
+
+    unchanged = ['acq-0-g0-s0', 'acq-0-g0-s2', 'acq-0-g1-s0', 'acq-0-g1-s1', 'acq-0-g1-s2']
+    assert incremental['reused'] == {LEVEL_GRID_SQUARES: len(unchanged), LEVEL_FOIL_HOLES: 1}
+    # Only the subtrees of unchanged grid squares are loaded
+    assert sorted(loaded) == unchanged
+
+    success, full = generate_metadata_from_smartem('full', 'acq-0')
+    assert success
+    assert incremental['smartem_requests'] < full['smartem_requests']
+    assert get_project_metadata('incremental') == get_project_metadata('full')
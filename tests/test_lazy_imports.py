@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported only once the action needing them runs
+DEFERRED_MODULES = (
+    'fandango_dls.utils.smartem_client',
+    'fandango_dls.db.sqlite_db',
+    'smartem_backend',
+    'aria',
+    'httpx',
+    'requests',
+    'numpy',
+    'pyarrow',
+    'tabulate'
+)
+
+
+def test_importing_the_plugin_defers_clients_and_heavy_dependencies():
+    # A fresh interpreter, since this test session has imported everything already
+    code = ('import sys, fandango_dls\n'
+            f'print("\\n".join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT, env=env)
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == []
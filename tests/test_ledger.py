@@ -0,0 +1,93 @@
+import pytest
+
+from fake_services import Field, HttpDataManager
+
+from fandango_dls.actions import send_metadata
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.db.sqlite_db import DepositionLedger, get_depositions
+from fandango_dls.utils.aria_upload import AriaSession, ChunkedUploader, content_hash
+from fandango_dls.utils.retry import RetryPolicy
+from fandango_dls.utils.serialization import dumps
+
+
+def deposit(project_name, entity_key, content):
+    """Deposit content in a fresh session, as a separate run would"""
+    uploader = ChunkedUploader(AriaSession(1, DepositionLedger(project_name, 1)), retry=RetryPolicy(attempts=1))
+    record_id, field_id, _ = uploader.deposit(entity_key, content)
+    return uploader.ledger, record_id, field_id
+
+
+def test_unchanged_content_is_not_deposited_again(aria):
+    _, record_id, field_id = deposit('project', 'chunk', {'value': 1})
+    aria.reset_stats()
+    ledger, *ids = deposit('project', 'chunk', {'value': 1})
+
+    assert ids == [record_id, field_id]
+    assert (ledger.pushed, ledger.skipped) == (0, 1)
+    assert aria.stats()['requests'] == 0
+
+
+def test_changed_content_goes_to_a_new_record(aria):
+    _, record_id, field_id = deposit('project', 'chunk', {'value': 1})
+    ledger, new_record_id, new_field_id = deposit('project', 'chunk', {'value': 2})
+
+    assert new_record_id != record_id
+    assert new_field_id != field_id
+    assert aria.entities == {'buckets': 1, 'records': 2, 'fields': 2}
+    assert ledger.get('chunk') == (content_hash(dumps({'value': 2})), new_record_id, new_field_id,
+                                   dumps({'supersedes': record_id}))
+
+
+def test_index_points_to_the_records_of_changed_chunks(aria):
+    def upload(chunks):
+        uploader = ChunkedUploader(AriaSession(1, DepositionLedger('project', 1)), retry=RetryPolicy(attempts=1))
+        entries = uploader.upload(chunks)
+        uploader.push_index({'uuid': 'acq'}, entries)
+        return {entry['grid_square_offset']: entry['record_id'] for entry in entries}
+
+    def chunk(offset, value):
+        return {'grid_info': {'uuid': 'g0'}, 'grid_square_offset': offset, 'grid_squares': [{'value': value}]}
+
+    before = upload([chunk(0, 1), chunk(1, 1)])
+    index_record = get_depositions('project', 1)['index'][1]
+    after = upload([chunk(0, 1), chunk(1, 2)])
+
+    assert after[0] == before[0] and after[1] != before[1]
+    index = get_depositions('project', 1)['index']
+    assert index[1] != index_record
+    assert aria.entities == {'buckets': 1, 'records': 5, 'fields': 5}
+
+
+def test_interrupted_push_completes_in_the_created_record(aria, monkeypatch):
+    push = HttpDataManager.push
+
+    def push_buckets_only(self, entity):
+        if isinstance(entity, Field):
+            raise ConnectionError('connection reset')
+        push(self, entity)
+
+    monkeypatch.setattr(HttpDataManager, 'push', push_buckets_only)
+    with pytest.raises(ConnectionError):
+        deposit('project', 'chunk', {'value': 1})
+    monkeypatch.setattr(HttpDataManager, 'push', push)
+
+    assert get_depositions('project', 1)['chunk'][0] is None
+    _, record_id, _ = deposit('project', 'chunk', {'value': 1})
+
+    assert get_depositions('project', 1)['chunk'][:2] == (content_hash(dumps({'value': 1})), record_id)
+    assert aria.entities == {'buckets': 1, 'records': 1, 'fields': 1}
+
+
+@pytest.mark.parametrize('chunk_size', [0, 2])
+def test_sending_a_project_twice_uploads_nothing_new(smartem, aria, chunk_size):
+    assert generate_metadata_from_smartem('project', 'acq-0')[0]
+    assert send_metadata.send_metadata_to_aria('project', 1, chunk_size=chunk_size)[0]
+    entities = dict(aria.entities)
+    aria.reset_stats()
+
+    success, info = send_metadata.send_metadata_to_aria('project', 1, chunk_size=chunk_size)
+
+    assert success
+    assert info['upload']['pushed'] == 0
+    assert aria.entities == entities
+    assert aria.stats()['requests'] == 0
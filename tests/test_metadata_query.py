@@ -0,0 +1,60 @@
+import pytest
+
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.db.sqlite_db import get_project_metadata
+from fandango_dls.utils.metadata_query import parse_path, query_metadata
+from fandango_dls.utils.serialization import loads
+
+
+@pytest.fixture
+def document(smartem):
+    assert generate_metadata_from_smartem('project', 'acq-0')[0]
+    return loads(get_project_metadata('project'))
+
+
+def test_parse_path():
+    assert parse_path("$.grids[0].grid_squares['gs-1'].foil_holes") == ['grids', 0, 'grid_squares', 'gs-1',
+                                                                         'foil_holes']
+    assert parse_path('acquisition.name') == ['acquisition', 'name']
+    with pytest.raises(ValueError):
+        parse_path('$.grids[0')
+
+
+def test_queries_match_the_metadata_document(document):
+    grid = document['grids'][1]
+    grid_square = grid['grid_squares'][2]
+    foil_hole = grid_square['foil_holes'][1]
+    uuid = grid_square['grid_square_info']['uuid']
+
+    assert query_metadata('acq-0', '$.acquisition') == ('$.acquisition', document['acquisition'])
+    assert query_metadata('acq-0', '$.grids[1].grid_info.name')[1] == grid['grid_info']['name']
+    assert query_metadata('acq-0', '$.grids[1].grid_squares[2]')[1] == grid_square
+    assert query_metadata('acq-0', f"$.grids[1].grid_squares['{uuid}'].foil_holes[1]")[1] == foil_hole
+    assert query_metadata('acq-0', '$.grids[1].grid_squares[2].foil_holes[1].micrographs[0].defocus')[1] == \
+        foil_hole['micrographs'][0]['defocus']
+    assert query_metadata('acq-0', '$.grids[1].atlas')[1] == grid['atlas']
+    assert query_metadata('acq-0', '$.grids')[1] == document['grids']
+
+
+def test_canonical_path(document):
+    uuid = document['grids'][0]['grid_squares'][0]['grid_square_info']['uuid']
+
+    canonical, _ = query_metadata('acq-0', f'grids[0].grid_squares["{uuid}"].grid_square_info')
+
+    assert canonical == f"$.grids[0].grid_squares['{uuid}'].grid_square_info"
+
+
+@pytest.mark.parametrize('path, error', [
+    ('$.grids[5]', LookupError),
+    ("$.grids[0].grid_squares['unknown']", LookupError),
+    ('$.acquisition.unknown', LookupError),
+    ('$.grids[-1]', ValueError)
+])
+def test_invalid_queries(document, path, error):
+    with pytest.raises(error):
+        query_metadata('acq-0', path)
+
+
+def test_query_of_an_unextracted_acquisition(ddbb):
+    with pytest.raises(LookupError):
+        query_metadata('acq-9', '$.acquisition')
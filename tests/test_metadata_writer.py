@@ -0,0 +1,56 @@
+import io
+import json
+
+import pytest
+
+from fandango_dls.constants import NODE_ACQUISITION, NODE_GRID, NODE_GRID_SQUARE, NODE_GRID_END
+from fandango_dls.utils import serialization
+from fandango_dls.utils.metadata_writer import StreamingMetadataWriter
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+
+def tree_nodes(metadata):
+    """Node stream of a metadata tree, as iter_acquisition_metadata yields it"""
+    yield NODE_ACQUISITION, metadata['acquisition']
+    for grid_data in metadata['grids']:
+        yield NODE_GRID, {'grid_info': grid_data['grid_info'], 'atlas': grid_data['atlas']}
+        for gs_data in grid_data['grid_squares']:
+            yield NODE_GRID_SQUARE, gs_data
+        yield NODE_GRID_END, None
+
+
+def write(metadata, indent):
+    fp = io.StringIO()
+    writer = StreamingMetadataWriter(fp, indent=indent)
+    for node_type, node in tree_nodes(metadata):
+        writer.write_node(node_type, node)
+    writer.close()
+    return fp.getvalue()
+
+
+@pytest.fixture
+def trees(smartem):
+    extracted = FandanGOSmartEMClient(base_url=smartem.url).extract_acquisition_metadata('acq-0')
+    return [
+        extracted,
+        {'acquisition': {'uuid': 'empty', 'name': 'Séance vide'}, 'grids': []},
+        {'acquisition': None, 'grids': [{'grid_info': {'uuid': 'g0'}, 'grid_squares': [], 'atlas': None}]}
+    ]
+
+
+@pytest.mark.parametrize('indent', [2, None])
+def test_writer_output_equals_json_dumps_of_the_tree(trees, monkeypatch, indent):
+    monkeypatch.setattr(serialization, 'backend', serialization.BACKEND_STDLIB)
+    separators = (',', ':') if indent is None else None
+
+    for metadata in trees:
+        assert write(metadata, indent) == json.dumps(metadata, indent=indent, separators=separators)
+
+
+@pytest.mark.parametrize('backend', serialization.available_backends())
+def test_writer_output_equals_dumps_of_the_tree_with_every_backend(trees, monkeypatch, backend):
+    monkeypatch.setattr(serialization, 'backend', backend)
+
+    for metadata in trees:
+        assert write(metadata, None) == serialization.dumps(metadata)
+        assert write(metadata, 2) == serialization.dumps(metadata, indent=2)
@@ -0,0 +1,34 @@
+import os
+
+from fandango_dls.utils.metrics import REGISTRY, write_prometheus_gauges, write_prometheus_textfile
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+
+def samples(path):
+    with open(path) as f:
+        return {line.split(' ')[0] for line in f if not line.startswith('#')}
+
+
+def test_smartem_calls_record_response_bytes(smartem):
+    client = FandanGOSmartEMClient(base_url=smartem.url)
+    smartem.reset_stats()
+    REGISTRY.reset()
+    client.extract_acquisition_metadata('acq-0')
+
+    operations = {name: operation for name, operation in REGISTRY.summary()['operations'].items()
+                  if name.startswith('smartem.')}
+    assert all(operation['bytes'] > 0 for operation in operations.values())
+    assert sum(operation['bytes'] for operation in operations.values()) == smartem.stats()['bytes_sent']
+
+
+def test_progress_gauges_are_kept_apart_from_the_run_textfile(tmp_path):
+    REGISTRY.reset()
+    REGISTRY.observe('watch.poll', 0.1)
+    write_prometheus_gauges(str(tmp_path), 'watch', {'watch_polls': (3, 'Successful polls')})
+    write_prometheus_textfile(str(tmp_path), 'watch', True)
+
+    progress = samples(os.path.join(tmp_path, 'fandango_dls_watch_progress.prom'))
+    run = samples(os.path.join(tmp_path, 'fandango_dls_watch.prom'))
+    assert progress == {'fandango_dls_watch_polls{action="watch"}'}
+    assert 'fandango_dls_last_run_success{action="watch"}' in run
+    assert not progress & run
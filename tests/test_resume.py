@@ -0,0 +1,38 @@
+import pytest
+
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.db import sqlite_db
+from fandango_dls.db.sqlite_db import get_checkpoints, get_grid_square_tree, get_project_metadata
+from fandango_dls.utils.smartem_client import LEVEL_FOIL_HOLES, LEVEL_GRID_SQUARES, LEVEL_MICROGRAPHS
+
+SERIAL = {LEVEL_GRID_SQUARES: 1, LEVEL_FOIL_HOLES: 1, LEVEL_MICROGRAPHS: 1}
+
+
+def test_resume_after_kill_between_row_and_checkpoint(smartem, monkeypatch):
+    # Kill the run after the third grid square row is written, before its checkpoint
+    save_checkpoint = sqlite_db.save_checkpoint
+    killed = []
+
+    def kill_on_third_grid_square(acquisition_id, entity, uuid):
+        if entity == 'grid_square' and len(get_checkpoints(acquisition_id, entity)) == 2:
+            killed.append(uuid)
+            raise KeyboardInterrupt
+        save_checkpoint(acquisition_id, entity, uuid)
+
+    monkeypatch.setattr(sqlite_db, 'save_checkpoint', kill_on_third_grid_square)
+    with pytest.raises(KeyboardInterrupt):
+        generate_metadata_from_smartem('resumed', 'acq-0', max_workers=SERIAL)
+    monkeypatch.setattr(sqlite_db, 'save_checkpoint', save_checkpoint)
+
+    # Rows and checkpoints are committed together or not at all
+    done = get_checkpoints('acq-0', 'grid_square')
+    assert len(done) == 2 and killed[0] not in done
+    assert all(get_grid_square_tree(uuid) for uuid in done)
+    assert get_grid_square_tree(killed[0]) is None
+
+    success, resumed = generate_metadata_from_smartem('resumed', 'acq-0', max_workers=SERIAL, resume=True)
+    assert success
+    success, fresh = generate_metadata_from_smartem('fresh', 'acq-0', max_workers=SERIAL)
+    assert success
+    assert resumed['smartem_requests'] < fresh['smartem_requests']
+    assert get_project_metadata('resumed') == get_project_metadata('fresh')
@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from fandango_dls.utils import retry
+from fandango_dls.utils.retry import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f'HTTP {status_code}')
+        self.response = SimpleNamespace(status_code=status_code)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry, 'time', clock)
+    return clock
+
+
+def failing(*errors, result='ok'):
+    """Callable raising the given errors on successive calls, then returning result"""
+    calls = []
+
+    def func():
+        calls.append(None)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    func.calls = calls
+    return func
+
+
+def test_transient_failures_are_retried_with_bounded_backoff(clock):
+    policy = RetryPolicy(attempts=4, backoff=0.5, max_backoff=1)
+    func = failing(ConnectionError(), HTTPError(503), HTTPError(429))
+
+    assert policy.call(func) == 'ok'
+    assert len(func.calls) == 4
+    assert policy.retries == 3
+    assert len(clock.sleeps) == 3
+    assert all(delay <= bound for delay, bound in zip(clock.sleeps, (0.5, 1, 1)))
+
+
+def test_client_errors_are_not_retried(clock):
+    policy = RetryPolicy(attempts=3)
+    func = failing(HTTPError(404))
+
+    with pytest.raises(HTTPError):
+        policy.call(func)
+    assert len(func.calls) == 1
+    assert policy.retries == 0
+
+
+@pytest.mark.parametrize('error', [ValueError('malformed response'), KeyError('uuid'),
+                                   requests.exceptions.InvalidURL('no host')])
+def test_other_errors_are_not_retried(clock, error):
+    policy = RetryPolicy(attempts=3, circuit_breaker=CircuitBreaker(failure_threshold=1))
+    func = failing(error)
+
+    with pytest.raises(type(error)):
+        policy.call(func)
+    assert len(func.calls) == 1
+    assert policy.retries == 0
+    assert policy.call(failing()) == 'ok'
+
+
+@pytest.mark.parametrize('error', [TimeoutError(), OSError('network unreachable'),
+                                   requests.exceptions.ConnectTimeout()])
+def test_network_errors_are_retried(clock, error):
+    policy = RetryPolicy(attempts=2)
+    func = failing(error)
+
+    assert policy.call(func) == 'ok'
+    assert policy.retries == 1
+
+
+def test_httpx_transport_errors_are_retried(clock):
+    httpx = pytest.importorskip('httpx')
+    policy = RetryPolicy(attempts=3)
+    func = failing(httpx.ReadError('reset'), httpx.ConnectTimeout('timed out'))
+
+    assert policy.call(func) == 'ok'
+    assert policy.retries == 2
+
+
+def test_last_error_is_raised_once_attempts_are_exhausted(clock):
+    policy = RetryPolicy(attempts=2)
+    func = failing(HTTPError(500), HTTPError(502))
+
+    with pytest.raises(HTTPError, match='502'):
+        policy.call(func)
+    assert len(func.calls) == 2
+
+
+def test_circuit_opens_after_consecutive_failures_and_closes_after_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    policy = RetryPolicy(attempts=1, circuit_breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            policy.call(failing(HTTPError(503)))
+
+    refused = failing()
+    with pytest.raises(CircuitOpenError):
+        policy.call(refused)
+    assert refused.calls == []
+
+    clock.now += 31
+    assert policy.call(failing()) == 'ok'
+    assert policy.call(failing()) == 'ok'
+
+
+def test_failed_trial_reopens_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    policy = RetryPolicy(attempts=1, circuit_breaker=breaker)
+    with pytest.raises(HTTPError):
+        policy.call(failing(HTTPError(503)))
+
+    clock.now += 31
+    with pytest.raises(HTTPError):
+        policy.call(failing(HTTPError(503)))
+    with pytest.raises(CircuitOpenError):
+        policy.call(failing())
+
+
+def test_open_circuit_is_not_retried(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    policy = RetryPolicy(attempts=5, circuit_breaker=breaker)
+    func = failing(HTTPError(503), HTTPError(503))
+
+    with pytest.raises(CircuitOpenError):
+        policy.call(func)
+    assert len(func.calls) == 1
@@ -0,0 +1,51 @@
+from fandango_dls.actions import send_metadata
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.constants import NODE_GRID_SQUARE
+from fandango_dls.db.sqlite_db import ExtractionState, store_metadata_nodes
+from fandango_dls.utils.aria_upload import chunk_metadata_nodes, iter_metadata_chunks
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+
+def test_chunked_send_does_not_load_the_document(smartem, aria, monkeypatch):
+    assert generate_metadata_from_smartem('project', 'acq-0')[0]
+
+    def get_project_metadata(project_name):
+        raise AssertionError('metadata document loaded in chunked mode')
+
+    monkeypatch.setattr(send_metadata, 'get_project_metadata', get_project_metadata)
+    success, info = send_metadata.send_metadata_to_aria('project', 1, chunk_size=2)
+
+    assert success
+    assert info['num_chunks'] == 4
+    assert aria.entities['records'] == info['num_chunks'] + 2
+
+
+def test_chunked_send_requires_an_extracted_project(ddbb, aria):
+    success, info = send_metadata.send_metadata_to_aria('missing', 1, chunk_size=2)
+
+    assert not success
+    assert info.startswith('No metadata found')
+    assert aria.stats()['requests'] == 0
+
+
+def test_pipeline_chunks_match_stored_chunks_and_are_emitted_when_full(smartem):
+    client = FandanGOSmartEMClient(base_url=smartem.url)
+    nodes = store_metadata_nodes('acq-0', client.iter_acquisition_metadata('acq-0', ExtractionState('acq-0')))
+    seen = []
+
+    def counted(nodes):
+        for node_type, node in nodes:
+            if node_type == NODE_GRID_SQUARE:
+                seen.append(node['grid_square_info']['uuid'])
+            yield node_type, node
+
+    emitted = []
+    list(chunk_metadata_nodes('acq-0', counted(nodes), 2,
+                              lambda chunk: emitted.append((chunk, seen[-1]))))
+
+    chunks = [chunk for chunk, _ in emitted]
+    assert chunks == list(iter_metadata_chunks('acq-0', 2))
+    assert [chunk['atlas'] is not None for chunk in chunks] == [True, False, True, False]
+    # Every chunk is emitted as soon as its last grid square arrives
+    assert [last for _, last in emitted] == [chunk['grid_squares'][-1]['grid_square_info']['uuid']
+                                             for chunk in chunks]
@@ -0,0 +1,65 @@
+import datetime
+
+import pytest
+
+from fandango_dls.utils import serialization
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+# Values whose text differs between backends, which must still parse back the same
+TRICKY = {
+    'name': 'Séance – grille ✓',
+    'floats': [0.1, -0.85, 1e-07, 1.5e300, 2.0],
+    'huge': 2 ** 70,
+    'nested': {'empty': {}, 'list': [], 'none': None, 'flags': [True, False]}
+}
+
+
+@pytest.fixture(params=serialization.available_backends())
+def backend(request, monkeypatch):
+    monkeypatch.setattr(serialization, 'backend', request.param)
+    return request.param
+
+
+@pytest.fixture
+def extracted(smartem):
+    return FandanGOSmartEMClient(base_url=smartem.url).extract_acquisition_metadata('acq-0')
+
+
+def test_backends_write_identical_metadata_documents(extracted, monkeypatch):
+    documents = set()
+    for name in serialization.available_backends():
+        monkeypatch.setattr(serialization, 'backend', name)
+        documents.add((serialization.dumps(extracted), serialization.dumps(extracted, indent=2),
+                       serialization.dumps(extracted, sort_keys=True)))
+
+    assert len(documents) == 1
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_backend_round_trips(backend, indent):
+    document = serialization.dumps(TRICKY, indent=indent)
+
+    assert serialization.loads(document) == TRICKY
+    assert serialization.loads(document.encode('utf-8')) == TRICKY
+
+
+def test_backends_read_each_others_output(monkeypatch):
+    documents = {}
+    for name in serialization.available_backends():
+        monkeypatch.setattr(serialization, 'backend', name)
+        documents[name] = serialization.dumps(TRICKY)
+
+    for name in serialization.available_backends():
+        monkeypatch.setattr(serialization, 'backend', name)
+        assert all(serialization.loads(document) == TRICKY for document in documents.values())
+
+
+def test_default_converts_unsupported_values(backend):
+    document = serialization.dumps({'when': datetime.date(2024, 1, 1)}, default=str)
+
+    assert serialization.loads(document) == {'when': '2024-01-01'}
+
+
+def test_malformed_documents_raise_decode_error(backend):
+    with pytest.raises(serialization.DecodeError):
+        serialization.loads('{"grids": [')
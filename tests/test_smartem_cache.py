@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+
+from fandango_dls.utils import smartem_cache
+from fandango_dls.utils.smartem_cache import SmartEMResponseCache
+from fandango_dls.utils.smartem_client import FandanGOSmartEMClient
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 0.001
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(smartem_cache, 'time', SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    cache = SmartEMResponseCache(str(tmp_path / 'cache.db'), ttl=60, max_bytes=10000)
+    yield cache
+    cache.close()
+
+
+def test_mutable_entries_expire_after_ttl(cache, clock):
+    cache.put('get_grid_squares_for_grid:g0', ['gs0'])
+    assert cache.get('get_grid_squares_for_grid:g0') == (True, ['gs0'])
+
+    clock.now += 61
+    assert cache.get('get_grid_squares_for_grid:g0') == (False, None)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'evictions': 0}
+
+
+def test_immutable_entries_never_expire(cache, clock):
+    cache.put('get_grid_squares_for_grid:g0', ['gs0'], immutable=True)
+
+    clock.now += 10 ** 6
+    assert cache.get('get_grid_squares_for_grid:g0') == (True, ['gs0'])
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = SmartEMResponseCache(str(tmp_path / 'cache.db'), max_bytes=250)
+    cache.put('a', 'x' * 100)
+    cache.put('b', 'x' * 100)
+    cache.get('a')
+    cache.put('c', 'x' * 100)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a')[0] and cache.get('c')[0]
+    assert cache.stats()['evictions'] == 1
+    cache.close()
+
+
+def test_entries_persist_across_processes(tmp_path, clock):
+    cache = SmartEMResponseCache(str(tmp_path / 'cache.db'))
+    cache.put('a', {'uuid': 'a'})
+    cache.close()
+
+    cache = SmartEMResponseCache(str(tmp_path / 'cache.db'))
+    assert cache.get('a') == (True, {'uuid': 'a'})
+    cache.close()
+
+
+def test_completed_acquisition_is_served_from_cache(smartem, tmp_path):
+    cache = SmartEMResponseCache(str(tmp_path / 'responses.db'))
+    client = FandanGOSmartEMClient(base_url=smartem.url, cache=cache)
+    expected = client.extract_acquisition_metadata('acq-0')
+    smartem.reset_stats()
+
+    assert client.extract_acquisition_metadata('acq-0') == expected
+    # Only the acquisition record, which decides immutability, is requested again
+    assert smartem.stats()['requests'] == 1
+    assert dict(client.call_counts) == {'get_acquisition': 1}
+    cache.close()
@@ -0,0 +1,84 @@
+import pytest
+
+from fandango_dls.constants import NODE_GRID_SQUARE
+from fandango_dls.utils import smartem_client
+from fandango_dls.utils.smartem_client import EXTRACTION_LEVELS, AcquisitionQuery, FandanGOSmartEMClient
+
+
+def extract(smartem, **kwargs):
+    client = FandanGOSmartEMClient(base_url=smartem.url, **kwargs)
+    smartem.reset_stats()
+    return client, client.extract_acquisition_metadata('acq-0')
+
+
+@pytest.mark.parametrize('bulk_fetch', [False, True])
+def test_concurrent_extraction_yields_the_serial_node_stream(smartem, bulk_fetch):
+    # Latency keeps concurrent requests in flight together, so they can complete out of order
+    smartem.latency = 0.002
+    serial = FandanGOSmartEMClient(base_url=smartem.url, bulk_fetch=bulk_fetch)
+    concurrent = FandanGOSmartEMClient(base_url=smartem.url, bulk_fetch=bulk_fetch,
+                                       max_workers={level: 4 for level in EXTRACTION_LEVELS})
+
+    nodes = list(serial.iter_acquisition_metadata('acq-0'))
+
+    assert list(concurrent.iter_acquisition_metadata('acq-0')) == nodes
+    assert concurrent.call_counts == serial.call_counts
+
+
+def test_bulk_fetch_lists_each_grid_once(smartem, dataset):
+    _, expected = extract(smartem)
+    client, metadata = extract(smartem, bulk_fetch=True)
+
+    grids = dataset.shape['grids']
+    assert metadata == expected
+    assert client.call_counts['get_foil_holes'] == grids
+    assert client.call_counts['get_micrographs'] == grids
+    assert client.call_counts['get_foil_holes_for_gridsquare'] == 0
+    assert client.call_counts['get_foil_hole_micrographs'] == 0
+    assert smartem.stats()['requests'] == sum(client.call_counts.values())
+
+
+def test_bulk_fetch_streams_one_grid_at_a_time(smartem):
+    client = FandanGOSmartEMClient(base_url=smartem.url, bulk_fetch=True)
+    nodes = client.iter_acquisition_metadata('acq-0')
+    next(node for node_type, node in nodes if node_type == NODE_GRID_SQUARE)
+
+    assert client.call_counts['get_grid_squares_for_grid'] == 1
+    assert client.call_counts['get_foil_holes'] == 1
+    nodes.close()
+
+
+def test_unscoped_listing_falls_back_to_per_parent_calls(smartem, dataset, monkeypatch):
+    class UnscopedClient(smartem_client.SmartEMAPIClient):
+        def get_foil_holes(self):
+            return super().get_foil_holes()
+
+        def get_micrographs(self):
+            return super().get_micrographs()
+
+    monkeypatch.setattr(smartem_client, 'SmartEMAPIClient', UnscopedClient)
+    client, _ = extract(smartem, bulk_fetch=True)
+
+    totals = dataset.total_entities()
+    assert client.call_counts['get_foil_holes'] == 0
+    assert client.call_counts['get_micrographs'] == 0
+    assert client.call_counts['get_foil_holes_for_gridsquare'] == totals['grid_squares']
+    assert client.call_counts['get_foil_hole_micrographs'] == totals['foil_holes']
+    assert '^/foilholes$' not in smartem.stats()['routes']
+
+
+def test_available_acquisitions_are_most_recent_first_from_paged_listing(smartem, monkeypatch):
+    from fake_services import Model
+    from synthetic import SyntheticAcquisitions
+    listed = SyntheticAcquisitions(acquisitions=7).acquisitions()
+
+    class OldestFirstClient(smartem_client.SmartEMAPIClient):
+        def get_acquisitions(self, limit=100, offset=0):
+            return [Model(**acquisition) for acquisition in listed[offset:offset + limit]]
+
+    monkeypatch.setattr(smartem_client, 'SmartEMAPIClient', OldestFirstClient)
+    client = FandanGOSmartEMClient(base_url=smartem.url)
+    acquisitions = client.get_available_acquisitions(limit=3, query=AcquisitionQuery(page_size=2))
+
+    assert [acquisition['uuid'] for acquisition in acquisitions] == ['acq-6', 'acq-5', 'acq-4']
+    assert client.call_counts['get_acquisitions'] == 4
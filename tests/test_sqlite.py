@@ -0,0 +1,101 @@
+import os
+import sqlite3
+
+import pytest
+
+from fandango_dls.constants import DBNAME
+from fandango_dls.db.sqlite_db import (
+    get_checkpoints,
+    get_grid_outline,
+    get_grid_square_tree,
+    get_project_info,
+    get_project_metadata,
+    get_summaries,
+    save_acquisition,
+    save_checkpoint,
+    save_grid,
+    save_grid_square_tree,
+    save_summaries,
+    update_project
+)
+
+
+def test_outer_rollback_discards_nested_writes(ddbb):
+    with pytest.raises(RuntimeError):
+        with ddbb.transaction():
+            save_checkpoint('acq', 'grid', 'g0')
+            with ddbb.transaction():
+                save_checkpoint('acq', 'grid', 'g1')
+            raise RuntimeError('abort')
+
+    assert get_checkpoints('acq', 'grid') == set()
+
+
+def test_nested_rollback_keeps_outer_writes(ddbb):
+    with ddbb.transaction():
+        save_checkpoint('acq', 'grid', 'g0')
+        with pytest.raises(RuntimeError):
+            with ddbb.transaction():
+                save_checkpoint('acq', 'grid', 'g1')
+                raise RuntimeError('abort')
+
+    assert get_checkpoints('acq', 'grid') == {'g0'}
+
+
+def test_commit_is_visible_to_new_connections(ddbb):
+    with ddbb.transaction():
+        save_checkpoint('acq', 'grid', 'g0')
+    ddbb.close_connection_to_ddbb()
+
+    assert get_checkpoints('acq', 'grid') == {'g0'}
+
+
+def grid_square_tree(uuid):
+    return {
+        'grid_square_info': {'uuid': uuid},
+        'foil_holes': [{'foil_hole_info': {'uuid': f'{uuid}-f0'}, 'micrographs': [{'uuid': f'{uuid}-f0-m0'}]}],
+        'quality_prediction': None
+    }
+
+
+def test_saving_a_grid_deletes_grid_squares_it_no_longer_lists(ddbb):
+    save_acquisition('acq', {'uuid': 'acq'})
+    for uuid in ('s0', 's1', 's2'):
+        save_grid_square_tree(grid_square_tree(uuid))
+    save_grid('acq', 0, {'uuid': 'g0'}, None, ['s0', 's1', 's2'])
+    save_summaries('acq', [('grid_square', {'uuid': 's1'}), ('grid_square', {'uuid': 's2'})])
+
+    assert save_grid('acq', 0, {'uuid': 'g0'}, None, ['s2', 's0'])
+
+    assert get_grid_outline('g0')[1] == ['s2', 's0']
+    assert get_grid_square_tree('s1') is None
+    assert get_grid_square_tree('s0') == grid_square_tree('s0')
+    assert get_summaries('acq', 'grid_square') == [{'uuid': 's2'}]
+    cursor = ddbb.connect_to_ddbb().cursor()
+    assert cursor.execute("SELECT COUNT(*) FROM foil_holes WHERE grid_square_uuid = 's1'").fetchone()[0] == 0
+    assert cursor.execute("SELECT COUNT(*) FROM micrographs WHERE foil_hole_uuid = 's1-f0'").fetchone()[0] == 0
+
+
+def test_baseline_database_is_migrated(ddbb, tmp_path):
+    # project_info was the only table, and every update appended a row
+    connection = sqlite3.connect(os.path.join(str(tmp_path), DBNAME))
+    connection.execute('CREATE TABLE project_info (project_name TEXT NOT NULL, key TEXT NOT NULL, '
+                       'value TEXT NOT NULL)')
+    connection.executemany('INSERT INTO project_info VALUES (?, ?, ?)', [
+        ('project', 'acquisition_id', 'acq-old'),
+        ('project', 'metadata_json', '{"acquisition": "old"}'),
+        ('project', 'acquisition_id', 'acq-0'),
+        ('project', 'metadata_json', '{"acquisition": "acq-0"}')
+    ])
+    connection.commit()
+    connection.close()
+
+    _, rows = get_project_info('project')
+    assert sorted(rows) == [('project', 'acquisition_id', 'acq-0'),
+                            ('project', 'metadata_json', '{"acquisition": "acq-0"}')]
+    assert get_project_metadata('project') == '{"acquisition": "acq-0"}'
+    assert ddbb.connect_to_ddbb().execute('PRAGMA user_version').fetchone()[0] == len(ddbb.MIGRATIONS)
+
+    update_project('project', 'acquisition_id', 'acq-1')
+    _, rows = get_project_info('project')
+    assert ('project', 'acquisition_id', 'acq-1') in rows and len(rows) == 2
@@ -0,0 +1,81 @@
+import pytest
+
+from fandango_dls.constants import (
+    NODE_ACQUISITION,
+    NODE_GRID,
+    NODE_GRID_END,
+    NODE_GRID_SQUARE,
+    SUMMARY_ACQUISITION,
+    SUMMARY_GRID,
+    SUMMARY_GRID_SQUARE
+)
+from fandango_dls.db.sqlite_db import get_summaries
+from fandango_dls.utils import summaries
+from fandango_dls.utils.summaries import summarize_metadata_nodes
+
+
+def grid_square(uuid, status, quality, defocus_values, start_hour=0):
+    micrographs = [{'uuid': f'{uuid}-m{i}', 'defocus': defocus,
+                    'acquisition_datetime': f'2024-01-01T{start_hour + i:02d}:00:00'}
+                   for i, defocus in enumerate(defocus_values)]
+    return {
+        'grid_square_info': {'uuid': uuid, 'status': status},
+        'foil_holes': [{'foil_hole_info': {'uuid': f'{uuid}-f0'}, 'micrographs': micrographs}],
+        'quality_prediction': None if quality is None else {'value': quality}
+    }
+
+
+def nodes(*grid_squares):
+    yield NODE_ACQUISITION, {'uuid': 'acq', 'name': 'Session'}
+    yield NODE_GRID, {'grid_info': {'uuid': 'g0', 'name': 'Grid 1'}, 'atlas': None}
+    for gs_data in grid_squares:
+        yield NODE_GRID_SQUARE, gs_data
+    yield NODE_GRID_END, None
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(summaries, 'numpy', None)
+    return request.param
+
+
+def test_summary_values(ddbb, backend):
+    list(summarize_metadata_nodes('acq', nodes(grid_square('s0', 'collected', 0.5, [-1, -2]),
+                                               grid_square('s1', 'skipped', None, [-3, -4], start_hour=2))))
+
+    square = get_summaries('acq', SUMMARY_GRID_SQUARE)[0]
+    assert square['num_micrographs'] == 2 and square['quality'] == 0.5
+    assert square['micrographs']['defocus'] == {'count': 2, 'mean': -1.5, 'min': -2.0, 'p5': -1.95, 'p25': -1.75,
+                                                'p50': -1.5, 'p75': -1.25, 'p95': -1.05, 'max': -1.0}
+    grid = get_summaries('acq', SUMMARY_GRID)[0]
+    acquisition = get_summaries('acq', SUMMARY_ACQUISITION)[0]
+    assert acquisition['grids'] == [grid]
+    assert acquisition['num_grids'] == 1
+    assert acquisition['num_grid_squares'] == 2
+    assert acquisition['num_micrographs'] == 4
+    assert acquisition['grid_square_statuses'] == {'collected': 1, 'skipped': 1}
+    assert acquisition['quality']['mean'] == 0.5 and acquisition['num_without_quality'] == 1
+    defocus = acquisition['micrographs']['defocus']
+    assert (defocus['mean'], defocus['p50'], defocus['min'], defocus['max']) == (-2.5, -2.5, -4.0, -1.0)
+    assert acquisition['micrographs']['ice_thickness'] is None
+    assert acquisition['collection']['hours'] == 3.0
+    assert acquisition['collection']['micrographs_per_hour'] == pytest.approx(1.33)
+    assert acquisition['collection']['per_hour'] == [1, 1, 1, 1]
+
+
+def test_interrupted_extraction_keeps_previous_summaries(ddbb):
+    list(summarize_metadata_nodes('acq', nodes(grid_square('s0', 'collected', 0.5, [-1, -2]))))
+    previous = {level: get_summaries('acq', level)
+                for level in (SUMMARY_GRID_SQUARE, SUMMARY_GRID, SUMMARY_ACQUISITION)}
+
+    def interrupted():
+        yield from list(nodes(grid_square('s0', 'collected', 0.9, [-3]), grid_square('s1', 'collected', 0.1, [-1])))[:-1]
+        raise ConnectionError('network down')
+
+    with pytest.raises(ConnectionError):
+        list(summarize_metadata_nodes('acq', interrupted()))
+
+    assert {level: get_summaries('acq', level) for level in previous} == previous
@@ -0,0 +1,103 @@
+import logging
+from types import SimpleNamespace
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from fandango_dls.utils.transport import TransportSettings, configure_transport, track_response_bytes
+
+
+def test_requests_session_gets_public_adapters():
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(max_retries=2))
+    api_client = SimpleNamespace(session=session)
+    headers = dict(session.headers)
+
+    transport = configure_transport(api_client, TransportSettings(), 5)
+
+    assert api_client.session is session
+    assert transport == {'library': 'requests', 'pool_size': 5, 'http2': False}
+    assert session.get_adapter('http://smartem')._pool_maxsize == 5
+    assert session.get_adapter('https://smartem').max_retries.total == 2
+    assert dict(session.headers) == headers
+
+
+def test_requests_custom_adapter_is_left_alone():
+    class CustomAdapter(HTTPAdapter):
+        pass
+
+    session = requests.Session()
+    custom = CustomAdapter()
+    session.mount('https://', custom)
+
+    configure_transport(SimpleNamespace(session=session), TransportSettings(), 5)
+
+    assert session.get_adapter('https://smartem') is custom
+    assert session.get_adapter('http://smartem')._pool_maxsize == 5
+
+
+def test_httpx_client_gets_a_transport_with_its_tls_context():
+    httpx = pytest.importorskip('httpx')
+
+    def hook(request):
+        pass
+
+    client = httpx.Client(verify=False, trust_env=False, params={'token': 't'}, event_hooks={'request': [hook]},
+                          mounts={'http://proxied': httpx.HTTPTransport()})
+    api_client = SimpleNamespace(_client=client)
+    ssl_context = client._transport._pool._ssl_context
+    proxied = list(client._mounts.values())[0]
+    headers = dict(client.headers)
+
+    transport = configure_transport(api_client, TransportSettings(pool_size=8, keepalive=5), 3)
+
+    assert api_client._client is client
+    assert transport['pool_size'] == 8
+    pool = client._transport._pool
+    assert (pool._max_connections, pool._max_keepalive_connections, pool._keepalive_expiry) == (8, 8, 5)
+    assert pool._ssl_context is ssl_context
+    assert list(client._mounts.values()) == [proxied]
+    assert client.event_hooks['request'] == [hook]
+    assert client.params['token'] == 't'
+    assert dict(client.headers) == headers
+    client.close()
+
+
+def test_httpx_client_without_known_internals_is_left_alone(caplog):
+    httpx = pytest.importorskip('httpx')
+    client = httpx.Client()
+    unknown = client._transport = httpx.HTTPTransport.__new__(httpx.HTTPTransport)
+
+    with caplog.at_level(logging.WARNING):
+        transport = configure_transport(SimpleNamespace(client=client), TransportSettings(), 3)
+
+    assert transport['pool_size'] is None
+    assert client._transport is unknown
+    assert 'keeping its connection pool' in caplog.text
+
+
+def test_httpx_custom_transport_is_left_alone():
+    httpx = pytest.importorskip('httpx')
+    mock = httpx.MockTransport(lambda request: httpx.Response(200, json={'ok': True}))
+    client = httpx.Client(transport=mock, base_url='http://smartem')
+    api_client = SimpleNamespace(client=client)
+
+    transport = configure_transport(api_client, TransportSettings(), 3)
+
+    assert transport['pool_size'] is None
+    assert client.get('/acquisitions').json() == {'ok': True}
+    client.close()
+
+
+def test_httpx_response_bytes_are_reported():
+    httpx = pytest.importorskip('httpx')
+    mock = httpx.MockTransport(lambda request: httpx.Response(200, content=b'{"uuid": "acq-0"}'))
+    client = httpx.Client(transport=mock, base_url='http://smartem')
+    received = []
+
+    assert track_response_bytes(SimpleNamespace(client=client), received.append)
+    client.get('/acquisitions/acq-0')
+
+    assert received == [17]
+    client.close()
@@ -0,0 +1,92 @@
+import os
+
+import pytest
+from synthetic import SyntheticAcquisitions
+
+from fandango_dls.actions import watch
+from fandango_dls.actions.generate_metadata import generate_metadata_from_smartem
+from fandango_dls.constants import SUMMARY_ACQUISITION, SUMMARY_GRID, SUMMARY_GRID_SQUARE
+from fandango_dls.db import sqlite_db
+from fandango_dls.db.sqlite_db import get_processed_acquisitions, get_project_metadata
+
+
+class LiveAcquisition(SyntheticAcquisitions):
+    """Acquisition whose grid squares appear poll after poll until it completes"""
+
+    def __init__(self):
+        super().__init__(acquisitions=1, grids=1, grid_squares=1, foil_holes=2, micrographs=2)
+        self.status = 'running'
+        self.grid_square_statuses = {}
+
+    def acquisition(self, uuid):
+        return dict(super().acquisition(uuid), status=self.status)
+
+    def grid_squares(self, grid_uuid):
+        return [dict(gs, status=self.grid_square_statuses.get(gs['uuid'], gs['status']))
+                for gs in super().grid_squares(grid_uuid)]
+
+
+@pytest.fixture
+def dataset():
+    return LiveAcquisition()
+
+
+def test_watch_follows_the_acquisition_until_it_completes(smartem, dataset, monkeypatch, tmp_path):
+    poll = watch.AcquisitionPoller.poll
+    poll_requests = []
+    poll_loads = []
+    loaded = []
+    saved_grids = []
+
+    def poll_and_grow(poller, client):
+        smartem.reset_stats()
+        loaded.clear()
+        status = poll(poller, client)
+        poll_requests.append(smartem.stats()['requests'])
+        poll_loads.append(len(loaded))
+        if dataset.status == 'running':
+            dataset.shape['grid_squares'] += 1
+            if dataset.shape['grid_squares'] == 3:
+                dataset.status = 'completed'
+                # The first grid square changes before the last poll
+                dataset.grid_square_statuses['acq-0-g0-s0'] = 'skipped'
+        return status
+
+    def counting(calls, func):
+        return lambda *args: calls.append(args[0]) or func(*args)
+
+    monkeypatch.setattr(watch.AcquisitionPoller, 'poll', poll_and_grow)
+    monkeypatch.setattr(sqlite_db, 'get_grid_square_tree', counting(loaded, sqlite_db.get_grid_square_tree))
+    monkeypatch.setattr(sqlite_db, 'save_grid', counting(saved_grids, sqlite_db.save_grid))
+    success, info = watch.watch_acquisition('live', 'acq-0', interval=0, metrics_dir=str(tmp_path))
+
+    assert success
+    assert (info['polls'], info['failed_polls'], info['status']) == (3, 0, 'completed')
+    assert info['new'] == {'num_grid_squares': 3, 'num_foil_holes': 6, 'num_micrographs': 12}
+    assert get_processed_acquisitions() == {'acq-0': 'completed'}
+
+    # Grid squares stored by earlier polls are reused, so every poll costs the
+    # acquisition, grid, grid square and atlas requests plus the new grid square's
+    # quality prediction, foil holes and micrographs; the changed grid square
+    # costs its quality prediction and foil holes, its micrographs are reused
+    assert poll_requests == [4 + 1 + 1 + 2] * 2 + [4 + 1 + 1 + 2 + 1 + 1]
+    # Stored grid squares are neither loaded nor summarized again, and the
+    # grid is only stored again because it has a new grid square every poll
+    assert poll_loads == [0] * 3
+    assert len(saved_grids) == 3
+
+    with open(os.path.join(tmp_path, 'fandango_dls_watch_progress.prom')) as f:
+        assert 'fandango_dls_watch_polls{action="watch"} 3\n' in f.read()
+
+    live_summaries = {level: sqlite_db.get_summaries('acq-0', level)
+                      for level in (SUMMARY_GRID_SQUARE, SUMMARY_GRID, SUMMARY_ACQUISITION)}
+    assert generate_metadata_from_smartem('fresh', 'acq-0')[0]
+    assert get_project_metadata('live') == get_project_metadata('fresh')
+    assert {level: sqlite_db.get_summaries('acq-0', level) for level in live_summaries} == live_summaries
+
+
+def test_watch_stops_after_max_polls(smartem, dataset):
+    success, info = watch.watch_acquisition('live', 'acq-0', interval=0, max_polls=2)
+
+    assert success
+    assert (info['polls'], info['status']) == (2, 'running')